@@ -0,0 +1,270 @@
+import asyncio
+import collections
+import hashlib
+import io
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow is optional; without it commands fall back to text embeds
+    Image = None
+
+CARDS_AVAILABLE = Image is not None
+
+CARD_WIDTH = 800
+BACKGROUND = (35, 39, 42)
+ACCENT = (0, 153, 255)
+TEXT = (255, 255, 255)
+MUTED = (153, 170, 181)
+BAR_EMPTY = (64, 68, 75)
+MEDALS = {1: (255, 215, 0), 2: (192, 192, 192), 3: (205, 127, 50)}
+# Seconds a card may take, queueing included, before its request gives up and the pool is replaced
+RENDER_TIMEOUT = 10.0
+
+
+class CardQueueFull(Exception):
+    """Raised when too many cards are already waiting to be rendered"""
+
+
+def _png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_stats_card(data):
+    """Render a user's stats as PNG bytes.
+
+    `data` has name, level, xp, next_level_xp, total_minutes, season, studying, streak and focus_score.
+    """
+    image = Image.new('RGB', (CARD_WIDTH, 240), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    title = ImageFont.load_default(size=36)
+    body = ImageFont.load_default(size=22)
+
+    draw.text((30, 24), data['name'], font=title, fill=TEXT)
+    status = "Studying now" if data['studying'] else "Not in session"
+    draw.text((CARD_WIDTH - 30, 34), status, font=body, fill=ACCENT if data['studying'] else MUTED, anchor='ra')
+    draw.text((30, 84), f"Level {data['level']}  •  Season {data['season']}", font=body, fill=MUTED)
+
+    # XP progress bar towards the next level
+    progress = min(1.0, data['xp'] / data['next_level_xp']) if data['next_level_xp'] else 0.0
+    draw.rounded_rectangle((30, 124, CARD_WIDTH - 30, 160), radius=18, fill=BAR_EMPTY)
+    if progress > 0:
+        draw.rounded_rectangle((30, 124, 30 + int((CARD_WIDTH - 60) * progress), 160), radius=18, fill=ACCENT)
+    draw.text((CARD_WIDTH // 2, 142), f"{data['xp']} / {data['next_level_xp']} XP", font=body, fill=TEXT, anchor='mm')
+
+    hours = data['total_minutes'] / 60
+    draw.text((30, 186), f"{data['total_minutes']} minutes studied ({hours:.1f} hours)", font=body, fill=MUTED)
+    draw.text((CARD_WIDTH - 30, 186), f"{data['streak']} day streak  •  Focus {data['focus_score']}", font=body, fill=MUTED, anchor='ra')
+    return _png(image)
+
+
+def render_leaderboard_card(data):
+    """Render a leaderboard as PNG bytes.
+
+    `data` has a title and rows of (rank, name, level, total_minutes, xp), best first.
+    """
+    rows = data['rows']
+    image = Image.new('RGB', (CARD_WIDTH, 90 + 56 * len(rows)), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    title = ImageFont.load_default(size=34)
+    body = ImageFont.load_default(size=22)
+
+    draw.text((30, 24), data['title'], font=title, fill=TEXT)
+    top_xp = max((row[4] for row in rows), default=0) or 1
+    for i, (rank, name, level, total_minutes, xp) in enumerate(rows):
+        y = 84 + 56 * i
+        draw.text((30, y + 8), f"#{rank}", font=body, fill=MEDALS.get(rank, MUTED))
+        draw.text((100, y + 8), name[:24], font=body, fill=TEXT)
+        draw.text((CARD_WIDTH - 30, y + 8), f"Lv {level}  •  {total_minutes} min  •  {xp} XP", font=body, fill=MUTED, anchor='ra')
+        # Thin bar showing XP relative to the leader
+        draw.rectangle((100, y + 40, 100 + int((CARD_WIDTH - 130) * xp / top_xp), y + 44), fill=ACCENT)
+    return _png(image)
+
+
+RENDERERS = {
+    'stats': render_stats_card,
+    'leaderboard': render_leaderboard_card,
+}
+
+
+class CardRenderer:
+    """Renders image cards in a process pool so drawing never blocks the event loop.
+
+    At most `max_pending` distinct cards are queued or rendering at once; further
+    requests raise CardQueueFull. Finished cards are cached by a hash of their content,
+    and identical requests that arrive while a card is rendering share that render.
+    """
+
+    def __init__(self, workers=2, max_pending=32, cache_size=256, timeout=RENDER_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self._pool = None
+        self._cache = collections.OrderedDict()  # content hash -> PNG bytes, least recently used first
+        self._in_flight = {}  # content hash -> future for a render in progress
+        self.hits = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.render_seconds = 0.0
+
+    @staticmethod
+    def content_hash(kind, data):
+        payload = json.dumps([kind, data], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _executor(self):
+        if self._pool is None:
+            # Spawned workers don't inherit the bot's threads, sockets or event loop. They do import
+            # the launching script, so its side effects must sit under `if __name__ == "__main__":`
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    async def render(self, kind, data):
+        """Return the PNG bytes for a card, rendering it in the pool unless it's cached.
+
+        Raises asyncio.TimeoutError if the card takes longer than `timeout` seconds.
+        """
+        if not CARDS_AVAILABLE:
+            raise RuntimeError("Pillow is not installed")
+        key = self.content_hash(kind, data)
+        png = self._cache.get(key)
+        if png is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return png
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.hits += 1
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+
+        if len(self._in_flight) >= self.max_pending:
+            self.rejected += 1
+            raise CardQueueFull(f"{len(self._in_flight)} cards already rendering")
+
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().run_in_executor(self._executor(), RENDERERS[kind], data)
+        self._in_flight[key] = future
+        try:
+            png = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except (BrokenProcessPool, asyncio.TimeoutError):
+            # A worker died or hung; start a fresh pool for the next request instead of failing forever
+            self.close()
+            raise
+        finally:
+            del self._in_flight[key]
+
+        self.rendered += 1
+        self.render_seconds += time.perf_counter() - started
+        self._cache[key] = png
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return png
+
+    def summary(self):
+        # Time from submitting a cache miss to its card coming back, including time queued for a worker
+        average = self.render_seconds / self.rendered if self.rendered else 0.0
+        return {
+            'rendered': self.rendered,
+            'cache_hits': self.hits,
+            'rejected': self.rejected,
+            'cached': len(self._cache),
+            'average_miss_ms': 1000 * average,
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def sample_card(kind, seed):
+    """Card data of realistic size for benchmarks; equal seeds give identical cards"""
+    if kind == 'stats':
+        level = seed % 30 + 1
+        return {'name': f"user{seed}", 'level': level, 'xp': seed * 7 % 500, 'next_level_xp': 5 * level * level + 50 * level + 100,
+                'total_minutes': seed * 13, 'season': 1, 'studying': seed % 2 == 0, 'streak': seed % 12, 'focus_score': seed % 101}
+    rows = [(rank, f"user{seed}-{rank}", 30 - rank, 5000 - rank * 90 - seed, 900 - rank * 40) for rank in range(1, 11)]
+    return {'title': f"Study Leaderboard {seed}", 'rows': rows}
+
+
+async def benchmark(requests=500, distinct=50, workers=2, max_pending=32, concurrency=64):
+    """Fire card requests at a CardRenderer and report throughput, latency and how long the loop stalled.
+
+    `distinct` controls how many different cards are requested, so the rest are cache hits.
+    """
+    renderer = CardRenderer(workers=workers, max_pending=max_pending)
+    latencies = []
+    rejected = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Rendering one card inline shows what each request would cost the event loop without the pool
+    inline_started = time.perf_counter()
+    render_stats_card(sample_card('stats', -1))
+    render_leaderboard_card(sample_card('leaderboard', -1))
+    inline_ms = 1000 * (time.perf_counter() - inline_started) / 2
+
+    # Warm every worker so process start-up isn't counted as render latency
+    await asyncio.gather(*(renderer.render('stats', sample_card('stats', -2 - i)) for i in range(workers)))
+
+    async def one(i):
+        nonlocal rejected
+        kind = 'stats' if i % 2 else 'leaderboard'
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await renderer.render(kind, sample_card(kind, i % distinct))
+            except CardQueueFull:
+                rejected += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    # Track the worst gap between event loop ticks while the benchmark runs
+    worst_stall = 0.0
+    running = True
+
+    async def watch_loop():
+        nonlocal worst_stall
+        while running:
+            before = time.perf_counter()
+            await asyncio.sleep(0.005)
+            worst_stall = max(worst_stall, time.perf_counter() - before - 0.005)
+
+    watcher = asyncio.create_task(watch_loop())
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    running = False
+    await watcher
+    renderer.close()
+
+    latencies.sort()
+
+    def percentile(p):
+        return 1000 * latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+    report = {
+        'requests': requests,
+        'served': len(latencies),
+        'rejected': rejected,
+        'seconds': elapsed,
+        'cards_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'inline_render_ms': inline_ms,
+        'worst_loop_stall_ms': 1000 * worst_stall,
+    }
+    report.update(renderer.summary())
+    return report
+
+
+def run_benchmark(**kwargs):
+    return asyncio.run(benchmark(**kwargs))
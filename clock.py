@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+
+class SystemClock:
+    """Wall-clock time, used by the bot in production"""
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+
+class VirtualClock:
+    """Manually advanced time for simulations and tests.
+
+    Nothing moves until `advance` (or `sleep`) is called, so hours of study sessions
+    can be simulated in as long as it takes to run the ticks.
+    """
+
+    def __init__(self, start=1_700_000_000):
+        self._now = float(start)
+        self._monotonic = 0.0
+
+    def time(self):
+        return self._now
+
+    def monotonic(self):
+        return self._monotonic
+
+    def advance(self, seconds):
+        if seconds < 0:
+            raise ValueError("Virtual time can't go backwards")
+        self._now += seconds
+        self._monotonic += seconds
+
+    async def sleep(self, seconds):
+        self.advance(seconds)
+        await asyncio.sleep(0)  # Still yield so other tasks get a turn
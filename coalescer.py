@@ -0,0 +1,62 @@
+import asyncio
+
+
+class EditCoalescer:
+    """Coalesces bursts of edits to the same message into one API call.
+
+    The first `request` for a key schedules an edit `window` seconds later; requests
+    arriving before then just replace the message/render to use. `render` is called when
+    the edit is finally made, so the edit always shows the latest state no matter how
+    many changes happened during the window.
+    """
+
+    def __init__(self, window=2.0, on_error=None):
+        self.window = window
+        self.on_error = on_error  # Called with (key, message, exception) when an edit fails
+        self._pending = {}  # key -> (message, render)
+        self._tasks = {}  # key -> task that will make the edit
+        self.requested = 0
+        self.edits = 0
+        self.failed = 0
+
+    def request(self, key, message, render):
+        """Ask for `message` to be edited with the keyword arguments `render()` returns"""
+        self.requested += 1
+        self._pending[key] = (message, render)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._edit_later(key))
+
+    def pending(self, key):
+        return key in self._pending
+
+    def cancel(self, key):
+        """Drop a pending edit, e.g. because its message was deleted"""
+        self._pending.pop(key, None)
+        task = self._tasks.pop(key, None)
+        if task:
+            task.cancel()
+
+    async def _edit_later(self, key):
+        await asyncio.sleep(self.window)
+        self._tasks.pop(key, None)
+        await self._edit(key)
+
+    async def _edit(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        message, render = pending
+        try:
+            await message.edit(**render())
+            self.edits += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"Error editing message {getattr(message, 'id', '?')}: {e}")
+            if self.on_error:
+                self.on_error(key, message, e)
+
+    async def flush(self):
+        """Make every pending edit now instead of waiting for its window to end"""
+        for key in list(self._tasks):
+            self._tasks.pop(key).cancel()
+        await asyncio.gather(*(self._edit(key) for key in list(self._pending)))
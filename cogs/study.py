@@ -3,22 +3,61 @@ from discord.ext import commands, tasks
 from discord import app_commands
 from discord.ui import Button, View
 import asyncio
-import time
+import contextlib
+import functools
+import io
+import math
 import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+
+from dbmanager import READ_CONNECTIONS, DatabaseManager
+from deadline import InteractionDeadlineGuard
+from clock import SystemClock
+from profiling import Profiler
+from guild_settings import GuildSettingsCache
+from loopmonitor import LoopLagMonitor
+from cards import CARDS_AVAILABLE, CardQueueFull, CardRenderer
+from throttle import CommandThrottle
+from transfer import export_tables, import_files, needs_xp_checkpoint
+from coalescer import EditCoalescer
+from recorder import TrafficRecorder
+
+# How often the background ticks run
+XP_TICK_SECONDS = 60
+POMODORO_TICK_SECONDS = 30
 
-from dbmanager import DatabaseManager
+# Upper bound on how long unloading the cog may take
+SHUTDOWN_TIMEOUT = 10
+# Announcements waiting to be sent; more than this and new ones are dropped
+ANNOUNCEMENT_QUEUE_SIZE = 1000
+EXPORT_DIR = "exports"  # Where /studyexport writes, relative to the bot's working directory
+STATUS_EDIT_WINDOW = 2.0  # Seconds of session changes folded into one status message edit
+RESTARTING_REPLY = "⏳ The bot is restarting right now. Please try joining again in a minute!"  # Joins refused during shutdown
 
 class Study(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, db_name="study_sessions.db", clock=None, start_tasks=True, read_connections=READ_CONNECTIONS):
         self.bot = bot
-        self.db_manager = DatabaseManager("study_sessions.db")
+        # Everything time-based goes through the clock so simulations can run on virtual time
+        self.clock = clock or SystemClock()
+        self.db_manager = DatabaseManager(db_name, clock=self.clock, readers=read_connections)
         self.db_manager.create_tables()
         
+        # Writes run one at a time on their own thread and reads on pooled connections in other threads,
+        # so neither holds up the event loop or each other (see db_write and db_read)
+        self.db_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='study-db-writer')
+        self.queued_writes = 0
+        
         # Dictionary to track active study sessions
         # Format: {server_id: {
         #   'session_id': int, 
         #   'participants': set(user_ids), 
         #   'start_time': timestamp, 
+        #   'joined_at': {user_id: timestamp},
+        #   'streak_minutes': {user_id: minutes credited to streaks by XP ticks},
         #   'channel_id': int,
         #   'pomodoro': {
         #     'enabled': bool,
@@ -34,35 +73,460 @@ class Study(commands.Cog):
         # }}
         self.active_sessions = {}
         
-        # Start the XP reward task
-        self.xp_reward_task.start()
+        # One lock per guild around every change to its session, so unrelated guilds never wait on each other.
+        # Locks are kept for the guild's lifetime rather than dropped with the session, as waiters may still hold them
+        self.session_locks = {}
+        
+        # Database writes waiting to run: joins/leaves queued on a session lock, participants the running
+        # XP tick hasn't reached yet, and queued_writes above. Low priority reads are shed while this is deep
+        self.pending_writes = 0
+        self.xp_tick_pending = 0
+        
+        # Token buckets per user and per guild so spam and raids can't saturate the database
+        self.throttle = CommandThrottle(clock=self.clock)
+        
+        # One live status message per guild, edited in place as its session changes
+        self.status_messages = {}  # server_id -> message
+        self.status_edits = EditCoalescer(STATUS_EDIT_WINDOW, on_error=self.forget_status_message)
+        
+        # Samples event loop lag and blames blocking work on the command, task and guild running it
+        self.loop_monitor = LoopLagMonitor()
+        
+        # Defers slow interactions before Discord's 3 second deadline and records where it happened
+        self.deadline_guard = InteractionDeadlineGuard(loop_monitor=self.loop_monitor)
+        
+        # While /studyrecord is running, the guard and the ticks log anonymised traffic for replay
+        self.recording_stop = None
+        
+        # Level ups and pomodoro announcements are sent by a worker so shutdown can drain them
+        self.announcements = asyncio.Queue(maxsize=ANNOUNCEMENT_QUEUE_SIZE)
+        self.announcement_worker = None
+        
+        # Cleared during shutdown so no new sessions start while we drain
+        self.accepting_joins = True
         
-        # Start the pomodoro timer check task
-        self.pomodoro_timer_task.start()
+        # Per-guild pomodoro defaults, voice channel, volume and announcement channel
+        self.guild_settings = GuildSettingsCache(self.db_manager)
+        
+        # On-demand CPU/allocation captures for owners; idle until a capture is requested
+        self.profiler = Profiler()
+        
+        # Stats and leaderboard image cards are drawn in worker processes, off the event loop
+        self.card_renderer = CardRenderer()
+        
+        # Simulations drive the ticks themselves instead of starting the loops
+        if start_tasks:
+            # Start the XP reward task
+            self.xp_reward_task.start()
+            
+            # Start the pomodoro timer check task
+            self.pomodoro_timer_task.start()
         
         print("Study cog initialized and database tables created.")
 
-    def cog_unload(self):
+    async def cog_load(self):
+        """Start the loop lag monitor and let SIGUSR1/SIGUSR2 trigger profile captures without restarting the bot"""
+        # Session buttons on messages from before a restart keep working
+        self.bot.add_view(StudySessionView(self))
+        self.loop_monitor.start()
+        self.profiler.install_signal_handlers(asyncio.get_running_loop())
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Warm the settings cache for every connected guild in one query"""
+        count = self.guild_settings.preload(guild.id for guild in self.bot.guilds)
+        print(f"Preloaded settings for {count} guilds.")
+
+    def session_lock(self, server_id):
+        """Lock serialising changes to one guild's session"""
+        lock = self.session_locks.get(server_id)
+        if lock is None:
+            lock = self.session_locks[server_id] = asyncio.Lock()
+        return lock
+
+    @contextlib.asynccontextmanager
+    async def session_write(self, server_id):
+        """Hold a guild's session lock for a change that writes to the database, counting it towards the write backlog"""
+        self.pending_writes += 1
+        try:
+            async with self.session_lock(server_id):
+                yield
+        finally:
+            self.pending_writes -= 1
+
+    def write_backlog(self):
+        # A join waiting on the writer thread counts here and in pending_writes, which only sheds reads a little sooner
+        return self.pending_writes + self.xp_tick_pending + self.queued_writes
+
+    async def admit(self, tracked, command, low_priority=False):
+        """Apply the command throttle to an interaction, telling the user when to retry if it's refused"""
+        interaction = tracked.interaction
+        outcome = self.throttle.check(command, interaction.user.id, interaction.guild_id, low_priority, self.write_backlog())
+        if outcome is None:
+            return True
+        
+        if outcome == 'shed':
+            message = "⏳ The bot is busy saving everyone's study progress. Please try again in a few seconds!"
+        else:
+            retry_after = math.ceil(self.throttle.retry_after(outcome, interaction.user.id, interaction.guild_id))
+            message = f"⏳ Slow down! Please try again in {retry_after} seconds."
+        await tracked.send(message, ephemeral=True)
+        return False
+
+    def status_embed(self, guild):
+        """The live status of a guild's study session, as shown on its status message"""
+        session_data = self.active_sessions.get(guild.id)
+        if session_data is None:
+            embed = discord.Embed(
+                title="📚 Study Session",
+                description="Start a new study session! Join to earn XP every minute you study.",
+                color=0x0099ff
+            )
+            embed.add_field(name="XP Reward", value="15-25 XP per minute", inline=True)
+            return embed
+        
+        participant_count = len(session_data['participants'])
+        embed = discord.Embed(
+            title="📚 Active Study Session",
+            description="A study session is running! Join or leave using the buttons below.",
+            color=0x0099ff
+        )
+        embed.add_field(name="Participants", value=str(participant_count), inline=True)
+        embed.add_field(name="Session ID", value=str(session_data['session_id']), inline=True)
+        embed.add_field(name="Started", value=f"<t:{session_data['start_time']}:R>", inline=True)
+        
+        pomodoro = session_data.get('pomodoro')
+        if pomodoro and pomodoro.get('enabled'):
+            phase = "📚 Work" if pomodoro['current_phase'] == 'work' else "☕ Break"
+            embed.add_field(
+                name="Pomodoro",
+                value=f"{phase} • cycle {pomodoro['cycle_count']} • ends <t:{pomodoro['phase_end']}:R>",
+                inline=False
+            )
+        
+        # Show current participants
+        if participant_count > 0:
+            participant_mentions = []
+            for user_id in list(session_data['participants'])[:10]:  # Show max 10 participants
+                user = guild.get_member(user_id)
+                if user:
+                    participant_mentions.append(user.mention)
+            
+            if participant_mentions:
+                embed.add_field(
+                    name="Current Participants",
+                    value="\n".join(participant_mentions) + ("..." if participant_count > 10 else ""),
+                    inline=False
+                )
+        return embed
+
+    def refresh_status(self, guild):
+        """Schedule an edit of the guild's status message; changes within STATUS_EDIT_WINDOW share one edit"""
+        message = self.status_messages.get(guild.id)
+        if message is not None:
+            self.status_edits.request(guild.id, message, lambda: {'embed': self.status_embed(guild)})
+
+    def adopt_status_message(self, interaction):
+        """Keep updating a status message whose buttons were used after a restart"""
+        if interaction.message is not None and interaction.guild.id not in self.status_messages:
+            self.status_messages[interaction.guild.id] = interaction.message
+
+    def forget_status_message(self, server_id, message, error):
+        # Usually the message was deleted; /study will post a new one
+        if self.status_messages.get(server_id) is message:
+            del self.status_messages[server_id]
+
+    async def db_write(self, method, *args, **kwargs):
+        """Run a database write on the writer thread, after every write queued before it"""
+        if not self.db_manager.concurrent_reads:
+            return method(*args, **kwargs)  # In-memory databases only have the one connection, used inline
+        self.queued_writes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.db_writer, functools.partial(method, *args, **kwargs))
+        finally:
+            self.queued_writes -= 1
+
+    async def db_read(self, method, *args, **kwargs):
+        """Run a DatabaseManager read in a thread on a pooled connection, so it runs alongside writes instead of behind them"""
+        if not self.db_manager.concurrent_reads:
+            return method(*args, **kwargs)
+        return await asyncio.to_thread(method, *args, **kwargs)
+
+    async def update_guild_settings(self, server_id, **changes):
+        """Write a server's settings on the writer thread, then drop its cached copy here on the event loop.
+
+        The cache fills misses on the event loop, so invalidating from the writer thread could
+        land while a miss is reading the old row, which it would then cache after the invalidation.
+        """
+        await self.db_write(self.db_manager.update_guild_settings, server_id, **changes)
+        self.guild_settings.invalidate(server_id)
+
+    def unstreaked_minutes(self, session_data, user_id, now):
+        """Stop tracking a leaving participant and return the minutes their XP ticks didn't credit to streaks"""
+        joined_at = session_data['joined_at'].pop(user_id, session_data['start_time'])
+        credited = session_data['streak_minutes'].pop(user_id, 0)
+        return max(0, (now - joined_at) // 60 - credited)
+
+    def record_event(self, name):
+        if self.deadline_guard.recorder:
+            self.deadline_guard.recorder.record('event', name)
+
+    def start_recording(self, minutes):
+        """Log anonymised traffic to a new file under recordings/ for `minutes`, returning the recorder"""
+        recorder = TrafficRecorder.start(clock=self.clock)
+        self.deadline_guard.recorder = recorder
+        
+        async def stop_later():
+            await asyncio.sleep(minutes * 60)
+            self.recording_stop = None
+            self.stop_recording()
+        
+        self.recording_stop = asyncio.create_task(stop_later())
+        return recorder
+
+    def stop_recording(self):
+        """Stop any running recording, returning its recorder or None"""
+        recorder, self.deadline_guard.recorder = self.deadline_guard.recorder, None
+        if self.recording_stop:
+            self.recording_stop.cancel()
+            self.recording_stop = None
+        if recorder:
+            recorder.close()
+            print(f"Recorded {recorder.recorded} interactions and events to {recorder.path}")
+        return recorder
+
+    async def render_card(self, kind, data, embed):
+        """Render an image card into the embed, returning the file to attach or None to send the embed as text"""
+        if not CARDS_AVAILABLE:
+            embed.set_footer(text="Image cards aren't available on this bot.")
+            return None
+        try:
+            png = await self.card_renderer.render(kind, data)
+        except CardQueueFull:
+            embed.set_footer(text="Too many cards are being drawn right now, so here's the text version.")
+            return None
+        except Exception as e:
+            print(f"Error rendering {kind} card: {e}")
+            return None
+        filename = f"{kind}.png"
+        embed.set_image(url=f"attachment://{filename}")
+        return discord.File(io.BytesIO(png), filename=filename)
+
+    def announcement_channel(self, guild, session_data):
+        """Channel for session announcements: the configured one, otherwise where the session started"""
+        channel_id = self.guild_settings.get(guild.id)['announcement_channel_id'] or session_data.get('channel_id')
+        if channel_id:
+            return guild.get_channel(channel_id)
+        return None
+
+    def queue_announcement(self, channel, **kwargs):
+        """Queue a message to be sent to a channel by the announcement worker"""
+        if self.announcement_worker is None or self.announcement_worker.done():
+            self.announcement_worker = asyncio.create_task(self.send_announcements())
+        try:
+            self.announcements.put_nowait((channel, kwargs))
+        except asyncio.QueueFull:
+            print(f"Announcement queue full, dropping message for channel {channel.id}")
+
+    async def send_announcements(self):
+        """Send queued announcements one at a time"""
+        while True:
+            channel, kwargs = await self.announcements.get()
+            try:
+                await channel.send(**kwargs)
+            except Exception as e:
+                print(f"Error sending announcement: {e}")
+            finally:
+                self.announcements.task_done()
+
+    async def cog_unload(self):
         """Clean up when cog is unloaded"""
+        self.profiler.remove_signal_handlers()
+        await self.shutdown()
+
+    async def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stop the bot's study work without losing anyone's progress.
+
+        Stops new joins and the background ticks, drains queued announcements,
+        disconnects voice, credits every current participant and ends their sessions
+        in one transaction, and checkpoints XP. Finishes within roughly `timeout` seconds:
+        crediting always completes, even when a busy writer makes it overrun, but the XP
+        checkpoint is skipped or interrupted once the budget is spent.
+        """
+        started = time.perf_counter()
+        self.accepting_joins = False
         self.xp_reward_task.cancel()
         self.pomodoro_timer_task.cancel()
+        self.loop_monitor.stop()
+        self.card_renderer.close()
+        
+        # Give queued announcements half of the budget to go out
+        pending = self.announcements.qsize()
+        try:
+            await asyncio.wait_for(self.announcements.join(), timeout=timeout / 2)
+        except asyncio.TimeoutError:
+            pass
+        dropped = self.announcements.qsize()
+        if self.announcement_worker:
+            self.announcement_worker.cancel()
+        
+        # Disconnect voice clients with whatever budget remains
+        voice_clients = list(getattr(self.bot, 'voice_clients', []))
+        if voice_clients:
+            remaining = max(0.1, timeout - (time.perf_counter() - started))
+            disconnects = [voice_client.disconnect(force=True) for voice_client in voice_clients]
+            try:
+                await asyncio.wait_for(asyncio.gather(*disconnects, return_exceptions=True), timeout=remaining)
+            except asyncio.TimeoutError:
+                print("Timed out disconnecting voice clients")
+        
+        # Credit everyone still studying exactly like leave_session would, in one transaction.
+        # Holding every guild's session lock waits out joins and leaves already part way through
+        # their writes, so nobody is credited twice and no half-started session is left open
+        credits = []
+        session_ids = []
+        timed_out = False
+        checkpointed = False
+        try:
+            async with contextlib.AsyncExitStack() as held:
+                for server_id in sorted(self.session_locks):
+                    await held.enter_async_context(self.session_lock(server_id))
+                
+                current_time = int(self.clock.time())
+                streak_minutes = {}
+                for server_id, session_data in self.active_sessions.items():
+                    study_duration = max(0, (current_time - session_data['start_time']) // 60)
+                    for user_id in session_data['participants']:
+                        credits.append((user_id, server_id, study_duration))
+                        streak_minutes.setdefault(server_id, []).append(
+                            (user_id, self.unstreaked_minutes(session_data, user_id, current_time))
+                        )
+                    session_ids.append(session_data['session_id'])
+                
+                def save_sessions():
+                    self.db_manager.credit_study_time_batch(credits, session_ids)
+                    for server_id, minutes_by_user in streak_minutes.items():
+                        self.db_manager.record_study_minutes(server_id, minutes_by_user)
+                
+                # Crediting is the one step that waits past the budget; losing progress is worse than a slow restart
+                saving = asyncio.ensure_future(self.db_write(save_sessions))
+                try:
+                    await asyncio.wait_for(asyncio.shield(saving), timeout=max(0.0, timeout - (time.perf_counter() - started)))
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    print("Shutdown budget spent waiting for the database writer; still crediting participants")
+                    await saving
+                self.active_sessions.clear()
+            checkpointed = await self.checkpoint_xp_within(timeout - (time.perf_counter() - started))
+            timed_out = timed_out or not checkpointed
+        except Exception as e:
+            print(f"Error saving sessions during shutdown: {e}")
+        self.db_writer.shutdown(wait=False)
+        self.stop_recording()
         
-    @tasks.loop(minutes=1)
+        # Show every status message as ended rather than leaving stale participants up
+        for server_id in list(self.status_messages):
+            guild = self.bot.get_guild(server_id)
+            if guild:
+                self.refresh_status(guild)
+        try:
+            await asyncio.wait_for(self.status_edits.flush(), timeout=max(0.1, timeout - (time.perf_counter() - started)))
+        except asyncio.TimeoutError:
+            print("Timed out updating study status messages")
+        
+        report = {
+            'seconds': time.perf_counter() - started,
+            'announcements_sent': pending - dropped,
+            'announcements_dropped': dropped,
+            'voice_clients': len(voice_clients),
+            'sessions_ended': len(session_ids),
+            'participants_credited': len(credits),
+            'checkpointed': checkpointed,
+            'timed_out': timed_out,
+        }
+        print(
+            f"Study cog shut down in {report['seconds']:.2f}s: {report['sessions_ended']} sessions ended, "
+            f"{report['participants_credited']} participants credited, {report['announcements_sent']} announcements sent, "
+            f"{report['announcements_dropped']} dropped, {report['voice_clients']} voice clients disconnected"
+        )
+        return report
+
+    async def checkpoint_xp_within(self, seconds):
+        """Checkpoint XP on the writer thread, giving up after `seconds`. Returns whether it was made.
+
+        The checkpoint copies every userstats row, so on a big table it's interrupted and rolled
+        back rather than holding up shutdown. The ledger stays complete either way; XP replays
+        just start from the previous checkpoint until the next one is made.
+        """
+        if seconds <= 0:
+            print("Skipped the XP checkpoint: the shutdown budget is spent")
+            return False
+        state = {'cancelled': False, 'running': False}
+        state_lock = threading.Lock()
+        
+        def checkpoint():
+            with state_lock:
+                if state['cancelled']:
+                    return False
+                state['running'] = True
+            try:
+                self.db_manager.create_xp_checkpoint()
+                return True
+            except sqlite3.OperationalError:
+                self.db_manager.connection.rollback()
+                if state['cancelled']:
+                    return False
+                raise
+            finally:
+                with state_lock:
+                    state['running'] = False
+        
+        checkpointing = asyncio.ensure_future(self.db_write(checkpoint))
+        try:
+            return await asyncio.wait_for(asyncio.shield(checkpointing), timeout=seconds)
+        except asyncio.TimeoutError:
+            with state_lock:
+                state['cancelled'] = True
+                if state['running']:
+                    self.db_manager.connection.interrupt()
+            print("Interrupted the XP checkpoint: the shutdown budget is spent")
+            # Returns as soon as the interrupted statement has rolled back, or straight away if it never started
+            return await checkpointing
+        
+    @tasks.loop(seconds=XP_TICK_SECONDS)
     async def xp_reward_task(self):
         """Award XP to users in active study sessions every minute"""
-        for server_id, session_data in self.active_sessions.items():
-            participants = session_data['participants'].copy()  # Copy to avoid modification during iteration
+        self.record_event('xp_tick')
+        await self.award_xp_tick()
+
+    async def award_xp_tick(self):
+        """Award one minute's XP to every participant of every active session"""
+        # Iterate over a snapshot so sessions can start and end while the tick runs
+        snapshot = list(self.active_sessions.items())
+        self.xp_tick_pending = sum(len(session_data['participants']) for _server_id, session_data in snapshot)
+        for server_id, session_data in snapshot:
+            # Each guild's share of the tick is attributed separately so a slow guild stands out
+            with self.loop_monitor.attribute('xp_reward_task', server_id):
+                async with self.session_lock(server_id):
+                    if self.active_sessions.get(server_id) is not session_data:
+                        continue  # Ended since the snapshot was taken
+                    participants = session_data['participants'].copy()  # Copy to avoid modification during iteration
+                
+                    try:
+                        # Award XP to the whole session in one batched write to the XP ledger
+                        awards = await self.db_write(self.db_manager.award_xp_batch, server_id, participants, session_data['session_id'])
+                        # The same minute counts towards streaks, daily goals and focus scores
+                        await self.db_write(self.db_manager.record_study_minutes, server_id, [(user_id, 1) for user_id in participants])
+                        streak_minutes = session_data['streak_minutes']
+                        for user_id in participants:
+                            streak_minutes[user_id] = streak_minutes.get(user_id, 0) + 1
+                    except Exception as e:
+                        print(f"Error awarding XP in server {server_id}: {e}")
+                        continue
+                    finally:
+                        self.xp_tick_pending -= len(participants)
             
-            for user_id in participants:
-                try:
-                    # Ensure user exists in database
-                    user_data = self.db_manager.get_user(user_id, server_id)
-                    if not user_data:
-                        self.db_manager.add_user(user_id, server_id)
-                    
-                    # Award XP and check for level up
-                    leveled_up, new_level, xp_gained = self.db_manager.increment_xp(user_id, server_id)
-                    
+                for user_id, leveled_up, new_level, xp_gained in awards:
                     # If user leveled up, send a message
                     if leveled_up:
                         try:
@@ -70,42 +534,46 @@ class Study(commands.Cog):
                             if guild:
                                 user = guild.get_member(user_id)
                                 if user:
-                                    # Get the channel where the study session was started
-                                    channel_id = session_data.get('channel_id')
-                                    if channel_id:
-                                        channel = guild.get_channel(channel_id)
-                                        if channel and channel.permissions_for(guild.me).send_messages:
-                                            embed = discord.Embed(
-                                                title="📚 Study Level Up!",
-                                                description=f"Congratulations {user.mention}! You reached study level **{new_level}** by staying focused!",
-                                                color=0x00ff00
-                                            )
-                                            embed.add_field(name="XP Gained", value=f"+{xp_gained}", inline=True)
-                                            await channel.send(embed=embed)
+                                    channel = self.announcement_channel(guild, session_data)
+                                    if channel and channel.permissions_for(guild.me).send_messages:
+                                        embed = discord.Embed(
+                                            title="📚 Study Level Up!",
+                                            description=f"Congratulations {user.mention}! You reached study level **{new_level}** by staying focused!",
+                                            color=0x00ff00
+                                        )
+                                        embed.add_field(name="XP Gained", value=f"+{xp_gained}", inline=True)
+                                        self.queue_announcement(channel, embed=embed)
                         except Exception as e:
                             print(f"Error sending level up message: {e}")
-                            
-                except Exception as e:
-                    print(f"Error awarding XP to user {user_id}: {e}")
+        
+        # Sessions that ended mid-tick never reached their award
+        self.xp_tick_pending = 0
 
     @xp_reward_task.before_loop
     async def before_xp_reward_task(self):
         """Wait until bot is ready before starting the task"""
         await self.bot.wait_until_ready()
 
-    @tasks.loop(seconds=30)
+    @tasks.loop(seconds=POMODORO_TICK_SECONDS)
     async def pomodoro_timer_task(self):
         """Check pomodoro timers and handle phase transitions"""
-        current_time = int(time.time())
+        self.record_event('pomodoro_tick')
+        await self.check_pomodoro_timers()
+
+    async def check_pomodoro_timers(self):
+        """Advance every pomodoro timer whose current phase has ended"""
+        current_time = int(self.clock.time())
         
-        for server_id, session_data in self.active_sessions.items():
+        # Iterate over a snapshot: phase changes await voice playback, during which sessions can end
+        for server_id, session_data in list(self.active_sessions.items()):
             pomodoro = session_data.get('pomodoro')
             if not pomodoro or not pomodoro.get('enabled'):
                 continue
                 
             # Check if current phase has ended
             if current_time >= pomodoro['phase_end']:
-                await self.handle_pomodoro_phase_change(server_id, session_data)
+                with self.loop_monitor.attribute('pomodoro_timer_task', server_id):
+                    await self.handle_pomodoro_phase_change(server_id, session_data)
 
     @pomodoro_timer_task.before_loop
     async def before_pomodoro_timer_task(self):
@@ -115,34 +583,42 @@ class Study(commands.Cog):
     async def handle_pomodoro_phase_change(self, server_id, session_data):
         """Handle transition between work and break phases"""
         try:
-            pomodoro = session_data['pomodoro']
-            current_phase = pomodoro['current_phase']
-            
-            # Switch phases
-            if current_phase == 'work':
-                new_phase = 'break'
-                duration = pomodoro['break_duration']
-                pomodoro['cycle_count'] += 1
-                emoji = "☕"
-                message = f"Work session complete! Time for a {duration}-minute break."
-            else:
-                new_phase = 'work'
-                duration = pomodoro['work_duration']
-                emoji = "📚"
-                message = f"Break time's over! Time for a {duration}-minute work session."
-            
-            # Update pomodoro data
-            current_time = int(time.time())
-            pomodoro['current_phase'] = new_phase
-            pomodoro['phase_start'] = current_time
-            pomodoro['phase_end'] = current_time + (duration * 60)
+            async with self.session_lock(server_id):
+                # The session may have ended, or the timer been stopped or restarted, while we waited
+                pomodoro = session_data.get('pomodoro')
+                current_time = int(self.clock.time())
+                if (self.active_sessions.get(server_id) is not session_data or not pomodoro
+                        or not pomodoro.get('enabled') or current_time < pomodoro['phase_end']):
+                    return
+                current_phase = pomodoro['current_phase']
+                
+                # Switch phases
+                if current_phase == 'work':
+                    new_phase = 'break'
+                    duration = pomodoro['break_duration']
+                    pomodoro['cycle_count'] += 1
+                    emoji = "☕"
+                    message = f"Work session complete! Time for a {duration}-minute break."
+                else:
+                    new_phase = 'work'
+                    duration = pomodoro['work_duration']
+                    emoji = "📚"
+                    message = f"Break time's over! Time for a {duration}-minute work session."
+                
+                # Update pomodoro data
+                pomodoro['current_phase'] = new_phase
+                pomodoro['phase_start'] = current_time
+                pomodoro['phase_end'] = current_time + (duration * 60)
+                cycle_count = pomodoro['cycle_count']
+                phase_end = pomodoro['phase_end']
             
             # Get guild and channel
             guild = self.bot.get_guild(server_id)
             if not guild:
                 return
+            self.refresh_status(guild)
                 
-            channel = guild.get_channel(session_data['channel_id'])
+            channel = self.announcement_channel(guild, session_data)
             if not channel:
                 return
             
@@ -152,11 +628,11 @@ class Study(commands.Cog):
                 description=message,
                 color=0xff6b6b if new_phase == 'break' else 0x4ecdc4
             )
-            embed.add_field(name="Cycle", value=f"{pomodoro['cycle_count']}", inline=True)
-            embed.add_field(name="Next Phase", value=f"<t:{pomodoro['phase_end']}:R>", inline=True)
+            embed.add_field(name="Cycle", value=f"{cycle_count}", inline=True)
+            embed.add_field(name="Next Phase", value=f"<t:{phase_end}:R>", inline=True)
             
             # Send notification to text channel
-            await channel.send(embed=embed)
+            self.queue_announcement(channel, embed=embed)
             
             # Play voice notification if voice channel is set
             voice_channel_id = pomodoro.get('voice_channel_id')
@@ -213,531 +689,931 @@ class Study(commands.Cog):
         
     @app_commands.command(name='study', description='Start or join a study session to earn XP')
     async def study(self, interaction: discord.Interaction):
-        """Starts a study session with buttons to join/leave."""
-        server_id = interaction.guild.id
-        
-        # Check if there's already an active session
-        if server_id in self.active_sessions:
-            session_data = self.active_sessions[server_id]
-            participant_count = len(session_data['participants'])
+        """Posts the server's live study session status with buttons to join/leave."""
+        async with self.deadline_guard.track(interaction, 'study', ephemeral=True) as tracked:
+            server_id = interaction.guild.id
             
-            embed = discord.Embed(
-                title="📚 Active Study Session",
-                description="A study session is already running! Join or leave using the buttons below.",
-                color=0x0099ff
-            )
-            embed.add_field(name="Participants", value=str(participant_count), inline=True)
-            embed.add_field(name="Session ID", value=str(session_data['session_id']), inline=True)
-            
-            # Show current participants
-            if participant_count > 0:
-                participant_mentions = []
-                for user_id in list(session_data['participants'])[:10]:  # Show max 10 participants
-                    user = interaction.guild.get_member(user_id)
-                    if user:
-                        participant_mentions.append(user.mention)
-                
-                if participant_mentions:
-                    embed.add_field(
-                        name="Current Participants", 
-                        value="\n".join(participant_mentions) + ("..." if participant_count > 10 else ""),
-                        inline=False
-                    )
-        else:
-            embed = discord.Embed(
-                title="📚 Study Session",
-                description="Start a new study session! Join to earn XP every minute you study.",
-                color=0x0099ff
-            )
-            embed.add_field(name="XP Reward", value="15-25 XP per minute", inline=True)
-        
-        view = StudySessionView(self, server_id)
-        await interaction.response.send_message(embed=embed, view=view)
+            # One status message per session; point at it rather than posting another copy
+            status_message = self.status_messages.get(server_id)
+            if status_message is not None:
+                await tracked.send(
+                    f"📌 The study session's live status is here: {status_message.jump_url}",
+                    embed=self.status_embed(interaction.guild),
+                    ephemeral=True
+                )
+                return
+            
+            try:
+                status_message = await interaction.channel.send(embed=self.status_embed(interaction.guild), view=StudySessionView(self))
+            except discord.HTTPException as e:
+                await tracked.send(f"❌ Couldn't post the study session status here: {e.text}", ephemeral=True)
+                return
+            self.status_messages[server_id] = status_message
+            await tracked.send("📌 Posted the study session's live status. Join or leave with its buttons!", ephemeral=True)
 
     @app_commands.command(name='pomodoro', description='Set up a pomodoro timer for the current study session')
     @app_commands.describe(
-        work_minutes='Duration of work sessions in minutes (default: 25)',
-        break_minutes='Duration of break sessions in minutes (default: 5)',
-        voice_channel='Voice channel to play notifications in (optional)'
+        work_minutes='Duration of work sessions in minutes (default: server setting, normally 25)',
+        break_minutes='Duration of break sessions in minutes (default: server setting, normally 5)',
+        voice_channel='Voice channel to play notifications in (default: server setting)'
     )
-    async def pomodoro(self, interaction: discord.Interaction, work_minutes: int = 25, break_minutes: int = 5, voice_channel: discord.VoiceChannel = None):
+    async def pomodoro(self, interaction: discord.Interaction, work_minutes: int = None, break_minutes: int = None, voice_channel: discord.VoiceChannel = None):
         """Set up pomodoro timer for the current study session"""
-        server_id = interaction.guild.id
+        async with self.deadline_guard.track(interaction, 'pomodoro') as tracked:
+            server_id = interaction.guild.id
         
-        # Check if there's an active session
-        if server_id not in self.active_sessions:
-            await interaction.response.send_message(
-                "❌ No active study session found! Use `/study` to start a session first.",
-                ephemeral=True
-            )
-            return
+            # Check if there's an active session
+            if server_id not in self.active_sessions:
+                await tracked.send(
+                    "❌ No active study session found! Use `/study` to start a session first.",
+                    ephemeral=True
+                )
+                return
         
-        # Validate inputs
-        if work_minutes < 1 or work_minutes > 120:
-            await interaction.response.send_message(
-                "❌ Work duration must be between 1 and 120 minutes.",
-                ephemeral=True
-            )
-            return
+            # Fall back to the server's configured defaults
+            settings = self.guild_settings.get(server_id)
+            if work_minutes is None:
+                work_minutes = settings['work_minutes']
+            if break_minutes is None:
+                break_minutes = settings['break_minutes']
+            if voice_channel is None and settings['voice_channel_id']:
+                voice_channel = interaction.guild.get_channel(settings['voice_channel_id'])
+        
+            # Validate inputs
+            if work_minutes < 1 or work_minutes > 120:
+                await tracked.send(
+                    "❌ Work duration must be between 1 and 120 minutes.",
+                    ephemeral=True
+                )
+                return
             
-        if break_minutes < 1 or break_minutes > 60:
-            await interaction.response.send_message(
-                "❌ Break duration must be between 1 and 60 minutes.",
-                ephemeral=True
+            if break_minutes < 1 or break_minutes > 60:
+                await tracked.send(
+                    "❌ Break duration must be between 1 and 60 minutes.",
+                    ephemeral=True
+                )
+                return
+        
+            # Set up pomodoro timer
+            current_time = int(self.clock.time())
+            async with self.session_lock(server_id):
+                session_data = self.active_sessions.get(server_id)
+                if session_data:
+                    session_data['pomodoro'] = {
+                        'enabled': True,
+                        'work_duration': work_minutes,
+                        'break_duration': break_minutes,
+                        'current_phase': 'work',
+                        'phase_start': current_time,
+                        'phase_end': current_time + (work_minutes * 60),
+                        'voice_channel_id': voice_channel.id if voice_channel else None,
+                        'cycle_count': 1,
+                        'volume': settings['volume']
+                    }
+        
+            if not session_data:
+                await tracked.send("❌ The study session ended before the timer could start.", ephemeral=True)
+                return
+            self.refresh_status(interaction.guild)
+        
+            embed = discord.Embed(
+                title="⏰ Pomodoro Timer Started!",
+                description=f"Timer configured for the current study session.",
+                color=0x4ecdc4
             )
-            return
-        
-        # Set up pomodoro timer
-        current_time = int(time.time())
-        session_data = self.active_sessions[server_id]
-        
-        session_data['pomodoro'] = {
-            'enabled': True,
-            'work_duration': work_minutes,
-            'break_duration': break_minutes,
-            'current_phase': 'work',
-            'phase_start': current_time,
-            'phase_end': current_time + (work_minutes * 60),
-            'voice_channel_id': voice_channel.id if voice_channel else None,
-            'cycle_count': 1,
-            'volume': 0.5  # Default volume 50%
-        }
+            embed.add_field(name="Work Duration", value=f"{work_minutes} minutes", inline=True)
+            embed.add_field(name="Break Duration", value=f"{break_minutes} minutes", inline=True)
+            embed.add_field(name="Current Phase", value="📚 Work", inline=True)
+            embed.add_field(name="Phase Ends", value=f"<t:{session_data['pomodoro']['phase_end']}:R>", inline=True)
+            embed.add_field(name="Cycle", value="1", inline=True)
         
-        embed = discord.Embed(
-            title="⏰ Pomodoro Timer Started!",
-            description=f"Timer configured for the current study session.",
-            color=0x4ecdc4
-        )
-        embed.add_field(name="Work Duration", value=f"{work_minutes} minutes", inline=True)
-        embed.add_field(name="Break Duration", value=f"{break_minutes} minutes", inline=True)
-        embed.add_field(name="Current Phase", value="📚 Work", inline=True)
-        embed.add_field(name="Phase Ends", value=f"<t:{session_data['pomodoro']['phase_end']}:R>", inline=True)
-        embed.add_field(name="Cycle", value="1", inline=True)
-        
-        if voice_channel:
-            embed.add_field(name="Voice Notifications", value=f"#{voice_channel.name}", inline=True)
-        else:
-            embed.add_field(name="Voice Notifications", value="Disabled", inline=True)
+            if voice_channel:
+                embed.add_field(name="Voice Notifications", value=f"#{voice_channel.name}", inline=True)
+            else:
+                embed.add_field(name="Voice Notifications", value="Disabled", inline=True)
         
-        view = PomodoroControlView(self, server_id)
-        await interaction.response.send_message(embed=embed, view=view)
+            view = PomodoroControlView(self, server_id)
+            await tracked.send(embed=embed, view=view)
 
     @app_commands.command(name='pomoinfo', description='View information about the current pomodoro timer')
     async def pomodoro_info(self, interaction: discord.Interaction):
         """Display current pomodoro timer information"""
-        server_id = interaction.guild.id
+        async with self.deadline_guard.track(interaction, 'pomoinfo') as tracked:
+            server_id = interaction.guild.id
         
-        if server_id not in self.active_sessions:
-            await interaction.response.send_message(
-                "❌ No active study session found!",
-                ephemeral=True
-            )
-            return
+            if server_id not in self.active_sessions:
+                await tracked.send(
+                    "❌ No active study session found!",
+                    ephemeral=True
+                )
+                return
         
-        session_data = self.active_sessions[server_id]
-        pomodoro = session_data.get('pomodoro')
+            session_data = self.active_sessions[server_id]
+            pomodoro = session_data.get('pomodoro')
         
-        if not pomodoro or not pomodoro.get('enabled'):
-            await interaction.response.send_message(
-                "❌ No pomodoro timer is active for this session!",
-                ephemeral=True
-            )
-            return
+            if not pomodoro or not pomodoro.get('enabled'):
+                await tracked.send(
+                    "❌ No pomodoro timer is active for this session!",
+                    ephemeral=True
+                )
+                return
         
-        current_phase = pomodoro['current_phase']
-        phase_emoji = "📚" if current_phase == 'work' else "☕"
-        phase_name = current_phase.capitalize()
+            current_phase = pomodoro['current_phase']
+            phase_emoji = "📚" if current_phase == 'work' else "☕"
+            phase_name = current_phase.capitalize()
         
-        embed = discord.Embed(
-            title=f"{phase_emoji} Pomodoro Timer Status",
-            description=f"Currently in {phase_name} phase",
-            color=0x4ecdc4 if current_phase == 'work' else 0xff6b6b
-        )
-        embed.add_field(name="Work Duration", value=f"{pomodoro['work_duration']} minutes", inline=True)
-        embed.add_field(name="Break Duration", value=f"{pomodoro['break_duration']} minutes", inline=True)
-        embed.add_field(name="Current Cycle", value=f"{pomodoro['cycle_count']}", inline=True)
-        embed.add_field(name="Phase Ends", value=f"<t:{pomodoro['phase_end']}:R>", inline=True)
-        
-        voice_channel_id = pomodoro.get('voice_channel_id')
-        if voice_channel_id:
-            voice_channel = interaction.guild.get_channel(voice_channel_id)
-            if voice_channel:
-                embed.add_field(name="Voice Notifications", value=f"#{voice_channel.name}", inline=True)
-                # Show volume level
-                volume_percent = int(pomodoro.get('volume', 0.5) * 100)
-                embed.add_field(name="Volume", value=f"{volume_percent}%", inline=True)
-        else:
-            embed.add_field(name="Voice Notifications", value="Disabled", inline=True)
+            embed = discord.Embed(
+                title=f"{phase_emoji} Pomodoro Timer Status",
+                description=f"Currently in {phase_name} phase",
+                color=0x4ecdc4 if current_phase == 'work' else 0xff6b6b
+            )
+            embed.add_field(name="Work Duration", value=f"{pomodoro['work_duration']} minutes", inline=True)
+            embed.add_field(name="Break Duration", value=f"{pomodoro['break_duration']} minutes", inline=True)
+            embed.add_field(name="Current Cycle", value=f"{pomodoro['cycle_count']}", inline=True)
+            embed.add_field(name="Phase Ends", value=f"<t:{pomodoro['phase_end']}:R>", inline=True)
         
-        participants = len(session_data['participants'])
-        embed.add_field(name="Participants", value=f"{participants} studying", inline=True)
+            voice_channel_id = pomodoro.get('voice_channel_id')
+            if voice_channel_id:
+                voice_channel = interaction.guild.get_channel(voice_channel_id)
+                if voice_channel:
+                    embed.add_field(name="Voice Notifications", value=f"#{voice_channel.name}", inline=True)
+                    # Show volume level
+                    volume_percent = int(pomodoro.get('volume', 0.5) * 100)
+                    embed.add_field(name="Volume", value=f"{volume_percent}%", inline=True)
+            else:
+                embed.add_field(name="Voice Notifications", value="Disabled", inline=True)
         
-        await interaction.response.send_message(embed=embed)
+            participants = len(session_data['participants'])
+            embed.add_field(name="Participants", value=f"{participants} studying", inline=True)
+        
+            await tracked.send(embed=embed)
 
     @app_commands.command(name='pomovolume', description='Set the volume for pomodoro timer notifications')
     @app_commands.describe(volume='Volume level from 0 to 100 (default: 50)')
     async def pomodoro_volume(self, interaction: discord.Interaction, volume: int):
         """Set the volume for pomodoro timer notifications"""
-        server_id = interaction.guild.id
+        async with self.deadline_guard.track(interaction, 'pomovolume') as tracked:
+            server_id = interaction.guild.id
         
-        # Validate volume input
-        if volume < 0 or volume > 100:
-            await interaction.response.send_message(
-                "❌ Volume must be between 0 and 100.",
-                ephemeral=True
-            )
-            return
+            # Validate volume input
+            if volume < 0 or volume > 100:
+                await tracked.send(
+                    "❌ Volume must be between 0 and 100.",
+                    ephemeral=True
+                )
+                return
         
-        # Check if there's an active session
-        if server_id not in self.active_sessions:
-            await interaction.response.send_message(
-                "❌ No active study session found! Use `/study` to start a session first.",
-                ephemeral=True
-            )
-            return
+            # Check if there's an active session
+            if server_id not in self.active_sessions:
+                await tracked.send(
+                    "❌ No active study session found! Use `/study` to start a session first.",
+                    ephemeral=True
+                )
+                return
         
-        session_data = self.active_sessions[server_id]
-        pomodoro = session_data.get('pomodoro')
+            session_data = self.active_sessions[server_id]
+            pomodoro = session_data.get('pomodoro')
         
-        if not pomodoro:
-            await interaction.response.send_message(
-                "❌ No pomodoro timer is active for this session! Use `/pomodoro` to start one first.",
-                ephemeral=True
-            )
-            return
+            if not pomodoro:
+                await tracked.send(
+                    "❌ No pomodoro timer is active for this session! Use `/pomodoro` to start one first.",
+                    ephemeral=True
+                )
+                return
         
-        # Convert percentage to decimal (0.0-1.0)
-        volume_decimal = volume / 100.0
-        pomodoro['volume'] = volume_decimal
+            # Convert percentage to decimal (0.0-1.0)
+            volume_decimal = volume / 100.0
+            pomodoro['volume'] = volume_decimal
+            # Remember it as the server's volume for future timers
+            await self.update_guild_settings(server_id, volume=volume_decimal)
+            await tracked.checkpoint('update_guild_settings')
         
-        embed = discord.Embed(
-            title="🔊 Pomodoro Volume Updated",
-            description=f"Volume set to {volume}%",
-            color=0x4ecdc4
-        )
+            embed = discord.Embed(
+                title="🔊 Pomodoro Volume Updated",
+                description=f"Volume set to {volume}%",
+                color=0x4ecdc4
+            )
         
-        # Show volume bar visualization
-        volume_bars = int(volume / 10)  # 10 bars for 100%
-        volume_display = "█" * volume_bars + "░" * (10 - volume_bars)
-        embed.add_field(name="Volume Level", value=f"`{volume_display}` {volume}%", inline=False)
+            # Show volume bar visualization
+            volume_bars = int(volume / 10)  # 10 bars for 100%
+            volume_display = "█" * volume_bars + "░" * (10 - volume_bars)
+            embed.add_field(name="Volume Level", value=f"`{volume_display}` {volume}%", inline=False)
         
-        # Test volume with a preview (if voice channel is set)
-        voice_channel_id = pomodoro.get('voice_channel_id')
-        if voice_channel_id:
-            voice_channel = interaction.guild.get_channel(voice_channel_id)
-            if voice_channel:
-                embed.add_field(name="Voice Channel", value=f"#{voice_channel.name}", inline=True)
-                embed.add_field(name="Test Sound", value="Playing preview...", inline=True)
+            # Test volume with a preview (if voice channel is set)
+            voice_channel_id = pomodoro.get('voice_channel_id')
+            if voice_channel_id:
+                voice_channel = interaction.guild.get_channel(voice_channel_id)
+                if voice_channel:
+                    embed.add_field(name="Voice Channel", value=f"#{voice_channel.name}", inline=True)
+                    embed.add_field(name="Test Sound", value="Playing preview...", inline=True)
                 
-                # Play a test sound at the new volume
-                try:
-                    await self.play_notification_sound(voice_channel, 'work', volume_decimal)
-                except Exception as e:
-                    embed.set_field_at(1, name="Test Sound", value="❌ Error playing preview", inline=True)
-                    print(f"Error playing test sound: {e}")
-        else:
-            embed.add_field(name="Voice Channel", value="Not set", inline=True)
-            embed.add_field(name="Test Sound", value="No voice channel configured", inline=True)
+                    # Play a test sound at the new volume
+                    try:
+                        await self.play_notification_sound(voice_channel, 'work', volume_decimal)
+                    except Exception as e:
+                        embed.set_field_at(1, name="Test Sound", value="❌ Error playing preview", inline=True)
+                        print(f"Error playing test sound: {e}")
+            else:
+                embed.add_field(name="Voice Channel", value="Not set", inline=True)
+                embed.add_field(name="Test Sound", value="No voice channel configured", inline=True)
         
-        await interaction.response.send_message(embed=embed)
+            await tracked.send(embed=embed)
 
     async def stop_pomodoro(self, interaction, server_id):
         """Stop the pomodoro timer for a session"""
-        if server_id in self.active_sessions:
-            session_data = self.active_sessions[server_id]
-            if 'pomodoro' in session_data:
-                session_data['pomodoro']['enabled'] = False
-                await interaction.response.send_message(
-                    "⏰ Pomodoro timer stopped!",
+        async with self.deadline_guard.track(interaction, 'stop_pomodoro', ephemeral=True) as tracked:
+            async with self.session_lock(server_id):
+                session_data = self.active_sessions.get(server_id)
+                if session_data is None:
+                    message = "❌ No active study session found!"
+                elif 'pomodoro' in session_data:
+                    session_data['pomodoro']['enabled'] = False
+                    message = "⏰ Pomodoro timer stopped!"
+                else:
+                    message = "❌ No pomodoro timer is active!"
+            
+            self.refresh_status(interaction.guild)
+            await tracked.send(message, ephemeral=True)
+
+    async def join_session(self, interaction, server_id):
+        """Handle user joining a study session"""
+        async with self.deadline_guard.track(interaction, 'join_session', ephemeral=True) as tracked:
+            user_id = interaction.user.id
+        
+            if not self.accepting_joins:
+                await tracked.send(RESTARTING_REPLY, ephemeral=True)
+                return
+        
+            if not await self.admit(tracked, 'join_session'):
+                return
+        
+            # Only the session change and its writes happen under the lock; deferring and replying are
+            # Discord round trips, which other joins and leaves in the guild shouldn't queue behind
+            async with self.session_write(server_id):
+                # Shutdown may have credited and cleared every session while this join waited for the lock
+                accepted = self.accepting_joins
+                if accepted:
+                    # Create session if it doesn't exist
+                    session_data = self.active_sessions.get(server_id)
+                    if session_data is None:
+                        session_id = await self.db_write(self.db_manager.start_study_session, server_id)
+                        session_data = self.active_sessions[server_id] = {
+                            'session_id': session_id,
+                            'participants': set(),
+                            'start_time': int(self.clock.time()),
+                            'joined_at': {},
+                            'streak_minutes': {},
+                            'channel_id': interaction.channel.id
+                        }
+                        tracked.stage = 'start_study_session'
+                
+                    # Add user to session
+                    joined = user_id not in session_data['participants']
+                    if joined:
+                        session_data['participants'].add(user_id)
+                        session_data['joined_at'][user_id] = int(self.clock.time())
+                    
+                        # Ensure user exists in database
+                        await self.db_write(self.db_manager.add_user, user_id, server_id)
+                    
+                        # Update user's session info
+                        await self.db_write(self.db_manager.update_user_session, user_id, server_id, session_data['session_id'])
+                        tracked.stage = 'update_user_session'
+                    participant_count = len(session_data['participants'])
+            await tracked.checkpoint(tracked.stage)
+            
+            if not accepted:
+                await tracked.send(RESTARTING_REPLY, ephemeral=True)
+            elif joined:
+                self.refresh_status(interaction.guild)
+                await tracked.send(
+                    f"✅ {interaction.user.mention} joined the study session! ({participant_count} participants)\n"
+                    f"You'll earn 15-25 XP every minute while studying. Good luck! 📖",
                     ephemeral=True
                 )
             else:
-                await interaction.response.send_message(
-                    "❌ No pomodoro timer is active!",
+                await tracked.send(
+                    "You're already in this study session! Keep up the good work! 💪",
                     ephemeral=True
                 )
-        else:
-            await interaction.response.send_message(
-                "❌ No active study session found!",
-                ephemeral=True
-            )
-
-    async def join_session(self, interaction, server_id):
-        """Handle user joining a study session"""
-        user_id = interaction.user.id
-        
-        # Create session if it doesn't exist
-        if server_id not in self.active_sessions:
-            session_id = self.db_manager.start_study_session(server_id)
-            self.active_sessions[server_id] = {
-                'session_id': session_id,
-                'participants': set(),
-                'start_time': int(time.time()),
-                'channel_id': interaction.channel.id
-            }
-        
-        # Add user to session
-        if user_id not in self.active_sessions[server_id]['participants']:
-            self.active_sessions[server_id]['participants'].add(user_id)
-            
-            # Ensure user exists in database
-            user_data = self.db_manager.get_user(user_id, server_id)
-            if not user_data:
-                self.db_manager.add_user(user_id, server_id)
-            
-            # Update user's session info
-            self.db_manager.update_user_session(user_id, server_id, self.active_sessions[server_id]['session_id'])
-            
-            participant_count = len(self.active_sessions[server_id]['participants'])
-            await interaction.response.send_message(
-                f"✅ {interaction.user.mention} joined the study session! ({participant_count} participants)\n"
-                f"You'll earn 15-25 XP every minute while studying. Good luck! 📖",
-                ephemeral=True
-            )
-        else:
-            await interaction.response.send_message(
-                "You're already in this study session! Keep up the good work! 💪",
-                ephemeral=True
-            )
 
     async def leave_session(self, interaction, server_id):
         """Handle user leaving a study session"""
-        user_id = interaction.user.id
-        
-        if server_id in self.active_sessions and user_id in self.active_sessions[server_id]['participants']:
-            # Calculate study time for this user
-            session_start = self.active_sessions[server_id]['start_time']
-            study_duration = max(0, (int(time.time()) - session_start) // 60)  # Duration in minutes
-            
-            # Update user's total study time
-            if study_duration > 0:
-                self.db_manager.update_total_study_time(user_id, server_id, study_duration)
-            
-            # Remove user from session
-            self.active_sessions[server_id]['participants'].remove(user_id)
-            participant_count = len(self.active_sessions[server_id]['participants'])
-            
-            # End session if no participants left
-            if participant_count == 0:
-                self.db_manager.end_study_session(self.active_sessions[server_id]['session_id'])
-                del self.active_sessions[server_id]
-                await interaction.response.send_message(
-                    f"👋 {interaction.user.mention} left the study session.\n"
-                    f"Session ended as no participants remain. You studied for {study_duration} minutes total!",
-                    ephemeral=True
-                )
+        async with self.deadline_guard.track(interaction, 'leave_session', ephemeral=True) as tracked:
+            user_id = interaction.user.id
+        
+            if not await self.admit(tracked, 'leave_session'):
+                return
+        
+            # As in join_session, defers and replies wait until the lock is released
+            async with self.session_write(server_id):
+                session_data = self.active_sessions.get(server_id)
+                left = session_data is not None and user_id in session_data['participants']
+                if left:
+                    # Calculate study time for this user
+                    current_time = int(self.clock.time())
+                    study_duration = max(0, (current_time - session_data['start_time']) // 60)  # Duration in minutes
+                
+                    # Update user's total study time
+                    if study_duration > 0:
+                        await self.db_write(self.db_manager.update_total_study_time, user_id, server_id, study_duration)
+                        tracked.stage = 'update_total_study_time'
+                
+                    # XP ticks credited streaks minute by minute; add whatever they didn't reach
+                    remainder = self.unstreaked_minutes(session_data, user_id, current_time)
+                    if remainder:
+                        await self.db_write(self.db_manager.record_study_minutes, server_id, [(user_id, remainder)])
+                        tracked.stage = 'record_study_minutes'
+                
+                    # Remove user from session
+                    session_data['participants'].remove(user_id)
+                    participant_count = len(session_data['participants'])
+                
+                    # End session if no participants left
+                    if participant_count == 0:
+                        await self.db_write(self.db_manager.end_study_session, session_data['session_id'])
+                        del self.active_sessions[server_id]
+                        tracked.stage = 'end_study_session'
+            await tracked.checkpoint(tracked.stage)
+            
+            if left:
+                self.refresh_status(interaction.guild)
+                if participant_count == 0:
+                    await tracked.send(
+                        f"👋 {interaction.user.mention} left the study session.\n"
+                        f"Session ended as no participants remain. You studied for {study_duration} minutes total!",
+                        ephemeral=True
+                    )
+                else:
+                    await tracked.send(
+                        f"👋 {interaction.user.mention} left the study session. ({participant_count} participants remaining)\n"
+                        f"You studied for {study_duration} minutes this session. Great work!",
+                        ephemeral=True
+                    )
             else:
-                await interaction.response.send_message(
-                    f"👋 {interaction.user.mention} left the study session. ({participant_count} participants remaining)\n"
-                    f"You studied for {study_duration} minutes this session. Great work!",
+                await tracked.send(
+                    "You're not currently in a study session!",
                     ephemeral=True
                 )
-        else:
-            await interaction.response.send_message(
-                "You're not currently in a study session!",
-                ephemeral=True
-            )
 
     @app_commands.command(name='studystats', description='View study statistics for yourself or another user')
-    @app_commands.describe(user='The user to view stats for (optional, defaults to yourself)')
-    async def study_stats(self, interaction: discord.Interaction, user: discord.Member = None):
+    @app_commands.describe(
+        user='The user to view stats for (optional, defaults to yourself)',
+        card='Show the stats as an image card'
+    )
+    async def study_stats(self, interaction: discord.Interaction, user: discord.Member = None, card: bool = False):
         """Display study statistics for a user"""
-        target_user = user or interaction.user
-        user_data = self.db_manager.get_user(target_user.id, interaction.guild.id)
+        async with self.deadline_guard.track(interaction, 'studystats') as tracked:
+            if not await self.admit(tracked, 'studystats', low_priority=True):
+                return
+            
+            target_user = user or interaction.user
+            user_data, streak = await self.db_read(self.db_manager.get_user_stats, target_user.id, interaction.guild.id)
+            await tracked.checkpoint('get_user_stats')
+        
+            if not user_data:
+                await tracked.send(f"{target_user.display_name} hasn't started studying yet!")
+                return
         
-        if not user_data:
-            await interaction.response.send_message(f"{target_user.display_name} hasn't started studying yet!")
-            return
+            # user_data format: (userid, serverid, last_study_session_time, last_study_session_id, total_study_time, user_xp, user_level, season_id)
+            total_time = user_data[4]
+            xp = user_data[5]
+            level = user_data[6]
         
-        # user_data format: (userid, serverid, last_study_session_time, last_study_session_id, total_study_time, user_xp, user_level)
-        total_time = user_data[4]
-        xp = user_data[5]
-        level = user_data[6]
+            # Calculate XP needed for next level
+            next_level_xp = 5 * (level * level) + 50 * level + 100
+            xp_needed = next_level_xp - xp
         
-        # Calculate XP needed for next level
-        next_level_xp = 5 * (level * level) + 50 * level + 100
-        xp_needed = next_level_xp - xp
+            embed = discord.Embed(
+                title=f"📊 Study Stats for {target_user.display_name}",
+                color=0x0099ff
+            )
+            embed.set_thumbnail(url=target_user.display_avatar.url)
+            embed.add_field(name="Study Level", value=str(level), inline=True)
+            embed.add_field(name="Current XP", value=f"{xp}/{next_level_xp}", inline=True)
+            embed.add_field(name="XP to Next Level", value=str(xp_needed), inline=True)
+            embed.add_field(name="Total Study Time", value=f"{total_time} minutes", inline=True)
+            embed.add_field(name="Hours Studied", value=f"{total_time/60:.1f} hours", inline=True)
+            embed.add_field(name="Season", value=str(user_data[7]), inline=True)
         
-        embed = discord.Embed(
-            title=f"📊 Study Stats for {target_user.display_name}",
-            color=0x0099ff
-        )
-        embed.set_thumbnail(url=target_user.display_avatar.url)
-        embed.add_field(name="Study Level", value=str(level), inline=True)
-        embed.add_field(name="Current XP", value=f"{xp}/{next_level_xp}", inline=True)
-        embed.add_field(name="XP to Next Level", value=str(xp_needed), inline=True)
-        embed.add_field(name="Total Study Time", value=f"{total_time} minutes", inline=True)
-        embed.add_field(name="Hours Studied", value=f"{total_time/60:.1f} hours", inline=True)
-        
-        # Check if user is currently in a session
-        server_id = interaction.guild.id
-        if server_id in self.active_sessions and target_user.id in self.active_sessions[server_id]['participants']:
-            embed.add_field(name="Status", value="🟢 Currently Studying", inline=True)
-        else:
-            embed.add_field(name="Status", value="🔴 Not in Session", inline=True)
+            goal_mark = " ✅" if streak['goal_met_today'] else ""
+            embed.add_field(name="Streak", value=f"🔥 {streak['current_streak']} days (best {streak['best_streak']})", inline=True)
+            embed.add_field(name="Today's Goal", value=f"{streak['today_minutes']}/{streak['daily_goal']} minutes{goal_mark}", inline=True)
+            embed.add_field(name="Focus Score", value=f"{streak['focus_score']}/100", inline=True)
+        
+            # Check if user is currently in a session
+            server_id = interaction.guild.id
+            studying = server_id in self.active_sessions and target_user.id in self.active_sessions[server_id]['participants']
+            if studying:
+                embed.add_field(name="Status", value="🟢 Currently Studying", inline=True)
+            else:
+                embed.add_field(name="Status", value="🔴 Not in Session", inline=True)
+            
+            if card:
+                file = await self.render_card('stats', {
+                    'name': target_user.display_name,
+                    'level': level,
+                    'xp': xp,
+                    'next_level_xp': next_level_xp,
+                    'total_minutes': total_time,
+                    'season': user_data[7],
+                    'studying': studying,
+                    'streak': streak['current_streak'],
+                    'focus_score': streak['focus_score'],
+                }, embed)
+                if file:
+                    await tracked.send(embed=embed, file=file)
+                    return
+            
+            await tracked.send(embed=embed)
+
+    @app_commands.command(name='studygoal', description='Set how many minutes a day you aim to study')
+    @app_commands.describe(minutes='Your daily study goal in minutes')
+    async def study_goal(self, interaction: discord.Interaction, minutes: int):
+        """Set the caller's daily study goal for this server"""
+        async with self.deadline_guard.track(interaction, 'studygoal', ephemeral=True) as tracked:
+            if minutes < 1 or minutes > 1440:
+                await tracked.send("❌ Your daily goal must be between 1 and 1440 minutes.", ephemeral=True)
+                return
             
-        await interaction.response.send_message(embed=embed)
+            await self.db_write(self.db_manager.set_daily_goal, interaction.user.id, interaction.guild.id, minutes)
+            await tracked.checkpoint('set_daily_goal')
+            streak = await self.db_read(self.db_manager.get_study_streak, interaction.user.id, interaction.guild.id)
+            await tracked.send(
+                f"🎯 Your daily goal is now **{minutes} minutes**. "
+                f"You've studied {streak['today_minutes']} minutes today.",
+                ephemeral=True
+            )
 
     @app_commands.command(name='studyleaderboard', description='View the study leaderboard for this server')
-    async def study_leaderboard(self, interaction: discord.Interaction):
+    @app_commands.describe(
+        season='Season number to view (optional, defaults to the current season)',
+        card='Show the leaderboard as an image card'
+    )
+    async def study_leaderboard(self, interaction: discord.Interaction, season: int = None, card: bool = False):
         """Display the study leaderboard for the server"""
-        # Add method to get leaderboard data
-        leaderboard_data = self.db_manager.get_leaderboard(interaction.guild.id)
+        async with self.deadline_guard.track(interaction, 'studyleaderboard') as tracked:
+            if not await self.admit(tracked, 'studyleaderboard', low_priority=True):
+                return
+            
+            current_season = await self.db_read(self.db_manager.get_current_season, interaction.guild.id)
+            if season is not None and (season < 1 or season > current_season):
+                await tracked.send(f"❌ Season must be between 1 and {current_season}.", ephemeral=True)
+                return
+            season = season or current_season
+            
+            leaderboard_data = await self.db_read(self.db_manager.get_leaderboard, interaction.guild.id, season_id=season)
+            await tracked.checkpoint('get_leaderboard')
         
-        if not leaderboard_data:
-            await interaction.response.send_message("No study data available yet! Start studying to appear on the leaderboard!")
-            return
+            if not leaderboard_data:
+                if season == current_season:
+                    await tracked.send("No study data available yet! Start studying to appear on the leaderboard!")
+                else:
+                    await tracked.send(f"No one studied during season {season}.")
+                return
         
-        embed = discord.Embed(
-            title="📚 Study Leaderboard",
-            description="Top studiers in this server",
-            color=0xffd700
-        )
+            title = "Study Leaderboard" if season == current_season else f"Study Leaderboard — Season {season}"
+            embed = discord.Embed(
+                title=f"📚 {title}",
+                description="Top studiers in this server" if season == current_season else f"Final standings for season {season}",
+                color=0xffd700
+            )
         
-        for i, (user_id, total_time, xp, level) in enumerate(leaderboard_data[:10], 1):
-            user = interaction.guild.get_member(user_id)
-            if user:
-                # Add medal emojis for top 3
-                if i == 1:
-                    medal = "🥇"
-                elif i == 2:
-                    medal = "🥈"
-                elif i == 3:
-                    medal = "🥉"
-                else:
-                    medal = f"{i}."
+            card_rows = []
+            for i, (user_id, total_time, xp, level) in enumerate(leaderboard_data[:10], 1):
+                user = interaction.guild.get_member(user_id)
+                if user:
+                    card_rows.append((i, user.display_name, level, total_time, xp))
+                    
+                    # Add medal emojis for top 3
+                    if i == 1:
+                        medal = "🥇"
+                    elif i == 2:
+                        medal = "🥈"
+                    elif i == 3:
+                        medal = "🥉"
+                    else:
+                        medal = f"{i}."
                 
-                embed.add_field(
-                    name=f"{medal} {user.display_name}",
-                    value=f"Level {level} • {total_time} minutes • {xp} XP",
-                    inline=False
-                )
+                    embed.add_field(
+                        name=f"{medal} {user.display_name}",
+                        value=f"Level {level} • {total_time} minutes • {xp} XP",
+                        inline=False
+                    )
         
-        await interaction.response.send_message(embed=embed)
+            if card:
+                file = await self.render_card('leaderboard', {'title': title, 'rows': card_rows}, embed)
+                if file:
+                    await tracked.send(embed=embed, file=file)
+                    return
+            
+            await tracked.send(embed=embed)
+
+    @app_commands.command(name='studyseason', description='Start a new study season, resetting the leaderboard')
+    @app_commands.default_permissions(manage_guild=True)
+    async def study_season(self, interaction: discord.Interaction):
+        """Roll the server over to a new season; the old season stays viewable"""
+        async with self.deadline_guard.track(interaction, 'studyseason') as tracked:
+            previous_season = await self.db_read(self.db_manager.get_current_season, interaction.guild.id)
+            new_season = await self.db_write(self.db_manager.start_new_season, interaction.guild.id)
+            await tracked.checkpoint('start_new_season')
+            
+            embed = discord.Embed(
+                title=f"🏁 Season {new_season} Has Begun!",
+                description="Levels, XP and study time start fresh for everyone. Good luck!",
+                color=0xffd700
+            )
+            embed.add_field(
+                name="Previous Season",
+                value=f"Season {previous_season}'s final standings: `/studyleaderboard season:{previous_season}`",
+                inline=False
+            )
+            await tracked.send(embed=embed)
+
+    @app_commands.command(name='studyconfig', description='View or change this server\'s study and pomodoro defaults')
+    @app_commands.describe(
+        work_minutes='Default work duration for new pomodoro timers (1-120)',
+        break_minutes='Default break duration for new pomodoro timers (1-60)',
+        voice_channel='Default voice channel for pomodoro notifications',
+        volume='Notification volume from 0 to 100',
+        announcement_channel='Channel for level ups and pomodoro announcements'
+    )
+    @app_commands.default_permissions(manage_guild=True)
+    async def study_config(self, interaction: discord.Interaction, work_minutes: int = None, break_minutes: int = None,
+                           voice_channel: discord.VoiceChannel = None, volume: int = None,
+                           announcement_channel: discord.TextChannel = None):
+        """Update the server's durable settings; with no options, show them"""
+        async with self.deadline_guard.track(interaction, 'studyconfig', ephemeral=True) as tracked:
+            server_id = interaction.guild.id
+            
+            # Validate inputs
+            if work_minutes is not None and (work_minutes < 1 or work_minutes > 120):
+                await tracked.send("❌ Work duration must be between 1 and 120 minutes.", ephemeral=True)
+                return
+            if break_minutes is not None and (break_minutes < 1 or break_minutes > 60):
+                await tracked.send("❌ Break duration must be between 1 and 60 minutes.", ephemeral=True)
+                return
+            if volume is not None and (volume < 0 or volume > 100):
+                await tracked.send("❌ Volume must be between 0 and 100.", ephemeral=True)
+                return
+            
+            changes = {}
+            if work_minutes is not None:
+                changes['work_minutes'] = work_minutes
+            if break_minutes is not None:
+                changes['break_minutes'] = break_minutes
+            if voice_channel is not None:
+                changes['voice_channel_id'] = voice_channel.id
+            if volume is not None:
+                changes['volume'] = volume / 100.0
+            if announcement_channel is not None:
+                changes['announcement_channel_id'] = announcement_channel.id
+            
+            if changes:
+                await self.update_guild_settings(server_id, **changes)
+                await tracked.checkpoint('update_guild_settings')
+            settings = self.guild_settings.get(server_id)
+            
+            embed = discord.Embed(
+                title="⚙️ Study Settings Updated" if changes else "⚙️ Study Settings",
+                color=0x4ecdc4
+            )
+            embed.add_field(name="Work Duration", value=f"{settings['work_minutes']} minutes", inline=True)
+            embed.add_field(name="Break Duration", value=f"{settings['break_minutes']} minutes", inline=True)
+            embed.add_field(name="Volume", value=f"{int(settings['volume'] * 100)}%", inline=True)
+            embed.add_field(
+                name="Voice Channel",
+                value=f"<#{settings['voice_channel_id']}>" if settings['voice_channel_id'] else "Not set",
+                inline=True
+            )
+            embed.add_field(
+                name="Announcements",
+                value=f"<#{settings['announcement_channel_id']}>" if settings['announcement_channel_id'] else "Session channel",
+                inline=True
+            )
+            
+            await tracked.send(embed=embed, ephemeral=True)
+
+    @app_commands.command(name='studyprofile', description='Capture a CPU or memory profile of the running bot (owner only)')
+    @app_commands.describe(
+        mode='cpu for a cProfile capture, memory for a tracemalloc allocation diff',
+        seconds='How long to capture for (1-300, default: 30)'
+    )
+    async def study_profile(self, interaction: discord.Interaction, mode: Literal['cpu', 'memory'] = 'cpu', seconds: int = 30):
+        """Profile the running bot for a while and reply with the top entries"""
+        async with self.deadline_guard.track(interaction, 'studyprofile', ephemeral=True) as tracked:
+            if not await self.bot.is_owner(interaction.user):
+                await tracked.send("❌ Only the bot owner can capture profiles.", ephemeral=True)
+                return
+            
+            if seconds < 1 or seconds > 300:
+                await tracked.send("❌ Capture duration must be between 1 and 300 seconds.", ephemeral=True)
+                return
+            
+            if self.profiler.busy:
+                await tracked.send("❌ A profile capture is already running.", ephemeral=True)
+                return
+            
+            # The capture outlasts the acknowledgement window, so the guard defers it for us
+            capture = self.profiler.capture_cpu if mode == 'cpu' else self.profiler.capture_memory
+            path, summary = await capture(seconds)
+            
+            await tracked.send(
+                f"🔬 {seconds}s {mode} profile written to `{path}`\n```\n{summary}\n```",
+                ephemeral=True
+            )
+
+    @app_commands.command(name='studydiag', description='Show event loop lag and slow interaction statistics (owner only)')
+    async def study_diag(self, interaction: discord.Interaction):
+        """Report the loop lag histogram, what blocked the loop, and which handlers needed deferring"""
+        async with self.deadline_guard.track(interaction, 'studydiag', ephemeral=True) as tracked:
+            if not await self.bot.is_owner(interaction.user):
+                await tracked.send("❌ Only the bot owner can view diagnostics.", ephemeral=True)
+                return
+            
+            lines = ["**Event loop lag**", self.loop_monitor.summary()]
+            if self.loop_monitor.blocks:
+                lines.append("**Recent blocks**")
+                for activity, guild_id, task_name, seconds in list(self.loop_monitor.blocks)[-5:]:
+                    where = f" (guild {guild_id})" if guild_id else ""
+                    lines.append(f"{seconds:.2f}s in {activity}{where} [{task_name}]")
+            
+            lines.append("**Interactions** (handled / deferred / missed / slowest)")
+            for name, handled, deferred, missed, slowest in self.deadline_guard.summary()[:5]:
+                lines.append(f"{name}: {handled} / {deferred} / {missed} / {slowest:.2f}s")
+            
+            lines.append(
+                f"**Throttling** (allowed / per user / per guild / shed) — write backlog {self.write_backlog()}, "
+                f"{len(self.throttle.users)} user and {len(self.throttle.guilds)} guild buckets"
+            )
+            for command, allowed, user_throttled, guild_throttled, shed in self.throttle.summary()[:5]:
+                lines.append(f"{command}: {allowed} / {user_throttled} / {guild_throttled} / {shed}")
+            
+            await tracked.send("\n".join(lines), ephemeral=True)
+
+    @app_commands.command(name='studyrecord', description='Record anonymised command traffic for replay (owner only)')
+    @app_commands.describe(
+        action='start a recording, or stop the one running',
+        minutes='How long to record for before stopping on its own (1-1440, default: 60)'
+    )
+    async def study_record(self, interaction: discord.Interaction, action: Literal['start', 'stop'] = 'start', minutes: int = 60):
+        """Capture which commands and ticks ran when, with hashed users, for `manage.py replay`"""
+        async with self.deadline_guard.track(interaction, 'studyrecord', ephemeral=True) as tracked:
+            if not await self.bot.is_owner(interaction.user):
+                await tracked.send("❌ Only the bot owner can record traffic.", ephemeral=True)
+                return
+            
+            if action == 'stop':
+                recorder = self.stop_recording()
+                if recorder is None:
+                    await tracked.send("❌ No recording is running.", ephemeral=True)
+                else:
+                    await tracked.send(f"⏹️ Recorded {recorder.recorded} interactions and events to `{recorder.path}`", ephemeral=True)
+                return
+            
+            if minutes < 1 or minutes > 1440:
+                await tracked.send("❌ Recording length must be between 1 and 1440 minutes.", ephemeral=True)
+                return
+            
+            if self.deadline_guard.recorder:
+                await tracked.send(f"❌ Already recording to `{self.deadline_guard.recorder.path}`.", ephemeral=True)
+                return
+            
+            recorder = self.start_recording(minutes)
+            await tracked.send(f"⏺️ Recording to `{recorder.path}` for {minutes} minutes.", ephemeral=True)
+
+    @app_commands.command(name='studyexport', description='Export study data to files on the bot host (owner only)')
+    @app_commands.describe(file_format='ndjson (one JSON object per line) or csv')
+    async def study_export(self, interaction: discord.Interaction, file_format: Literal['ndjson', 'csv'] = 'ndjson'):
+        """Stream every study table to files under exports/ without pausing the bot"""
+        async with self.deadline_guard.track(interaction, 'studyexport', ephemeral=True) as tracked:
+            if not await self.bot.is_owner(interaction.user):
+                await tracked.send("❌ Only the bot owner can export data.", ephemeral=True)
+                return
+            
+            if self.db_manager.db_name == ':memory:':
+                await tracked.send("❌ The bot is using an in-memory database, which can't be exported.", ephemeral=True)
+                return
+            
+            def progress(table, rows):
+                print(f"Exported {rows} {table} rows")
+            
+            # Runs on its own connection in a thread, reading in short chunks so live commands aren't held up
+            directory = os.path.join(EXPORT_DIR, time.strftime('%Y%m%d-%H%M%S'))
+            try:
+                exported = await asyncio.to_thread(export_tables, self.db_manager.db_name, directory, file_format, progress=progress)
+            except Exception as e:
+                await tracked.send(f"❌ Export failed: {e}", ephemeral=True)
+                return
+            
+            lines = [f"📦 Exported to `{directory}`"]
+            lines.extend(f"`{table}`: {rows} rows" for table, (_path, rows) in exported.items())
+            await tracked.send("\n".join(lines), ephemeral=True)
+
+    @app_commands.command(name='studyimport', description='Import study data from files on the bot host (owner only)')
+    @app_commands.describe(
+        path='A file or directory of files named after their tables, e.g. exports/20240101-120000',
+        replace='Overwrite existing rows with the same key instead of skipping them'
+    )
+    async def study_import(self, interaction: discord.Interaction, path: str, replace: bool = False):
+        """Bulk import NDJSON/CSV files in batched transactions while the bot keeps running"""
+        async with self.deadline_guard.track(interaction, 'studyimport', ephemeral=True) as tracked:
+            if not await self.bot.is_owner(interaction.user):
+                await tracked.send("❌ Only the bot owner can import data.", ephemeral=True)
+                return
+            
+            if self.db_manager.db_name == ':memory:':
+                await tracked.send("❌ The bot is using an in-memory database, which can't be imported into.", ephemeral=True)
+                return
+            
+            if not os.path.exists(path):
+                await tracked.send(f"❌ `{path}` doesn't exist on the bot host.", ephemeral=True)
+                return
+            
+            def progress(table, rows):
+                print(f"Imported {rows} {table} rows")
+            
+            # Small pauses between batches give live joins, leaves and XP ticks a turn at the database
+            try:
+                imported = await asyncio.to_thread(import_files, self.db_manager.db_name, path, replace=replace, pause=0.01, progress=progress)
+            except Exception as e:
+                await tracked.send(f"❌ Import failed: {e}", ephemeral=True)
+                return
+            
+            # Seasons and settings may have changed underneath our caches
+            self.db_manager.forget_seasons()
+            self.guild_settings.invalidate()
+            
+            lines = [f"📥 Imported from `{path}`"]
+            lines.extend(f"`{table}`: {written} of {read} rows written" for table, (read, written) in imported.items())
+            if needs_xp_checkpoint(imported):
+                lines.append("XP changed; run `python manage.py checkpoint-xp` once things are quiet so ledger replays keep it.")
+            await tracked.send("\n".join(lines), ephemeral=True)
 
     @app_commands.command(name='help', description='View all available study commands and their descriptions')
     async def help_command(self, interaction: discord.Interaction):
         """Display help information for all study commands"""
-        embed = discord.Embed(
-            title="📚 Study Bot Help",
-            description="Here are all the available study commands:",
-            color=0x0099ff
-        )
+        async with self.deadline_guard.track(interaction, 'help') as tracked:
+            embed = discord.Embed(
+                title="📚 Study Bot Help",
+                description="Here are all the available study commands:",
+                color=0x0099ff
+            )
         
-        # Add bot information
-        embed.set_thumbnail(url=self.bot.user.display_avatar.url)
-        embed.add_field(
-            name="🎯 About",
-            value="This bot gamifies studying by rewarding users with XP for participating in study sessions!",
-            inline=False
-        )
+            # Add bot information
+            embed.set_thumbnail(url=self.bot.user.display_avatar.url)
+            embed.add_field(
+                name="🎯 About",
+                value="This bot gamifies studying by rewarding users with XP for participating in study sessions!",
+                inline=False
+            )
         
-        # Study command
-        embed.add_field(
-            name="📖 `/study`",
-            value="Start or join a study session. Earn 15-25 XP every minute while studying!\n"
-                  "• Creates a new session if none exists\n"
-                  "• Join an existing session with interactive buttons\n"
-                  "• Leave anytime to save your progress",
-            inline=False
-        )
+            # Study command
+            embed.add_field(
+                name="📖 `/study`",
+                value="Start or join a study session. Earn 15-25 XP every minute while studying!\n"
+                      "• Posts a live status message with join/leave buttons\n"
+                      "• The status updates itself as people join, leave and pomodoro phases change\n"
+                      "• Leave anytime to save your progress",
+                inline=False
+            )
         
-        # Pomodoro command
-        embed.add_field(
-            name="⏰ `/pomodoro [work_minutes] [break_minutes] [voice_channel]`",
-            value="Set up a pomodoro timer for the current study session.\n"
-                  "• Default: 25 minutes work, 5 minutes break\n"
-                  "• Optional voice channel for audio notifications\n"
-                  "• Automatically switches between work and break phases",
-            inline=False
-        )
+            # Pomodoro command
+            embed.add_field(
+                name="⏰ `/pomodoro [work_minutes] [break_minutes] [voice_channel]`",
+                value="Set up a pomodoro timer for the current study session.\n"
+                      "• Default: the server's settings (25 minutes work, 5 minutes break unless changed)\n"
+                      "• Optional voice channel for audio notifications\n"
+                      "• Automatically switches between work and break phases",
+                inline=False
+            )
         
-        # Pomodoro info command
-        embed.add_field(
-            name="📊 `/pomoinfo`",
-            value="View information about the current pomodoro timer.\n"
-                  "• Shows current phase (work/break)\n"
-                  "• Displays time remaining and cycle count\n"
-                  "• Shows timer configuration and volume",
-            inline=False
-        )
+            # Pomodoro info command
+            embed.add_field(
+                name="📊 `/pomoinfo`",
+                value="View information about the current pomodoro timer.\n"
+                      "• Shows current phase (work/break)\n"
+                      "• Displays time remaining and cycle count\n"
+                      "• Shows timer configuration and volume",
+                inline=False
+            )
         
-        # Pomodoro volume command
-        embed.add_field(
-            name="🔊 `/pomovolume [volume]`",
-            value="Set the volume for pomodoro timer notifications.\n"
-                  "• Volume range: 0-100 (default: 50)\n"
-                  "• Plays a test sound at the new volume\n"
-                  "• Only works if voice channel is configured",
-            inline=False
-        )
+            # Pomodoro volume command
+            embed.add_field(
+                name="🔊 `/pomovolume [volume]`",
+                value="Set the volume for pomodoro timer notifications.\n"
+                      "• Volume range: 0-100 (default: 50)\n"
+                      "• Plays a test sound at the new volume\n"
+                      "• Only works if voice channel is configured",
+                inline=False
+            )
         
-        # Study stats command
-        embed.add_field(
-            name="📊 `/studystats [user]`",
-            value="View detailed study statistics for yourself or another user.\n"
-                  "• Shows current level and XP\n"
-                  "• Displays total study time in minutes and hours\n"
-                  "• Shows if currently in an active session\n"
-                  "• Leave `user` blank to see your own stats",
-            inline=False
-        )
+            # Study config command
+            embed.add_field(
+                name="⚙️ `/studyconfig [work_minutes] [break_minutes] [voice_channel] [volume] [announcement_channel]`",
+                value="View or change this server's defaults (requires Manage Server).\n"
+                      "• New pomodoro timers use these durations, voice channel and volume\n"
+                      "• Level ups and pomodoro announcements go to the announcement channel\n"
+                      "• Run without options to see the current settings",
+                inline=False
+            )
         
-        # Leaderboard command
-        embed.add_field(
-            name="🏆 `/studyleaderboard`",
-            value="View the top 10 studiers in the server.\n"
-                  "• Ranked by level, then XP, then total study time\n"
-                  "• Shows medals for top 3 positions\n"
-                  "• Updates in real-time as users study",
-            inline=False
-        )
+            # Study season command
+            embed.add_field(
+                name="🏁 `/studyseason`",
+                value="Start a new season with a fresh leaderboard (requires Manage Server).\n"
+                      "• Everyone starts again from level 1\n"
+                      "• Earlier seasons stay viewable with `/studyleaderboard season:<n>`",
+                inline=False
+            )
         
-        # Help command
-        embed.add_field(
-            name="❓ `/help`",
-            value="Display this help message with all command descriptions.",
-            inline=False
-        )
+            # Study stats command
+            embed.add_field(
+                name="📊 `/studystats [user] [card]`",
+                value="View detailed study statistics for yourself or another user.\n"
+                      "• Shows current level and XP\n"
+                      "• Displays total study time in minutes and hours\n"
+                      "• Shows if currently in an active session\n"
+                      "• Shows your daily streak, today's goal progress and focus score\n"
+                      "• Leave `user` blank to see your own stats\n"
+                      "• Set `card` for an image card with an XP progress bar",
+                inline=False
+            )
         
-        # XP System info
-        embed.add_field(
-            name="⭐ XP & Leveling System",
-            value="• Earn **15-25 XP** every minute in a study session\n"
-                  "• Level up formula: `5 × level² + 50 × level + 100` XP per level\n"
-                  "• Get notified when you level up!\n"
-                  "• Track your progress with `/studystats`",
-            inline=False
-        )
+            # Study goal command
+            embed.add_field(
+                name="🎯 `/studygoal [minutes]`",
+                value="Set how many minutes a day you aim to study (default: 60).\n"
+                      "• Days start at midnight UTC\n"
+                      "• Studying on consecutive days builds your streak\n"
+                      "• Your focus score is your recent daily average against your goal, out of 100",
+                inline=False
+            )
         
-        # Usage tips
-        embed.add_field(
-            name="💡 Tips",
-            value="• Study sessions continue until all participants leave\n"
-                  "• Your study time is automatically tracked\n"
-                  "• Level up notifications appear in the channel where you started studying\n"
-                  "• Use buttons to easily join/leave sessions",
-            inline=False
-        )
+            # Leaderboard command
+            embed.add_field(
+                name="🏆 `/studyleaderboard [season] [card]`",
+                value="View the top 10 studiers in the server.\n"
+                      "• Shows the current season unless you pick an earlier one\n"
+                      "• Ranked by level, then XP, then total study time\n"
+                      "• Shows medals for top 3 positions\n"
+                      "• Updates in real-time as users study\n"
+                      "• Set `card` for an image card of the rankings",
+                inline=False
+            )
+        
+            # Help command
+            embed.add_field(
+                name="❓ `/help`",
+                value="Display this help message with all command descriptions.",
+                inline=False
+            )
+        
+            # XP System info
+            embed.add_field(
+                name="⭐ XP & Leveling System",
+                value="• Earn **15-25 XP** every minute in a study session\n"
+                      "• Level up formula: `5 × level² + 50 × level + 100` XP per level\n"
+                      "• Get notified when you level up!\n"
+                      "• Track your progress with `/studystats`",
+                inline=False
+            )
+        
+            # Usage tips
+            embed.add_field(
+                name="💡 Tips",
+                value="• Study sessions continue until all participants leave\n"
+                      "• Your study time is automatically tracked\n"
+                      "• Level up notifications appear in the server's announcement channel if one is set with `/studyconfig`, otherwise where you started studying\n"
+                      "• Use buttons to easily join/leave sessions",
+                inline=False
+            )
         
-        embed.set_footer(text="Happy studying! 📚✨")
+            embed.set_footer(text="Happy studying! 📚✨")
         
-        await interaction.response.send_message(embed=embed)
+            await tracked.send(embed=embed)
 
 
 class StudySessionView(View):
-    def __init__(self, study_cog, server_id):
-        super().__init__(timeout=300)  # 5 minute timeout
+    """Join/leave buttons on a guild's status message.
+
+    Persistent (no timeout, fixed custom_ids), so one registered instance handles the
+    buttons on every status message, including ones posted before a restart.
+    """
+
+    def __init__(self, study_cog):
+        super().__init__(timeout=None)
         self.study_cog = study_cog
-        self.server_id = server_id
     
-    @discord.ui.button(label="Join Study Session", style=discord.ButtonStyle.green, emoji="📚")
+    @discord.ui.button(label="Join Study Session", style=discord.ButtonStyle.green, emoji="📚", custom_id="study:join")
     async def join_button(self, interaction: discord.Interaction, button: Button):
-        await self.study_cog.join_session(interaction, self.server_id)
+        self.study_cog.adopt_status_message(interaction)
+        await self.study_cog.join_session(interaction, interaction.guild.id)
     
-    @discord.ui.button(label="Leave Session", style=discord.ButtonStyle.red, emoji="👋")
+    @discord.ui.button(label="Leave Session", style=discord.ButtonStyle.red, emoji="👋", custom_id="study:leave")
     async def leave_button(self, interaction: discord.Interaction, button: Button):
-        await self.study_cog.leave_session(interaction, self.server_id)
+        self.study_cog.adopt_status_message(interaction)
+        await self.study_cog.leave_session(interaction, interaction.guild.id)
 
 
 class PomodoroControlView(View):
@@ -760,42 +1636,44 @@ class PomodoroControlView(View):
     
     async def adjust_volume(self, interaction: discord.Interaction, change: int):
         """Adjust volume by the specified amount"""
-        if self.server_id in self.study_cog.active_sessions:
-            session_data = self.study_cog.active_sessions[self.server_id]
-            pomodoro = session_data.get('pomodoro')
+        async with self.study_cog.deadline_guard.track(interaction, 'adjust_volume', ephemeral=True) as tracked:
+            if self.server_id in self.study_cog.active_sessions:
+                session_data = self.study_cog.active_sessions[self.server_id]
+                pomodoro = session_data.get('pomodoro')
             
-            if pomodoro:
-                current_volume = int(pomodoro.get('volume', 0.5) * 100)
-                new_volume = max(0, min(100, current_volume + change))
+                if pomodoro:
+                    current_volume = int(pomodoro.get('volume', 0.5) * 100)
+                    new_volume = max(0, min(100, current_volume + change))
                 
-                # Update the volume
-                pomodoro['volume'] = new_volume / 100.0
+                    # Update the volume
+                    pomodoro['volume'] = new_volume / 100.0
+                    await self.study_cog.update_guild_settings(self.server_id, volume=new_volume / 100.0)
                 
-                # Show volume change
-                volume_bars = int(new_volume / 10)
-                volume_display = "█" * volume_bars + "░" * (10 - volume_bars)
+                    # Show volume change
+                    volume_bars = int(new_volume / 10)
+                    volume_display = "█" * volume_bars + "░" * (10 - volume_bars)
                 
-                embed = discord.Embed(
-                    title="🔊 Volume Adjusted",
-                    description=f"Volume: `{volume_display}` {new_volume}%",
-                    color=0x4ecdc4
-                )
+                    embed = discord.Embed(
+                        title="🔊 Volume Adjusted",
+                        description=f"Volume: `{volume_display}` {new_volume}%",
+                        color=0x4ecdc4
+                    )
                 
-                # Play test sound if voice channel is available
-                voice_channel_id = pomodoro.get('voice_channel_id')
-                if voice_channel_id:
-                    voice_channel = interaction.guild.get_channel(voice_channel_id)
-                    if voice_channel:
-                        try:
-                            await self.study_cog.play_notification_sound(voice_channel, 'work', new_volume / 100.0)
-                        except Exception as e:
-                            print(f"Error playing test sound: {e}")
+                    # Play test sound if voice channel is available
+                    voice_channel_id = pomodoro.get('voice_channel_id')
+                    if voice_channel_id:
+                        voice_channel = interaction.guild.get_channel(voice_channel_id)
+                        if voice_channel:
+                            try:
+                                await self.study_cog.play_notification_sound(voice_channel, 'work', new_volume / 100.0)
+                            except Exception as e:
+                                print(f"Error playing test sound: {e}")
                 
-                await interaction.response.send_message(embed=embed, ephemeral=True)
+                    await tracked.send(embed=embed, ephemeral=True)
+                else:
+                    await tracked.send("❌ No pomodoro timer is active!", ephemeral=True)
             else:
-                await interaction.response.send_message("❌ No pomodoro timer is active!", ephemeral=True)
-        else:
-            await interaction.response.send_message("❌ No active study session found!", ephemeral=True)
+                await tracked.send("❌ No active study session found!", ephemeral=True)
 
 
 async def setup(bot):
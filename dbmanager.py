@@ -1,14 +1,213 @@
-import sqlite3
+import asyncio
+import contextlib
+import pathlib
+import queue
 import random
+import sqlite3
+import threading
+
+from clock import SystemClock
+
+# SQLite's default limit on bound parameters per statement is 999
+MAX_SQL_VARIABLES = 999
+
+# Per-guild configuration columns that can be changed through update_guild_settings
+GUILD_SETTINGS_COLUMNS = ('work_minutes', 'break_minutes', 'voice_channel_id', 'volume', 'announcement_channel_id')
+
+# Tables that can be exported and imported, in import order, with the key each is streamed in order of
+TRANSFER_TABLES = {
+    'guild_settings': ('serverid',),
+    'seasons': ('serverid', 'season_id'),
+    'study_sessions': ('session_id',),
+    'xp_events': ('event_id',),
+    'userstats': ('userid', 'serverid', 'season_id'),
+    'study_streaks': ('userid', 'serverid'),
+}
+
+# Read-only connections kept for queries that run alongside writes
+READ_CONNECTIONS = 4
+
+# Daily study goal in minutes for users who haven't set their own
+DEFAULT_DAILY_GOAL = 60
+# Streak state of a user who has never studied; see apply_study_minutes
+FRESH_STREAK = (0, 0, None, 0, DEFAULT_DAILY_GOAL, 0, 0.0)
+# Weight of the most recent day in the focus score's moving average of minutes studied per day
+FOCUS_ALPHA = 0.2
+
+
+def next_level_xp(level):
+    """XP needed to go from `level` to the next level (same formula as main.py)"""
+    return 5 * (level * level) + 50 * level + 100
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def apply_xp(xp, level, gain):
+    """Apply an XP gain to a user's state and return (new_xp, new_level, leveled_up)"""
+    new_xp = xp + gain
+    needed = next_level_xp(level)
+    if new_xp >= needed:
+        return new_xp - needed, level + 1, True
+    return new_xp, level, False
+
+
+def study_day(timestamp):
+    """Day number (UTC) that streaks and daily goals are counted in"""
+    return int(timestamp) // 86400
+
+
+def _fold_focus(focus, day_minutes, days_passed, alpha=FOCUS_ALPHA):
+    """Fold a finished day into the focus average; days skipped after it count as zero minutes"""
+    return (focus * (1 - alpha) + alpha * day_minutes) * (1 - alpha) ** (days_passed - 1)
+
+
+def apply_study_minutes(state, minutes, day):
+    """Add minutes studied on `day` to a user's streak state and return the new state.
+
+    State is (current_streak, best_streak, last_day, day_minutes, daily_goal, goals_met, focus),
+    where focus is an exponentially weighted average of minutes studied per day.
+    """
+    streak, best, last_day, day_minutes, goal, goals_met, focus = state
+    if last_day is not None and day < last_day:
+        day = last_day  # Late credits count towards the day we're already on
+    if day != last_day:
+        if last_day is None:
+            streak = 1
+        else:
+            focus = _fold_focus(focus, day_minutes, day - last_day)
+            streak = streak + 1 if day - last_day == 1 else 1
+        best = max(best, streak)
+        last_day, day_minutes = day, 0
+    if day_minutes < goal <= day_minutes + minutes:
+        goals_met += 1
+    return streak, best, last_day, day_minutes + minutes, goal, goals_met, focus
+
+
+def summarize_study_streak(state, today):
+    """Turn stored streak state into what users see, as of `today`"""
+    streak, best, last_day, day_minutes, goal, goals_met, focus = state
+    if last_day is None:
+        streak, day_minutes = 0, 0
+    elif last_day < today:
+        # Yesterday's minutes (and any empty days since) only count once the day is over
+        focus = _fold_focus(focus, day_minutes, today - last_day)
+        day_minutes = 0
+        if last_day < today - 1:
+            streak = 0
+    return {
+        'current_streak': streak,
+        'best_streak': best,
+        'today_minutes': day_minutes,
+        'daily_goal': goal,
+        'goal_met_today': day_minutes >= goal,
+        'goals_met': goals_met,
+        # 100 means averaging the daily goal; capped so one marathon day doesn't dominate the display
+        'focus_score': min(100, round(100 * focus / goal)) if goal else 0,
+    }
+
 
 class DatabaseManager:
-    def __init__(self, db_name):
-        self.connection = sqlite3.connect(db_name)
-        self.cursor = self.connection.cursor()
+    """Study data in SQLite, written through one connection and read through a pool.
+
+    `connection` is the only writer. Queries that can run while it is writing use
+    `reading()`, which hands out one of up to `readers` read-only connections; in WAL mode
+    each of them sees the last committed state, so reads neither wait for writes nor block
+    them. Reader connections may be used from any thread, one at a time, and so may the
+    writer. In-memory databases can't be shared between connections, so they read through
+    the writer.
+    """
+
+    def __init__(self, db_name, clock=None, readers=READ_CONNECTIONS):
+        self.db_name = db_name
+        self.clock = clock or SystemClock()
+        self.concurrent_reads = readers > 0 and db_name not in (':memory:', '')
+        # With a read pool the writer may be handed to a dedicated writer thread; it must still only be used by one thread at a time
+        self.connection = sqlite3.connect(db_name, check_same_thread=not self.concurrent_reads)
+        if self.concurrent_reads:
+            self.connection.execute('PRAGMA journal_mode = WAL')
+            # With WAL, NORMAL only syncs at checkpoints; a power cut can lose the last commits but never corrupts
+            self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.max_readers = readers
+        self._idle_readers = queue.SimpleQueue()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._current_seasons = {}  # server_id -> current season number
         self.create_tables()
 
+    def _open_reader(self):
+        uri = pathlib.Path(self.db_name).resolve().as_uri() + '?mode=ro'
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    @contextlib.contextmanager
+    def reading(self):
+        """Borrow a connection for reads, opening up to `max_readers` and then waiting for one to come back.
+
+        An event loop thread never waits: when every pooled connection is busy it reads on
+        a short-lived connection of its own instead.
+        """
+        if not self.concurrent_reads:
+            yield self.connection
+            return
+        try:
+            connection = self._idle_readers.get_nowait()
+        except queue.Empty:
+            with self._readers_lock:
+                connection = None
+                if len(self._readers) < self.max_readers:
+                    connection = self._open_reader()
+                    self._readers.append(connection)
+            if connection is None:
+                if _on_event_loop():
+                    connection = self._open_reader()
+                    try:
+                        yield connection
+                    finally:
+                        connection.close()
+                    return
+                connection = self._idle_readers.get()
+        try:
+            yield connection
+        finally:
+            self._idle_readers.put(connection)
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        """Borrow a read connection with a transaction open, so several queries see the same committed state"""
+        with self.reading() as connection:
+            cursor = connection.cursor()
+            if connection is self.connection:
+                # Nothing else writes to an in-memory database, so its state can't change between queries
+                yield cursor
+                return
+            cursor.execute('BEGIN')
+            try:
+                yield cursor
+            finally:
+                cursor.execute('COMMIT')
+
+    def table_columns(self, table):
+        """Column names of a table in declaration order, or [] if it doesn't exist"""
+        cursor = self.connection.cursor()
+        cursor.execute(f'PRAGMA table_info({table})')
+        return [row[1] for row in cursor.fetchall()]
+
     def create_tables(self):
-        self.cursor.execute('''
+        cursor = self.connection.cursor()
+        # Tables from before seasons existed are moved aside, recreated keyed by season and copied back as season 1
+        legacy_tables = []
+        for table in ('userstats', 'xp_checkpoint_state'):
+            columns = self.table_columns(table)
+            if columns and 'season_id' not in columns:
+                cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+                legacy_tables.append(table)
+
+        cursor.execute('''
             CREATE TABLE IF NOT EXISTS userstats (
                 userid INTEGER,
                 serverid INTEGER,
@@ -17,10 +216,11 @@ class DatabaseManager:
                 total_study_time INTEGER DEFAULT 0,
                 user_xp INTEGER DEFAULT 0,
                 user_level INTEGER DEFAULT 1,
-                PRIMARY KEY (userid, serverid)
+                season_id INTEGER DEFAULT 1,
+                PRIMARY KEY (userid, serverid, season_id)
             )
         ''')
-        self.cursor.execute('''
+        cursor.execute('''
             CREATE TABLE IF NOT EXISTS study_sessions (
                 session_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 server_id INTEGER,
@@ -28,108 +228,580 @@ class DatabaseManager:
                 end_time INTEGER
             )
         ''')
+        # Append-only ledger of every XP award; userstats.user_xp/user_level are a projection of it
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS xp_events (
+                event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                userid INTEGER,
+                serverid INTEGER,
+                session_id INTEGER DEFAULT NULL,
+                amount INTEGER,
+                created_at INTEGER,
+                season_id INTEGER DEFAULT 1
+            )
+        ''')
+        # Snapshots of the projection so replays can start from the latest one instead of from zero
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS xp_checkpoints (
+                checkpoint_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                last_event_id INTEGER,
+                created_at INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS xp_checkpoint_state (
+                checkpoint_id INTEGER,
+                userid INTEGER,
+                serverid INTEGER,
+                user_xp INTEGER,
+                user_level INTEGER,
+                season_id INTEGER DEFAULT 1,
+                PRIMARY KEY (checkpoint_id, userid, serverid, season_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS guild_settings (
+                serverid INTEGER PRIMARY KEY,
+                work_minutes INTEGER DEFAULT 25,
+                break_minutes INTEGER DEFAULT 5,
+                voice_channel_id INTEGER DEFAULT NULL,
+                volume REAL DEFAULT 0.5,
+                announcement_channel_id INTEGER DEFAULT NULL
+            )
+        ''')
+        # Covers the leaderboard's filter and sort so it never needs a temp B-tree
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_userstats_leaderboard
+            ON userstats (serverid, season_id, user_level DESC, user_xp DESC, total_study_time DESC)
+        ''')
+        # Streak, daily goal and focus state, updated in O(1) as minutes are credited
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS study_streaks (
+                userid INTEGER,
+                serverid INTEGER,
+                current_streak INTEGER DEFAULT 0,
+                best_streak INTEGER DEFAULT 0,
+                last_day INTEGER DEFAULT NULL,
+                day_minutes INTEGER DEFAULT 0,
+                daily_goal INTEGER DEFAULT {DEFAULT_DAILY_GOAL},
+                goals_met INTEGER DEFAULT 0,
+                focus REAL DEFAULT 0,
+                PRIMARY KEY (userid, serverid)
+            ) WITHOUT ROWID
+        ''')
+        # One row per season rollover; servers without rows are in season 1
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS seasons (
+                serverid INTEGER,
+                season_id INTEGER,
+                started_at INTEGER,
+                PRIMARY KEY (serverid, season_id)
+            )
+        ''')
+
+        for table in legacy_tables:
+            columns = ', '.join(self.table_columns(f'{table}_legacy'))
+            cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_legacy')
+            cursor.execute(f'DROP TABLE {table}_legacy')
+        if 'season_id' not in self.table_columns('xp_events'):
+            cursor.execute('ALTER TABLE xp_events ADD COLUMN season_id INTEGER DEFAULT 1')
         self.connection.commit()
 
+        # The first checkpoint is the baseline: XP earned before the ledger existed lives only there
+        cursor.execute('SELECT 1 FROM xp_checkpoints LIMIT 1')
+        if not cursor.fetchone():
+            self.create_xp_checkpoint()
+
+    def get_current_season(self, server_id):
+        """Get a server's current season number, cached after the first lookup"""
+        season_id = self._current_seasons.get(server_id)
+        if season_id is None:
+            with self.reading() as connection:
+                row = connection.execute('SELECT MAX(season_id) FROM seasons WHERE serverid = ?', (server_id,)).fetchone()
+            season_id = self._current_seasons[server_id] = row[0] or 1
+        return season_id
+
+    def forget_seasons(self):
+        """Drop cached season numbers, e.g. after seasons were imported through another connection"""
+        self._current_seasons.clear()
+
+    def start_new_season(self, server_id):
+        """Start a new season for a server and return its number.
+
+        This only records the rollover. The previous season's rows are left untouched as its
+        snapshot, and rows in the new season are created as users earn XP.
+        """
+        cursor = self.connection.cursor()
+        season_id = self.get_current_season(server_id) + 1
+        cursor.execute('INSERT INTO seasons (serverid, season_id, started_at) VALUES (?, ?, ?)',
+                       (server_id, season_id, int(self.clock.time())))
+        self.connection.commit()
+        self._current_seasons[server_id] = season_id
+        return season_id
+
     def add_user(self, user_id, server_id):
-        self.cursor.execute('INSERT INTO userstats (userid, serverid) VALUES (?, ?)', (user_id, server_id))
+        """Create a user's row for the current season if it doesn't exist yet; returns whether it was created"""
+        cursor = self.connection.cursor()
+        season_id = self.get_current_season(server_id)
+        cursor.execute('INSERT OR IGNORE INTO userstats (userid, serverid, season_id) VALUES (?, ?, ?)', (user_id, server_id, season_id))
         try:
             self.connection.commit()
-            return True
+            return cursor.rowcount == 1
         except sqlite3.Error as e:
             print(f"Error adding user: {e}")
             return False
 
-    def get_user(self, user_id, server_id):
-        self.cursor.execute('SELECT * FROM userstats WHERE userid = ? AND serverid = ?', (user_id, server_id))
-        return self.cursor.fetchone()
+    def get_user(self, user_id, server_id, season_id=None):
+        season_id = season_id or self.get_current_season(server_id)
+        with self.reading() as connection:
+            return connection.execute('SELECT * FROM userstats WHERE userid = ? AND serverid = ? AND season_id = ?',
+                                      (user_id, server_id, season_id)).fetchone()
+    
+    def get_user_stats(self, user_id, server_id):
+        """Get a user's current-season row (as get_user) and streak summary (as get_study_streak) from one snapshot"""
+        season_id = self.get_current_season(server_id)
+        with self.snapshot() as cursor:
+            cursor.execute('SELECT * FROM userstats WHERE userid = ? AND serverid = ? AND season_id = ?', (user_id, server_id, season_id))
+            user = cursor.fetchone()
+            state = self._streak_states(cursor, server_id, [user_id]).get(user_id, FRESH_STREAK)
+        return user, summarize_study_streak(state, study_day(self.clock.time()))
     
     def get_last_session(self, user_id, server_id):
-        self.cursor.execute('SELECT last_study_session_time, last_study_session_id FROM userstats WHERE userid = ? AND serverid = ?', (user_id, server_id))
-        return self.cursor.fetchone()
+        season_id = self.get_current_season(server_id)
+        with self.reading() as connection:
+            return connection.execute('SELECT last_study_session_time, last_study_session_id FROM userstats WHERE userid = ? AND serverid = ? AND season_id = ?',
+                                      (user_id, server_id, season_id)).fetchone()
     
-    def increment_xp(self, user_id, server_id):
-        user_data = self.get_user(user_id, server_id)
-        if not user_data:
-            # Create user if doesn't exist
-            self.add_user(user_id, server_id)
-            user_data = self.get_user(user_id, server_id)
-        
-        current_xp = user_data[5]  # user_xp column
-        current_level = user_data[6]  # user_level column
-        xp_gain = random.randint(15, 25)
-        new_xp = current_xp + xp_gain
-        
-        # Calculate XP needed for next level (same formula as main.py)
-        next_level_xp = 5 * (current_level * current_level) + 50 * current_level + 100
-        
-        # Check if user levels up
-        if new_xp >= next_level_xp:
-            new_level = current_level + 1
-            remaining_xp = new_xp - next_level_xp
-            self.cursor.execute('UPDATE userstats SET user_xp = ?, user_level = ? WHERE userid = ? AND serverid = ?', 
-                              (remaining_xp, new_level, user_id, server_id))
-            self.connection.commit()
-            return True, new_level, xp_gain  # Return level up status, new level, and XP gained
-        else:
-            self.cursor.execute('UPDATE userstats SET user_xp = ? WHERE userid = ? AND serverid = ?', 
-                              (new_xp, user_id, server_id))
-            self.connection.commit()
-            return False, current_level, xp_gain  # Return no level up, current level, and XP gained
+    def increment_xp(self, user_id, server_id, session_id=None):
+        """Award random XP to a single user, returning (leveled_up, level, xp_gained)"""
+        _, leveled_up, level, xp_gain = self.award_xp_batch(server_id, [user_id], session_id)[0]
+        return leveled_up, level, xp_gain
+
+    def award_xp_batch(self, server_id, user_ids, session_id=None):
+        """Award random XP to many users of a server in one transaction.
+
+        Every award is appended to xp_events with multi-row inserts and then applied to
+        the userstats projection for the current season. Returns [(user_id, leveled_up, level, xp_gained)].
+        """
+        cursor = self.connection.cursor()
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+        now = int(self.clock.time())
+        season_id = self.get_current_season(server_id)
+
+        # Create any missing users (e.g. the first award of a new season), then read everyone's XP in as few queries as possible
+        cursor.executemany('INSERT OR IGNORE INTO userstats (userid, serverid, season_id) VALUES (?, ?, ?)',
+                           [(user_id, server_id, season_id) for user_id in user_ids])
+        current = {}
+        chunk_size = MAX_SQL_VARIABLES - 2
+        for i in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[i:i + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'SELECT userid, user_xp, user_level FROM userstats WHERE serverid = ? AND season_id = ? AND userid IN ({placeholders})',
+                           (server_id, season_id, *chunk))
+            for userid, xp, level in cursor.fetchall():
+                current[userid] = (xp, level)
+
+        results = []
+        events = []
+        updates = []
+        for user_id in user_ids:
+            xp, level = current[user_id]
+            xp_gain = random.randint(15, 25)
+            new_xp, new_level, leveled_up = apply_xp(xp, level, xp_gain)
+            current[user_id] = (new_xp, new_level)  # Duplicate ids stack like separate awards
+            events.append((user_id, server_id, session_id, xp_gain, now, season_id))
+            updates.append((new_xp, new_level, user_id, server_id, season_id))
+            results.append((user_id, leveled_up, new_level, xp_gain))
+
+        # Multi-row inserts, as many rows per statement as the parameter limit allows
+        rows_per_insert = MAX_SQL_VARIABLES // 6
+        for i in range(0, len(events), rows_per_insert):
+            chunk = events[i:i + rows_per_insert]
+            placeholders = ', '.join(['(?, ?, ?, ?, ?, ?)'] * len(chunk))
+            cursor.execute(f'INSERT INTO xp_events (userid, serverid, session_id, amount, created_at, season_id) VALUES {placeholders}',
+                           [value for event in chunk for value in event])
+        cursor.executemany('UPDATE userstats SET user_xp = ?, user_level = ? WHERE userid = ? AND serverid = ? AND season_id = ?', updates)
+        self.connection.commit()
+        return results
+
+    def create_xp_checkpoint(self, keep=2):
+        """Snapshot the XP projection at the current end of the ledger.
+
+        The baseline checkpoint and the newest `keep` checkpoints are kept; older ones are pruned.
+        Returns the new checkpoint ID.
+        """
+        cursor = self.connection.cursor()
+        cursor.execute('INSERT INTO xp_checkpoints (last_event_id, created_at) VALUES ((SELECT COALESCE(MAX(event_id), 0) FROM xp_events), ?)',
+                       (int(self.clock.time()),))
+        checkpoint_id = cursor.lastrowid
+        cursor.execute('INSERT INTO xp_checkpoint_state (checkpoint_id, userid, serverid, user_xp, user_level, season_id) '
+                       'SELECT ?, userid, serverid, user_xp, user_level, season_id FROM userstats', (checkpoint_id,))
+        # Checkpoint IDs are handed out in order, so the newest `keep` are the last `keep` IDs
+        cursor.execute('''
+            SELECT checkpoint_id FROM xp_checkpoints
+            WHERE checkpoint_id > (SELECT MIN(checkpoint_id) FROM xp_checkpoints) AND checkpoint_id <= ?
+        ''', (checkpoint_id - keep,))
+        stale = [(row[0],) for row in cursor.fetchall()]
+        cursor.executemany('DELETE FROM xp_checkpoint_state WHERE checkpoint_id = ?', stale)
+        cursor.executemany('DELETE FROM xp_checkpoints WHERE checkpoint_id = ?', stale)
+        self.connection.commit()
+        return checkpoint_id
+
+    def iter_xp_events(self, after_event_id=0, chunk_size=10000):
+        """Stream ledger rows (event_id, userid, serverid, season_id, amount) in event order using keyset pagination"""
+        cursor = self.connection.cursor()
+        while True:
+            cursor.execute('SELECT event_id, userid, serverid, season_id, amount FROM xp_events WHERE event_id > ? ORDER BY event_id LIMIT ?',
+                           (after_event_id, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            yield from rows
+            after_event_id = rows[-1][0]
+
+    def replay_xp_ledger(self, from_latest_checkpoint=True, chunk_size=10000, checkpoint=True, progress=None):
+        """Rebuild userstats.user_xp/user_level from the XP ledger.
+
+        Starts from the latest checkpoint (or the baseline one when `from_latest_checkpoint`
+        is False) and streams the remaining events in chunks. `progress` is called with the
+        number of events applied so far after every chunk. Returns (events_applied, users).
+        """
+        cursor = self.connection.cursor()
+        order = 'DESC' if from_latest_checkpoint else 'ASC'
+        cursor.execute(f'SELECT checkpoint_id, last_event_id FROM xp_checkpoints ORDER BY checkpoint_id {order} LIMIT 1')
+        checkpoint_id, last_event_id = cursor.fetchone()
+
+        state = {}
+        cursor.execute('SELECT userid, serverid, season_id, user_xp, user_level FROM xp_checkpoint_state WHERE checkpoint_id = ?', (checkpoint_id,))
+        for userid, serverid, season_id, xp, level in cursor:
+            state[(userid, serverid, season_id)] = (xp, level)
+
+        applied = 0
+        for _, userid, serverid, season_id, amount in self.iter_xp_events(last_event_id, chunk_size):
+            key = (userid, serverid, season_id)
+            xp, level = state.get(key, (0, 1))
+            new_xp, new_level, _ = apply_xp(xp, level, amount)
+            state[key] = (new_xp, new_level)
+            applied += 1
+            if progress and applied % chunk_size == 0:
+                progress(applied)
+        if progress:
+            progress(applied)
+
+        # Write the projection in one transaction; users without any XP history go back to level 1
+        cursor.execute('UPDATE userstats SET user_xp = 0, user_level = 1')
+        cursor.executemany('INSERT OR IGNORE INTO userstats (userid, serverid, season_id) VALUES (?, ?, ?)', state.keys())
+        cursor.executemany('UPDATE userstats SET user_xp = ?, user_level = ? WHERE userid = ? AND serverid = ? AND season_id = ?',
+                           [(xp, level, *key) for key, (xp, level) in state.items()])
+        self.connection.commit()
+
+        if checkpoint:
+            self.create_xp_checkpoint()
+        return applied, len(state)
 
     def start_study_session(self, server_id):
         """Start a new study session and return the session ID"""
-        import time
-        start_time = int(time.time())
-        self.cursor.execute('INSERT INTO study_sessions (server_id, start_time) VALUES (?, ?)', 
-                          (server_id, start_time))
+        cursor = self.connection.cursor()
+        start_time = int(self.clock.time())
+        cursor.execute('INSERT INTO study_sessions (server_id, start_time) VALUES (?, ?)', 
+                       (server_id, start_time))
         self.connection.commit()
-        return self.cursor.lastrowid
+        return cursor.lastrowid
 
     def end_study_session(self, session_id):
         """End a study session"""
-        import time
-        end_time = int(time.time())
-        self.cursor.execute('UPDATE study_sessions SET end_time = ? WHERE session_id = ?', 
-                          (end_time, session_id))
+        cursor = self.connection.cursor()
+        end_time = int(self.clock.time())
+        cursor.execute('UPDATE study_sessions SET end_time = ? WHERE session_id = ?', 
+                       (end_time, session_id))
         self.connection.commit()
 
     def update_user_session(self, user_id, server_id, session_id):
         """Update user's last study session info"""
-        import time
-        current_time = int(time.time())
-        self.cursor.execute('UPDATE userstats SET last_study_session_time = ?, last_study_session_id = ? WHERE userid = ? AND serverid = ?',
-                          (current_time, session_id, user_id, server_id))
+        cursor = self.connection.cursor()
+        current_time = int(self.clock.time())
+        season_id = self.get_current_season(server_id)
+        cursor.execute('UPDATE userstats SET last_study_session_time = ?, last_study_session_id = ? WHERE userid = ? AND serverid = ? AND season_id = ?',
+                       (current_time, session_id, user_id, server_id, season_id))
         self.connection.commit()
 
     def get_session_duration(self, session_id):
         """Get the duration of a study session in minutes"""
-        self.cursor.execute('SELECT start_time, end_time FROM study_sessions WHERE session_id = ?', (session_id,))
-        session = self.cursor.fetchone()
+        with self.reading() as connection:
+            session = connection.execute('SELECT start_time, end_time FROM study_sessions WHERE session_id = ?', (session_id,)).fetchone()
         if session and session[1]:  # If session exists and has end time
             duration_seconds = session[1] - session[0]
             return duration_seconds // 60  # Return duration in minutes
         return 0
 
     def update_total_study_time(self, user_id, server_id, minutes):
-        """Add study time to user's total"""
-        user_data = self.get_user(user_id, server_id)
-        if user_data:
-            current_total = user_data[4]  # total_study_time column
-            new_total = current_total + minutes
-            self.cursor.execute('UPDATE userstats SET total_study_time = ? WHERE userid = ? AND serverid = ?',
-                              (new_total, user_id, server_id))
-            self.connection.commit()
+        """Add study time to user's total for the current season"""
+        self.credit_study_time_batch([(user_id, server_id, minutes)])
+
+    def credit_study_time_batch(self, credits, ended_session_ids=()):
+        """Add study minutes for many users and end sessions in a single transaction.
+
+        `credits` is an iterable of (user_id, server_id, minutes).
+        """
+        cursor = self.connection.cursor()
+        end_time = int(self.clock.time())
+        credits = [(user_id, server_id, self.get_current_season(server_id), minutes)
+                   for user_id, server_id, minutes in credits if minutes > 0]
+        # A new season may have started mid-session, before the user's first XP award in it
+        cursor.executemany('INSERT OR IGNORE INTO userstats (userid, serverid, season_id) VALUES (?, ?, ?)',
+                           [(user_id, server_id, season_id) for user_id, server_id, season_id, _ in credits])
+        cursor.executemany('UPDATE userstats SET total_study_time = total_study_time + ? WHERE userid = ? AND serverid = ? AND season_id = ?',
+                           [(minutes, user_id, server_id, season_id) for user_id, server_id, season_id, minutes in credits])
+        cursor.executemany('UPDATE study_sessions SET end_time = ? WHERE session_id = ?',
+                           [(end_time, session_id) for session_id in ended_session_ids])
+        self.connection.commit()
+
+    def _streak_states(self, cursor, server_id, user_ids):
+        """Read streak state for many users of a server; users without a row are left out"""
+        states = {}
+        chunk_size = MAX_SQL_VARIABLES - 1
+        for i in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[i:i + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT userid, current_streak, best_streak, last_day, day_minutes, daily_goal, goals_met, focus
+                FROM study_streaks WHERE serverid = ? AND userid IN ({placeholders})
+            ''', (server_id, *chunk))
+            for userid, *state in cursor.fetchall():
+                states[userid] = tuple(state)
+        return states
+
+    def record_study_minutes(self, server_id, minutes_by_user):
+        """Credit studied minutes to users' streaks, daily goals and focus scores in one transaction.
+
+        `minutes_by_user` is an iterable of (user_id, minutes). Each user's state is a single
+        row updated in place, so this costs the same however long they've been studying.
+        """
+        cursor = self.connection.cursor()
+        totals = {}
+        for user_id, minutes in minutes_by_user:
+            if minutes > 0:
+                totals[user_id] = totals.get(user_id, 0) + minutes
+        if not totals:
+            return
+        day = study_day(self.clock.time())
+        states = self._streak_states(cursor, server_id, list(totals))
+        rows = []
+        for user_id, minutes in totals.items():
+            rows.append((user_id, server_id, *apply_study_minutes(states.get(user_id, FRESH_STREAK), minutes, day)))
+        cursor.executemany('''
+            INSERT OR REPLACE INTO study_streaks
+            (userid, serverid, current_streak, best_streak, last_day, day_minutes, daily_goal, goals_met, focus)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        self.connection.commit()
+
+    def get_study_streak(self, user_id, server_id):
+        """Get a user's streak, today's progress towards their goal and focus score (see summarize_study_streak)"""
+        with self.reading() as connection:
+            state = self._streak_states(connection.cursor(), server_id, [user_id]).get(user_id, FRESH_STREAK)
+        return summarize_study_streak(state, study_day(self.clock.time()))
+
+    def set_daily_goal(self, user_id, server_id, minutes):
+        cursor = self.connection.cursor()
+        cursor.execute('INSERT OR IGNORE INTO study_streaks (userid, serverid) VALUES (?, ?)', (user_id, server_id))
+        cursor.execute('UPDATE study_streaks SET daily_goal = ? WHERE userid = ? AND serverid = ?', (minutes, user_id, server_id))
+        self.connection.commit()
+
+    def backfill_study_streaks(self, chunk_size=10000, progress=None):
+        """Rebuild every user's streak state from the XP ledger in one streaming pass.
+
+        The ledger has one event per participant per studied minute, in time order, which
+        is exactly the history streaks need. Daily goals users have set are kept.
+        `progress` is called with the number of minutes replayed after every chunk.
+        Returns (minutes, users).
+        """
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT userid, serverid, daily_goal FROM study_streaks')
+        goals = {(userid, serverid): goal for userid, serverid, goal in cursor.fetchall()}
+
+        states = {}
+        minutes = 0
+        after_event_id = 0
+        while True:
+            cursor.execute('SELECT event_id, userid, serverid, created_at FROM xp_events WHERE event_id > ? ORDER BY event_id LIMIT ?',
+                           (after_event_id, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for _, userid, serverid, created_at in rows:
+                key = (userid, serverid)
+                state = states.get(key)
+                if state is None:
+                    state = (*FRESH_STREAK[:4], goals.get(key, DEFAULT_DAILY_GOAL), *FRESH_STREAK[5:])
+                states[key] = apply_study_minutes(state, 1, study_day(created_at))
+            minutes += len(rows)
+            after_event_id = rows[-1][0]
+            if progress:
+                progress(minutes)
+
+        cursor.executemany('''
+            INSERT OR REPLACE INTO study_streaks
+            (userid, serverid, current_streak, best_streak, last_day, day_minutes, daily_goal, goals_met, focus)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(*key, *state) for key, state in states.items()])
+        self.connection.commit()
+        return minutes, len(states)
+
+    def get_leaderboard(self, server_id, limit=10, season_id=None):
+        """Get leaderboard data for a server's season (current by default), ordered by level then XP"""
+        season_id = season_id or self.get_current_season(server_id)
+        with self.reading() as connection:
+            return connection.execute('''
+                SELECT userid, total_study_time, user_xp, user_level 
+                FROM userstats 
+                WHERE serverid = ? AND season_id = ?
+                ORDER BY user_level DESC, user_xp DESC, total_study_time DESC 
+                LIMIT ?
+            ''', (server_id, season_id, limit)).fetchall()
+
+    def get_guild_settings(self, server_id):
+        """Get a server's settings row (serverid, work_minutes, break_minutes, voice_channel_id, volume, announcement_channel_id)"""
+        with self.reading() as connection:
+            return connection.execute('SELECT * FROM guild_settings WHERE serverid = ?', (server_id,)).fetchone()
+
+    def get_guild_settings_bulk(self, server_ids):
+        """Get the settings rows for many servers at once; servers without settings are left out"""
+        server_ids = list(server_ids)
+        rows = []
+        with self.reading() as connection:
+            for i in range(0, len(server_ids), MAX_SQL_VARIABLES):
+                chunk = server_ids[i:i + MAX_SQL_VARIABLES]
+                placeholders = ', '.join('?' * len(chunk))
+                rows.extend(connection.execute(f'SELECT * FROM guild_settings WHERE serverid IN ({placeholders})', chunk).fetchall())
+        return rows
+
+    def update_guild_settings(self, server_id, **settings):
+        """Set one or more settings for a server, creating its row with defaults if needed"""
+        cursor = self.connection.cursor()
+        unknown = set(settings) - set(GUILD_SETTINGS_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown guild settings: {', '.join(sorted(unknown))}")
+        cursor.execute('INSERT OR IGNORE INTO guild_settings (serverid) VALUES (?)', (server_id,))
+        if settings:
+            assignments = ', '.join(f'{column} = ?' for column in settings)
+            cursor.execute(f'UPDATE guild_settings SET {assignments} WHERE serverid = ?', (*settings.values(), server_id))
+        self.connection.commit()
+
+    def iter_table(self, table, chunk_size=5000):
+        """Stream every row of one of TRANSFER_TABLES in key order (columns as in table_columns).
+
+        Each chunk is its own short keyset-paginated query, so memory stays constant and
+        writers are never held up for longer than one chunk takes to read.
+        """
+        key = TRANSFER_TABLES[table]
+        key_columns = ', '.join(key)
+        key_positions = [self.table_columns(table).index(column) for column in key]
+        placeholders = ', '.join('?' * len(key))
+        cursor = self.connection.cursor()
+        cursor.execute(f'SELECT * FROM {table} ORDER BY {key_columns} LIMIT ?', (chunk_size,))
+        while True:
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = [rows[-1][position] for position in key_positions]
+            cursor.execute(f'SELECT * FROM {table} WHERE ({key_columns}) > ({placeholders}) ORDER BY {key_columns} LIMIT ?',
+                           (*last, chunk_size))
+
+    def import_rows(self, table, columns, rows, replace=False, update_projection=False):
+        """Insert a batch of rows into one of TRANSFER_TABLES in a single transaction.
+
+        Columns left out take their defaults (leave out session_id/event_id to append with new IDs).
+        Rows whose key already exists are skipped, or overwrite the existing row when `replace`
+        is set. With `update_projection`, xp_events rows are also applied to the XP projection in the
+        same transaction. Returns the number of rows written.
+        """
+        cursor = self.connection.cursor()
+        if table not in TRANSFER_TABLES:
+            raise ValueError(f"Can't import into {table}")
+        unknown = set(columns) - set(self.table_columns(table))
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {', '.join(sorted(unknown))}")
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        placeholders = ', '.join('?' * len(columns))
+        applying = table == 'xp_events' and update_projection
+        if applying:
+            # Take the write lock first so which events already exist can't change before the insert
+            cursor.execute('BEGIN IMMEDIATE')
+            taken_back, added = self._imported_xp_changes(cursor, columns, rows, replace)
+        written = self.connection.total_changes
+        cursor.executemany(f'{verb} INTO {table} ({", ".join(columns)}) VALUES ({placeholders})', rows)
+        written = self.connection.total_changes - written
+        if applying:
+            self._apply_xp_changes(cursor, taken_back, added)
+        self.connection.commit()
+        if table == 'seasons':
+            self.forget_seasons()
+        return written
+
+    def _imported_xp_changes(self, cursor, columns, rows, replace):
+        """Work out how importing ledger rows changes XP: ([(key, amount) taken back], [(key, amount) added]).
+
+        Keys are (userid, serverid, season_id). Rows whose event_id already exists add nothing
+        unless `replace` is set, when the replaced award is taken back and the new one added.
+        Values may be strings (CSV), so they're converted to the columns' integers first.
+        """
+        def integer(value, default=None):
+            return default if value is None else int(value)
+
+        records = [dict(zip(columns, row)) for row in rows]
+        existing = {}
+        ids = [integer(record.get('event_id')) for record in records if record.get('event_id') is not None]
+        chunk_size = MAX_SQL_VARIABLES
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            cursor.execute(f'SELECT event_id, userid, serverid, season_id, amount FROM xp_events WHERE event_id IN ({", ".join("?" * len(chunk))})',
+                           chunk)
+            for event_id, userid, serverid, season_id, amount in cursor.fetchall():
+                existing[event_id] = ((userid, serverid, season_id), amount or 0)
+
+        taken_back = []
+        added = []
+        for record in records:
+            key = (integer(record.get('userid')), integer(record.get('serverid')), integer(record.get('season_id'), 1))
+            change = (key, integer(record.get('amount'), 0))
+            event_id = integer(record.get('event_id'))
+            if event_id in existing:
+                if not replace or existing[event_id] == change:
+                    continue
+                taken_back.append(existing[event_id])
+            added.append(change)
+            if event_id is not None:
+                existing[event_id] = change  # A later row with the same id meets this one, like the insert will
+        return taken_back, added
+
+    def _apply_xp_changes(self, cursor, taken_back, added):
+        """Apply imported ledger changes to the XP projection, in ledger order.
 
-    def get_leaderboard(self, server_id, limit=10):
-        """Get leaderboard data for a server, ordered by level then XP"""
-        self.cursor.execute('''
-            SELECT userid, total_study_time, user_xp, user_level 
-            FROM userstats 
-            WHERE serverid = ? 
-            ORDER BY user_level DESC, user_xp DESC, total_study_time DESC 
-            LIMIT ?
-        ''', (server_id, limit))
-        return self.cursor.fetchall()
+        Taken back XP doesn't lower levels already reached; `replay-xp --full` rebuilds them exactly.
+        """
+        keys = list(dict.fromkeys(key for key, _amount in taken_back + added))
+        cursor.executemany('INSERT OR IGNORE INTO userstats (userid, serverid, season_id) VALUES (?, ?, ?)', keys)
+        current = {}
+        for key in keys:
+            cursor.execute('SELECT user_xp, user_level FROM userstats WHERE userid = ? AND serverid = ? AND season_id = ?', key)
+            current[key] = cursor.fetchone() or (0, 1)
+        for key, amount in taken_back:
+            xp, level = current[key]
+            current[key] = (max(0, xp - amount), level)
+        for key, amount in added:
+            xp, level = current[key]
+            new_xp, new_level, _ = apply_xp(xp, level, amount)
+            current[key] = (new_xp, new_level)
+        cursor.executemany('UPDATE userstats SET user_xp = ?, user_level = ? WHERE userid = ? AND serverid = ? AND season_id = ?',
+                           [(xp, level, *key) for key, (xp, level) in current.items()])
 
     def close(self):
+        with self._readers_lock:
+            for connection in self._readers:
+                connection.close()
+            self._readers.clear()
         self.connection.close()
\ No newline at end of file
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+# Discord drops any interaction that isn't acknowledged within 3 seconds
+INTERACTION_DEADLINE = 3.0
+# Defer once a handler has used this much of the window, leaving room for the defer call itself
+DEFER_AFTER = 2.0
+# What a deferred "thinking" message becomes when the reply needs the other visibility
+SENT_PRIVATELY = "📨 Replied privately."
+SENT_PUBLICLY = "📨 Replied below."
+
+
+class InteractionDeadlineGuard:
+    """Tracks interaction handlers and defers them before Discord's acknowledgement deadline"""
+
+    def __init__(self, defer_after=DEFER_AFTER, loop_monitor=None):
+        self.defer_after = defer_after
+        self.loop_monitor = loop_monitor  # Optional LoopLagMonitor that blames event loop blocks on handlers
+        self.recorder = None  # TrafficRecorder that logs every tracked interaction while set
+        self.handled = {}    # handler name -> interactions tracked
+        self.deferrals = {}  # (handler name, stage) -> deferrals
+        self.missed = {}     # handler name -> interactions acknowledged too late
+        self.slowest = {}    # handler name -> slowest time to first acknowledgement (seconds)
+
+    def track(self, interaction, name, ephemeral=False):
+        """Wrap an interaction for the duration of a handler.
+
+        Use as `async with guard.track(interaction, 'study') as tracked:` and reply
+        with `tracked.send(...)` so the reply goes through a followup once deferred.
+        `ephemeral` decides whether an automatic deferral shows a private "thinking" state;
+        replies with the other visibility still get it (see TrackedInteraction.send).
+        """
+        return TrackedInteraction(self, interaction, name, ephemeral)
+
+    def record_deferral(self, name, stage, elapsed):
+        key = (name, stage)
+        self.deferrals[key] = self.deferrals.get(key, 0) + 1
+        print(f"Deferred interaction '{name}' at stage '{stage}' after {elapsed:.2f}s")
+
+    def record_missed(self, name, elapsed, error):
+        self.missed[name] = self.missed.get(name, 0) + 1
+        print(f"Interaction '{name}' missed the acknowledgement deadline after {elapsed:.2f}s: {error}")
+
+    def record_finished(self, name, acknowledged_after):
+        self.handled[name] = self.handled.get(name, 0) + 1
+        if acknowledged_after is not None and acknowledged_after > self.slowest.get(name, 0.0):
+            self.slowest[name] = acknowledged_after
+
+    def summary(self):
+        """Return [(handler, handled, deferred, missed, slowest_seconds)] with the most deferred first"""
+        deferred_by_name = {}
+        for (name, _stage), count in self.deferrals.items():
+            deferred_by_name[name] = deferred_by_name.get(name, 0) + count
+
+        rows = []
+        for name, count in self.handled.items():
+            rows.append((name, count, deferred_by_name.get(name, 0), self.missed.get(name, 0), self.slowest.get(name, 0.0)))
+        rows.sort(key=lambda row: (row[2], row[3], row[4]), reverse=True)
+        return rows
+
+
+class TrackedInteraction:
+    """A single interaction being handled under an InteractionDeadlineGuard"""
+
+    def __init__(self, guard, interaction, name, ephemeral):
+        self.guard = guard
+        self.interaction = interaction
+        self.name = name
+        self.ephemeral = ephemeral
+        self.stage = 'start'
+        self.deferred = False
+        self.thinking = False  # Deferred and the first followup hasn't replaced the "thinking" message yet
+        self.acknowledged_after = None
+        self._lock = asyncio.Lock()
+        self._watchdog = None
+        self._attribution = None
+        self._started = time.monotonic()
+        self._offset = self._initial_offset(interaction)
+
+    @staticmethod
+    def _initial_offset(interaction):
+        """Seconds already spent between Discord creating the interaction and the handler starting"""
+        created_at = getattr(interaction, 'created_at', None)
+        if created_at is None:
+            return 0.0
+        offset = (datetime.now(timezone.utc) - created_at).total_seconds()
+        # Clamp to cope with clock skew between us and Discord
+        return min(max(0.0, offset), INTERACTION_DEADLINE)
+
+    def elapsed(self):
+        return self._offset + (time.monotonic() - self._started)
+
+    async def __aenter__(self):
+        if self.guard.recorder:
+            user = getattr(self.interaction, 'user', None)
+            self.guard.recorder.record('interaction', self.name, getattr(self.interaction, 'guild_id', None), getattr(user, 'id', None))
+        if self.guard.loop_monitor:
+            self._attribution = self.guard.loop_monitor.push(self.name, getattr(self.interaction, 'guild_id', None))
+        self._watchdog = asyncio.create_task(self._watch())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._watchdog:
+            self._watchdog.cancel()
+        if self.guard.loop_monitor:
+            self.guard.loop_monitor.pop(self._attribution)
+        self.guard.record_finished(self.name, self.acknowledged_after)
+        return False
+
+    async def _watch(self):
+        """Defer automatically if the handler is still awaiting something close to the deadline"""
+        await asyncio.sleep(max(0.0, self.guard.defer_after - self.elapsed()))
+        await self._defer()
+
+    async def checkpoint(self, stage):
+        """Mark progress through the handler and defer if the deadline is getting close.
+
+        Blocking work (e.g. sqlite calls) stops the watchdog from running, so handlers
+        call this after each block of blocking work.
+        """
+        self.stage = stage
+        if self.elapsed() >= self.guard.defer_after:
+            await self._defer()
+
+    async def _defer(self):
+        async with self._lock:
+            if self.deferred or self.interaction.response.is_done():
+                return
+            elapsed = self.elapsed()
+            try:
+                await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+            except Exception as e:
+                self.guard.record_missed(self.name, elapsed, e)
+                return
+            self.deferred = True
+            self.thinking = True
+            self.acknowledged_after = elapsed
+            self.guard.record_deferral(self.name, self.stage, elapsed)
+
+    async def send(self, content=None, **kwargs):
+        """Reply to the interaction, completing through a followup if it was deferred.
+
+        Discord gives the first followup after a deferral the deferral's visibility whatever
+        it asks for, so a reply whose visibility differs turns the "thinking" message into
+        a neutral note and goes out as a second followup, which keeps its own.
+        """
+        async with self._lock:
+            if self._watchdog:
+                self._watchdog.cancel()
+            if self.interaction.response.is_done():
+                ephemeral = kwargs.get('ephemeral', False)
+                if self.thinking and ephemeral != self.ephemeral:
+                    await self.interaction.edit_original_response(content=SENT_PRIVATELY if ephemeral else SENT_PUBLICLY)
+                self.thinking = False
+                return await self.interaction.followup.send(content, **kwargs)
+            self.acknowledged_after = self.elapsed()
+            return await self.interaction.response.send_message(content, **kwargs)
@@ -0,0 +1,161 @@
+"""
+Minimal stand-ins for the parts of discord.py the Study cog touches.
+
+They let simulations, stress tests and replays run the real cog without a gateway
+connection. Everything sent through them is recorded instead of hitting the API.
+API calls still yield to the event loop once, like a real HTTP round trip would, so
+concurrent handlers interleave the way they do in production.
+"""
+
+import asyncio
+import itertools
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+_ids = itertools.count(1_000_000)
+
+
+class StubMessage:
+    def __init__(self, channel, content=None, embed=None, view=None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.view = view
+        self.edits = []  # Keyword arguments of every edit, in order
+
+    @property
+    def jump_url(self):
+        return f"https://discord.com/channels/{self.channel.guild.id}/{self.channel.id}/{self.id}"
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(0)
+        self.edits.append(kwargs)
+        for name in ('content', 'embed', 'view'):
+            if name in kwargs:
+                setattr(self, name, kwargs[name])
+        return self
+
+
+class StubChannel:
+    def __init__(self, guild, name="study"):
+        self.id = next(_ids)
+        self.guild = guild
+        self.name = name
+        self.sent = []
+
+    def permissions_for(self, member):
+        return SimpleNamespace(send_messages=True)
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        await asyncio.sleep(0)
+        message = StubMessage(self, content, embed, view)
+        self.sent.append(message)
+        return message
+
+
+class StubMember:
+    def __init__(self, user_id, name=None):
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.display_avatar = SimpleNamespace(url=f"https://example.invalid/avatars/{user_id}.png")
+
+
+class StubGuild:
+    def __init__(self, guild_id=None):
+        self.id = guild_id or next(_ids)
+        self.name = f"guild{self.id}"
+        self.me = StubMember(0, "bot")
+        self.voice_client = None
+        self.members = {}
+        self.channels = {}
+        self.text_channel = self.add_channel("study")
+
+    def add_channel(self, name):
+        channel = StubChannel(self, name)
+        self.channels[channel.id] = channel
+        return channel
+
+    def add_member(self, user_id):
+        member = self.members.get(user_id)
+        if not member:
+            member = self.members[user_id] = StubMember(user_id)
+        return member
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+
+class StubResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+        self.deferred = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, ephemeral=False, thinking=False):
+        await asyncio.sleep(0)
+        self._done = True
+        self.deferred = True
+
+    async def send_message(self, content=None, embed=None, view=None, ephemeral=False, **kwargs):
+        await asyncio.sleep(0)
+        self._done = True
+        self._interaction.sent.append(StubMessage(self._interaction.channel, content, embed, view))
+
+
+class StubFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, embed=None, view=None, ephemeral=False, **kwargs):
+        await asyncio.sleep(0)
+        message = StubMessage(self._interaction.channel, content, embed, view)
+        self._interaction.sent.append(message)
+        return message
+
+
+class StubInteraction:
+    def __init__(self, guild, user, channel=None, message=None):
+        self.id = next(_ids)
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.channel = channel or guild.text_channel
+        self.message = message
+        self.created_at = datetime.now(timezone.utc)
+        self.sent = []
+        self.original_edits = []
+        self.response = StubResponse(self)
+        self.followup = StubFollowup(self)
+
+    async def edit_original_response(self, content=None, **kwargs):
+        await asyncio.sleep(0)
+        self.original_edits.append(content)
+
+
+class StubBot:
+    def __init__(self, guilds=()):
+        self.user = StubMember(0, "bot")
+        self._guilds = {guild.id: guild for guild in guilds}
+
+    @property
+    def guilds(self):
+        return list(self._guilds.values())
+
+    def add_guild(self, guild):
+        self._guilds[guild.id] = guild
+        return guild
+
+    def get_guild(self, guild_id):
+        return self._guilds.get(guild_id)
+
+    async def wait_until_ready(self):
+        return None
@@ -0,0 +1,65 @@
+from dbmanager import GUILD_SETTINGS_COLUMNS
+
+# Used for servers that have never changed their settings
+DEFAULT_GUILD_SETTINGS = {
+    'work_minutes': 25,
+    'break_minutes': 5,
+    'voice_channel_id': None,
+    'volume': 0.5,
+    'announcement_channel_id': None,
+}
+
+
+class GuildSettingsCache:
+    """Read-through in-memory cache of the guild_settings table.
+
+    Reads only hit the database the first time a server is seen (or after its
+    settings change), so hot paths can read config freely.
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._settings = {}  # server_id -> settings dict
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _from_row(row):
+        if not row:
+            return dict(DEFAULT_GUILD_SETTINGS)
+        # Row format: (serverid, work_minutes, break_minutes, voice_channel_id, volume, announcement_channel_id)
+        return dict(zip(GUILD_SETTINGS_COLUMNS, row[1:]))
+
+    def get(self, server_id):
+        """Get a server's settings, loading them from the database on a cache miss"""
+        settings = self._settings.get(server_id)
+        if settings is None:
+            self.misses += 1
+            settings = self._settings[server_id] = self._from_row(self.db_manager.get_guild_settings(server_id))
+        else:
+            self.hits += 1
+        return dict(settings)  # Copy so callers can't change the cached settings by accident
+
+    def update(self, server_id, **settings):
+        """Write settings to the database and invalidate the cached copy.
+
+        Only for callers on the thread that reads the cache; the Study cog writes on its writer
+        thread and invalidates on the event loop instead (see Study.update_guild_settings).
+        """
+        self.db_manager.update_guild_settings(server_id, **settings)
+        self.invalidate(server_id)
+
+    def invalidate(self, server_id=None):
+        """Drop one server's cached settings, or everything when no server is given"""
+        if server_id is None:
+            self._settings.clear()
+        else:
+            self._settings.pop(server_id, None)
+
+    def preload(self, server_ids):
+        """Warm the cache for many servers with a single bulk query"""
+        server_ids = list(server_ids)
+        rows = {row[0]: row for row in self.db_manager.get_guild_settings_bulk(server_ids)}
+        for server_id in server_ids:
+            self._settings[server_id] = self._from_row(rows.get(server_id))
+        return len(server_ids)
@@ -0,0 +1,139 @@
+import asyncio
+import collections
+import threading
+import time
+import weakref
+
+# Upper bounds (milliseconds) of the scheduling-delay histogram buckets; the last bucket is open-ended
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class LoopLagMonitor:
+    """Measures event loop scheduling delay and attributes long blocks to whatever caused them.
+
+    A sampler task sleeps for `interval` and records how late it wakes up. A watchdog
+    thread notices when the loop has stopped running for more than `block_threshold`
+    and looks up which task is running at that moment, so the block can be blamed on
+    the command, background task and guild registered with `attribute`.
+    """
+
+    def __init__(self, interval=0.5, block_threshold=0.25, history=50):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.histogram = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.samples = 0
+        self.max_lag = 0.0
+        self.blocks = collections.deque(maxlen=history)  # (activity, guild_id, task name, seconds)
+        self.block_counts = {}  # activity -> blocks over the threshold
+
+        self._activities = weakref.WeakKeyDictionary()  # task -> (activity, guild_id)
+        self._loop = None
+        self._sampler = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._suspect = None  # What the watchdog saw running during the current block
+
+    def start(self):
+        """Start sampling the running event loop"""
+        if self._sampler:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._sampler = asyncio.create_task(self._sample(), name='loop-lag-sampler')
+        self._watchdog = threading.Thread(target=self._watch, name='loop-lag-watchdog', daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._sampler:
+            self._sampler.cancel()
+            self._sampler = None
+
+    def push(self, activity, guild_id=None):
+        """Attribute the current task to `activity` (and guild) until `pop` is called with the returned token"""
+        task = asyncio.current_task()
+        if task is None:
+            return None
+        previous = self._activities.get(task)
+        self._activities[task] = (activity, guild_id)
+        return task, previous
+
+    def pop(self, token):
+        if token is None:
+            return
+        task, previous = token
+        if previous is None:
+            self._activities.pop(task, None)
+        else:
+            self._activities[task] = previous
+
+    def attribute(self, activity, guild_id=None):
+        """Context manager form of push/pop, e.g. around one guild's iteration of a background task"""
+        return _Attribution(self, activity, guild_id)
+
+    async def _sample(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self._record(max(0.0, now - expected))
+
+    def _record(self, lag):
+        self.samples += 1
+        self.max_lag = max(self.max_lag, lag)
+        lag_ms = lag * 1000
+        for i, bound in enumerate(LAG_BUCKETS_MS):
+            if lag_ms <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+        if lag >= self.block_threshold:
+            activity, guild_id, task_name = self._suspect or ('unknown', None, None)
+            self._suspect = None
+            self.blocks.append((activity, guild_id, task_name, lag))
+            self.block_counts[activity] = self.block_counts.get(activity, 0) + 1
+            where = f" in guild {guild_id}" if guild_id else ""
+            print(f"Event loop blocked for {lag:.2f}s by {activity}{where} (task {task_name})")
+
+    def _watch(self):
+        """Runs in a thread: catch the loop while it is blocked and note what it is running"""
+        while not self._stopped.wait(self.block_threshold / 2):
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for < self.block_threshold or self._suspect is not None:
+                continue
+            task = asyncio.current_task(self._loop)
+            if task is None:
+                self._suspect = ('callback', None, None)
+                continue
+            activity, guild_id = self._activities.get(task, (None, None))
+            self._suspect = (activity or task.get_name(), guild_id, task.get_name())
+
+    def summary(self):
+        """Return a short text report of the lag histogram and the worst offenders"""
+        lines = [f"Samples: {self.samples}, max lag: {self.max_lag * 1000:.0f}ms"]
+        labels = [f"<={bound}ms" for bound in LAG_BUCKETS_MS] + [f">{LAG_BUCKETS_MS[-1]}ms"]
+        lines.append("  ".join(f"{label}: {count}" for label, count in zip(labels, self.histogram) if count))
+        for activity, count in sorted(self.block_counts.items(), key=lambda item: item[1], reverse=True)[:5]:
+            lines.append(f"Blocked by {activity}: {count}x")
+        return "\n".join(lines)
+
+
+class _Attribution:
+    def __init__(self, monitor, activity, guild_id):
+        self.monitor = monitor
+        self.activity = activity
+        self.guild_id = guild_id
+        self.token = None
+
+    def __enter__(self):
+        self.token = self.monitor.push(self.activity, self.guild_id)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.monitor.pop(self.token)
+        return False
@@ -1,6 +1,8 @@
 import discord
 from discord.ext import commands
+import asyncio
 import os
+import signal
 from key import key
 
 class aclient(commands.Bot):
@@ -10,11 +12,24 @@ class aclient(commands.Bot):
         intents.message_content = True
         super().__init__(command_prefix='!', intents=intents)
         self.synced = False
+        self.shutdown_tasks = set()  # Keeps the SIGTERM close task referenced until it finishes
 
     async def on_ready(self):
         print(f"We are ready for study services! Logged in as {self.user}")
 
+    def close_on_signal(self):
+        task = asyncio.create_task(self.close())
+        self.shutdown_tasks.add(task)
+        task.add_done_callback(self.shutdown_tasks.discard)
+
     async def setup_hook(self):
+        # Shut down cleanly on SIGTERM (systemd, docker stop) so cogs can save sessions
+        if hasattr(signal, "SIGTERM"):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.close_on_signal)
+            except NotImplementedError:
+                pass
+
         for filename in os.listdir("./cogs"):
             if filename.endswith(".py"):
                 await self.load_extension(f"cogs.{filename[:-3]}")
@@ -24,6 +39,8 @@ class aclient(commands.Bot):
             self.synced = True
             print("Synced the commands with Discord.")
 
-bot = aclient()
-
-bot.run(key)  # Use the key from key.py to run the bot
\ No newline at end of file
+# Card rendering workers are spawned processes, which import this script as __mp_main__;
+# starting the bot only when run directly keeps them from logging in a second copy of it
+if __name__ == "__main__":
+    bot = aclient()
+    bot.run(key)  # Use the key from key.py to run the bot
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the study database.
+
+Usage:
+    python manage.py replay-xp [--db study_sessions.db] [--full] [--chunk-size N] [--no-checkpoint]
+    python manage.py checkpoint-xp [--db study_sessions.db]
+    python manage.py backfill-streaks [--db study_sessions.db] [--chunk-size N]
+    python manage.py simulate [--hours 24] [--guilds 10] [--users 20]
+    python manage.py benchmark-cards [--requests 500] [--distinct 50] [--workers 2]
+    python manage.py benchmark-reads [--seconds 5] [--guilds 20] [--users 200] [--rate 100] [--readers 4]
+    python manage.py replay recordings/traffic-....ndjson [--speed 1] [--readers 4]
+    python manage.py export [--format ndjson|csv] [--out exports] [--tables userstats ...] [--chunk-size N]
+    python manage.py import PATH [PATH ...] [--replace] [--batch-size N]
+"""
+
+import argparse
+import time
+
+from dbmanager import DatabaseManager
+
+
+def replay_xp(args):
+    db = DatabaseManager(args.db)
+    started = time.perf_counter()
+
+    def progress(applied):
+        print(f"  replayed {applied} events ({time.perf_counter() - started:.1f}s)")
+
+    applied, users = db.replay_xp_ledger(
+        from_latest_checkpoint=not args.full,
+        chunk_size=args.chunk_size,
+        checkpoint=not args.no_checkpoint,
+        progress=progress
+    )
+    db.close()
+    print(f"Rebuilt XP for {users} users from {applied} events in {time.perf_counter() - started:.1f}s")
+
+
+def checkpoint_xp(args):
+    db = DatabaseManager(args.db)
+    checkpoint_id = db.create_xp_checkpoint()
+    db.close()
+    print(f"Created XP checkpoint {checkpoint_id}")
+
+
+def backfill_streaks(args):
+    db = DatabaseManager(args.db)
+    started = time.perf_counter()
+
+    def progress(minutes):
+        print(f"  replayed {minutes} study minutes ({time.perf_counter() - started:.1f}s)")
+
+    minutes, users = db.backfill_study_streaks(chunk_size=args.chunk_size, progress=progress)
+    db.close()
+    print(f"Rebuilt streaks for {users} users from {minutes} study minutes in {time.perf_counter() - started:.1f}s")
+
+
+def simulate(args):
+    # Imported here so the database commands work without discord.py installed
+    from simulation import run_simulation
+
+    started = time.perf_counter()
+    report = run_simulation(hours=args.hours, guilds=args.guilds, users_per_guild=args.users)
+    print(f"Simulated {args.hours}h of {report['participants']} participants in {time.perf_counter() - started:.1f}s")
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+    if not report['correct']:
+        raise SystemExit("Simulation produced incorrect XP awards or pomodoro cycles")
+
+
+def benchmark_cards(args):
+    from cards import CARDS_AVAILABLE, run_benchmark
+
+    if not CARDS_AVAILABLE:
+        raise SystemExit("Pillow is not installed; run `pip install Pillow` to render image cards")
+    report = run_benchmark(requests=args.requests, distinct=args.distinct, workers=args.workers, max_pending=args.max_pending)
+    print(f"Rendered {report['served']} cards ({report['rendered']} drawn, {report['cache_hits']} from cache) in {report['seconds']:.1f}s")
+    for key, value in report.items():
+        print(f"  {key}: {value:.2f}" if isinstance(value, float) else f"  {key}: {value}")
+
+
+def benchmark_reads(args):
+    from simulation import run_read_benchmark
+
+    reports = run_read_benchmark(seconds=args.seconds, guilds=args.guilds, users_per_guild=args.users,
+                                 read_rate=args.rate, read_connections=args.readers)
+    print(f"Stats and leaderboard reads while XP ticks write back to back for {args.seconds}s, "
+          f"{args.guilds} guilds of {args.users} participants:")
+    for mode, report in reports.items():
+        print(f"  {mode}:")
+        for key, value in report.items():
+            print(f"    {key}: {value:.2f}" if isinstance(value, float) else f"    {key}: {value}")
+
+
+def replay_traffic(args):
+    from simulation import run_replay
+
+    # Replays always run on a scratch database, never the one given by --db
+    report = run_replay(args.path, speed=args.speed, read_connections=args.readers)
+    commands = report.pop('commands')
+    print(f"Replayed {report['trace_seconds']:.0f}s of traffic ({report['interactions']} interactions, "
+          f"{report['events']} ticks, {report['skipped']} skipped) in {report['seconds']:.1f}s")
+    for key, value in report.items():
+        print(f"  {key}: {value:.2f}" if isinstance(value, float) else f"  {key}: {value}")
+    for name, stats in commands.items():
+        print(f"  {name}: {stats['count']} at p50 {stats['p50_ms']:.1f}ms, p99 {stats['p99_ms']:.1f}ms")
+
+
+def export_data(args):
+    from transfer import export_tables
+
+    started = time.perf_counter()
+
+    def progress(table, rows):
+        print(f"  {table}: {rows} rows ({time.perf_counter() - started:.1f}s)")
+
+    exported = export_tables(args.db, args.out, args.format, args.tables, args.chunk_size, progress)
+    total = sum(rows for _path, rows in exported.values())
+    print(f"Exported {total} rows to {args.out} in {time.perf_counter() - started:.1f}s")
+
+
+def import_data(args):
+    from transfer import import_files, needs_xp_checkpoint
+
+    started = time.perf_counter()
+
+    def progress(table, rows):
+        print(f"  {table}: {rows} rows ({time.perf_counter() - started:.1f}s)")
+
+    imported = import_files(args.db, args.paths, args.batch_size, args.replace, progress=progress)
+    for table, (read, written) in imported.items():
+        print(f"  {table}: {written} of {read} rows written")
+    print(f"Imported {sum(read for read, _ in imported.values())} rows in {time.perf_counter() - started:.1f}s")
+    if needs_xp_checkpoint(imported):
+        print("XP changed; run `python manage.py checkpoint-xp` once the bot is quiet so replays keep it")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Study bot database maintenance")
+    parser.add_argument('--db', default='study_sessions.db', help='Path to the study database')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    replay = subcommands.add_parser('replay-xp', help='Rebuild user XP and levels from the XP ledger')
+    replay.add_argument('--full', action='store_true', help='Replay from the baseline checkpoint instead of the latest one')
+    replay.add_argument('--chunk-size', type=int, default=10000, help='Ledger rows read per query')
+    replay.add_argument('--no-checkpoint', action='store_true', help="Don't checkpoint the rebuilt projection")
+    replay.set_defaults(func=replay_xp)
+
+    checkpoint = subcommands.add_parser('checkpoint-xp', help='Snapshot the current XP projection')
+    checkpoint.set_defaults(func=checkpoint_xp)
+
+    streaks = subcommands.add_parser('backfill-streaks', help='Rebuild study streaks, goals and focus scores from the XP ledger')
+    streaks.add_argument('--chunk-size', type=int, default=10000, help='Ledger rows read per query')
+    streaks.set_defaults(func=backfill_streaks)
+
+    simulation = subcommands.add_parser('simulate', help='Run study sessions on virtual time and report tick cost')
+    simulation.add_argument('--hours', type=float, default=24, help='Simulated hours')
+    simulation.add_argument('--guilds', type=int, default=10, help='Guilds with an active session')
+    simulation.add_argument('--users', type=int, default=20, help='Participants per guild')
+    simulation.set_defaults(func=simulate)
+
+    cards = subcommands.add_parser('benchmark-cards', help='Measure image card rendering throughput and latency')
+    cards.add_argument('--requests', type=int, default=500, help='Card requests to send')
+    cards.add_argument('--distinct', type=int, default=50, help='Different cards among the requests; the rest hit the cache')
+    cards.add_argument('--workers', type=int, default=2, help='Render processes')
+    cards.add_argument('--max-pending', type=int, default=32, help='Cards allowed to queue before requests are turned away')
+    cards.set_defaults(func=benchmark_cards)
+
+    reads = subcommands.add_parser('benchmark-reads', help='Measure stats and leaderboard latency while XP is being written')
+    reads.add_argument('--seconds', type=float, default=5, help='How long each mode runs')
+    reads.add_argument('--guilds', type=int, default=20, help='Guilds with an active session')
+    reads.add_argument('--users', type=int, default=200, help='Participants per guild')
+    reads.add_argument('--rate', type=float, default=100, help='Stats and leaderboard commands per second')
+    reads.add_argument('--readers', type=int, default=4, help='Read connections in the pool')
+    reads.set_defaults(func=benchmark_reads)
+
+    traffic = subcommands.add_parser('replay', help='Replay a /studyrecord trace against stub Discord on a scratch database')
+    traffic.add_argument('path', help='Recorded NDJSON trace')
+    traffic.add_argument('--speed', type=float, default=1, help='Times faster than recorded; 0 replays as fast as possible')
+    traffic.add_argument('--readers', type=int, default=4, help='Read connections in the pool')
+    traffic.set_defaults(func=replay_traffic)
+
+    export = subcommands.add_parser('export', help='Stream tables to NDJSON or CSV files')
+    export.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson', help='File format')
+    export.add_argument('--out', default='exports', help='Directory to write <table>.<format> files to')
+    export.add_argument('--tables', nargs='+', help='Tables to export (default: all)')
+    export.add_argument('--chunk-size', type=int, default=5000, help='Rows read per query')
+    export.set_defaults(func=export_data)
+
+    importer = subcommands.add_parser('import', help='Import NDJSON or CSV files named after their tables')
+    importer.add_argument('paths', nargs='+', help='Files, or directories of files, such as an export directory')
+    importer.add_argument('--replace', action='store_true', help='Overwrite rows whose key already exists instead of skipping them')
+    importer.add_argument('--batch-size', type=int, default=1000, help='Rows per transaction')
+    importer.set_defaults(func=import_data)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import asyncio
+import cProfile
+import os
+import pstats
+import signal
+import time
+import tracemalloc
+
+PROFILE_DIR = "profiles"
+# Discord messages are capped at 2000 characters
+MAX_SUMMARY_LENGTH = 1800
+
+
+class Profiler:
+    """On-demand CPU profiles and allocation diffs of the running bot.
+
+    Nothing is hooked into the interpreter until a capture starts, so leaving it
+    enabled in production costs nothing between captures.
+    """
+
+    def __init__(self, output_dir=PROFILE_DIR, top=15, frames=10):
+        self.output_dir = output_dir
+        self.top = top
+        self.frames = frames  # Stack depth tracemalloc records per allocation
+        self._capturing = False
+        self._signals = []
+        self._signal_captures = set()  # The loop only holds tasks weakly, so running captures are kept here
+
+    @property
+    def busy(self):
+        return self._capturing
+
+    def _output_path(self, kind, extension):
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.output_dir, f"{kind}-{timestamp}.{extension}")
+
+    def _start(self):
+        if self._capturing:
+            raise RuntimeError("A profiling capture is already running")
+        self._capturing = True
+
+    async def capture_cpu(self, seconds):
+        """Profile everything the event loop runs for `seconds`.
+
+        Returns (path, summary) where path is a pstats file for snakeviz/pstats and
+        summary lists the functions with the most time spent in them.
+        """
+        self._start()
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+        finally:
+            self._capturing = False
+
+        path = self._output_path("cpu", "prof")
+        profiler.dump_stats(path)
+
+        stats = pstats.Stats(profiler).stats  # {(file, line, function): (primitive calls, calls, own time, cumulative time, callers)}
+        hottest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:self.top]
+        lines = [f"{'own s':>8} {'cum s':>8} {'calls':>8}  function"]
+        for (filename, line, function), (_, calls, own_time, cumulative_time, _) in hottest:
+            location = f"{os.path.basename(filename)}:{line}({function})"
+            lines.append(f"{own_time:8.3f} {cumulative_time:8.3f} {calls:8d}  {location}")
+        return path, self._trim("\n".join(lines))
+
+    async def capture_memory(self, seconds):
+        """Diff allocations made over `seconds`.
+
+        Returns (path, summary) where path is a text report of the largest differences
+        by source line and summary holds the top entries.
+        """
+        self._start()
+        try:
+            was_tracing = tracemalloc.is_tracing()
+            if not was_tracing:
+                tracemalloc.start(self.frames)
+            try:
+                before = tracemalloc.take_snapshot()
+                await asyncio.sleep(seconds)
+                after = tracemalloc.take_snapshot()
+            finally:
+                if not was_tracing:
+                    tracemalloc.stop()
+        finally:
+            self._capturing = False
+
+        # Don't report tracemalloc's own bookkeeping
+        ignore = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        )
+        differences = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+
+        path = self._output_path("memory", "txt")
+        with open(path, "w") as report:
+            for difference in differences[:200]:
+                report.write(f"{difference}\n")
+
+        lines = [f"{'size':>10} {'change':>10} {'blocks':>8}  line"]
+        for difference in differences[:self.top]:
+            frame = difference.traceback[0]
+            location = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+            lines.append(f"{difference.size / 1024:9.1f}K {difference.size_diff / 1024:+9.1f}K {difference.count:8d}  {location}")
+        return path, self._trim("\n".join(lines))
+
+    @staticmethod
+    def _trim(summary):
+        if len(summary) <= MAX_SUMMARY_LENGTH:
+            return summary
+        return summary[:MAX_SUMMARY_LENGTH].rsplit("\n", 1)[0] + "\n..."
+
+    def install_signal_handlers(self, loop, seconds=30):
+        """Start a CPU capture on SIGUSR1 and an allocation capture on SIGUSR2.
+
+        Summaries are printed to the console. Does nothing on platforms without these signals.
+        """
+        if not hasattr(signal, "SIGUSR1"):
+            return
+        for signum, kind in ((signal.SIGUSR1, "cpu"), (signal.SIGUSR2, "memory")):
+            try:
+                loop.add_signal_handler(signum, self._start_signal_capture, loop, kind, seconds)
+            except (NotImplementedError, RuntimeError):
+                continue
+            self._signals.append((loop, signum))
+
+    def _start_signal_capture(self, loop, kind, seconds):
+        task = loop.create_task(self._signal_capture(kind, seconds))
+        self._signal_captures.add(task)
+        task.add_done_callback(self._signal_captures.discard)
+
+    def remove_signal_handlers(self):
+        for loop, signum in self._signals:
+            loop.remove_signal_handler(signum)
+        self._signals = []
+
+    async def _signal_capture(self, kind, seconds):
+        capture = self.capture_cpu if kind == "cpu" else self.capture_memory
+        print(f"Starting {seconds}s {kind} profile capture from signal")
+        try:
+            path, summary = await capture(seconds)
+        except RuntimeError as e:
+            print(f"Skipping {kind} profile capture: {e}")
+            return
+        print(f"Wrote {kind} profile to {path}\n{summary}")
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import secrets
+import time
+
+from clock import SystemClock
+
+RECORDING_DIR = "recordings"
+
+
+class TrafficRecorder:
+    """Appends anonymised interaction and event traces to an NDJSON file for later replay.
+
+    Each line is {"t": seconds since recording started, "kind": "interaction" or "event",
+    "name": handler or event name, "guild": guild id, "user": user hash}. User ids are
+    hashed with a random salt that is never written out, so a recording can't be matched
+    back to accounts, while each user stays the same person throughout it. Lines are
+    buffered and written `flush_every` at a time so recording adds no disk write per command.
+    """
+
+    def __init__(self, path, clock=None, flush_every=100):
+        self.path = path
+        self.clock = clock or SystemClock()
+        self.flush_every = flush_every
+        self._salt = secrets.token_bytes(16)
+        self._started = self.clock.monotonic()
+        self._buffer = []
+        self._file = open(path, 'w', encoding='utf-8')
+        self.recorded = 0
+
+    @classmethod
+    def start(cls, directory=RECORDING_DIR, clock=None):
+        """Start recording to a new timestamped file in `directory`"""
+        os.makedirs(directory, exist_ok=True)
+        return cls(os.path.join(directory, f"traffic-{time.strftime('%Y%m%d-%H%M%S')}.ndjson"), clock)
+
+    def hash_user(self, user_id):
+        return hashlib.sha256(self._salt + str(user_id).encode()).hexdigest()[:16]
+
+    def record(self, kind, name, guild_id=None, user_id=None):
+        if self._file is None:
+            return
+        record = {'t': round(self.clock.monotonic() - self._started, 3), 'kind': kind, 'name': name}
+        if guild_id is not None:
+            record['guild'] = guild_id
+        if user_id is not None:
+            record['user'] = self.hash_user(user_id)
+        self._buffer.append(json.dumps(record, separators=(',', ':')))
+        self.recorded += 1
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._buffer and self._file is not None:
+            self._file.write('\n'.join(self._buffer) + '\n')
+            self._file.flush()
+            self._buffer.clear()
+
+    @property
+    def recording(self):
+        return self._file is not None
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_trace(path):
+    """Yield the records of a recording in order"""
+    with open(path, encoding='utf-8') as trace:
+        for line in trace:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,310 @@
+"""
+Accelerated-time simulation of study sessions.
+
+Runs the real Study cog against stub Discord objects and a VirtualClock, driving the
+XP and pomodoro ticks directly so hours of sessions take seconds. Used to measure tick
+cost and check XP accrual and pomodoro transitions under simulated load, and how fast
+stats commands answer while XP is being written, and to replay recorded traffic.
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from clock import VirtualClock
+from dbmanager import READ_CONNECTIONS
+from recorder import read_trace
+from discord_stubs import StubBot, StubGuild, StubInteraction
+from cogs.study import Study, XP_TICK_SECONDS, POMODORO_TICK_SECONDS
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def simulate(hours=24, guilds=10, users_per_guild=20, work_minutes=25, break_minutes=5, db_name=":memory:"):
+    """Simulate `hours` of every guild studying with a pomodoro timer running.
+
+    Returns a report with tick timings and the correctness checks that were run.
+    """
+    clock = VirtualClock()
+    bot = StubBot()
+    study = Study(bot, db_name=db_name, clock=clock, start_tasks=False)
+    study.throttle.enabled = False  # Every guild joins at once, far faster than real users could click
+
+    # Everyone joins at the start, then one guild member starts a pomodoro timer
+    for _ in range(guilds):
+        guild = bot.add_guild(StubGuild())
+        for user_id in range(1, users_per_guild + 1):
+            await study.join_session(StubInteraction(guild, guild.add_member(user_id)), guild.id)
+        starter = guild.get_member(1)
+        await study.pomodoro.callback(study, StubInteraction(guild, starter), work_minutes, break_minutes, None)
+
+    xp_tick_times = []
+    pomodoro_tick_times = []
+    total_seconds = int(hours * 3600)
+    for elapsed in range(POMODORO_TICK_SECONDS, total_seconds + 1, POMODORO_TICK_SECONDS):
+        clock.advance(POMODORO_TICK_SECONDS)
+
+        started = time.perf_counter()
+        await study.check_pomodoro_timers()
+        pomodoro_tick_times.append(time.perf_counter() - started)
+
+        if elapsed % XP_TICK_SECONDS == 0:
+            started = time.perf_counter()
+            await study.award_xp_tick()
+            xp_tick_times.append(time.perf_counter() - started)
+
+    # Every participant should have exactly one ledger entry per simulated minute
+    expected_awards = total_seconds // XP_TICK_SECONDS
+    min_awards, max_awards = study.db_manager.connection.execute(
+        'SELECT MIN(n), MAX(n) FROM (SELECT COUNT(*) AS n FROM xp_events GROUP BY userid, serverid)'
+    ).fetchone()
+
+    # Each completed work phase increments the cycle count once
+    total_minutes = total_seconds // 60
+    completed_work_phases = 0
+    if total_minutes >= work_minutes:
+        completed_work_phases = (total_minutes - work_minutes) // (work_minutes + break_minutes) + 1
+    expected_cycles = 1 + completed_work_phases
+    cycles = {session['pomodoro']['cycle_count'] for session in study.active_sessions.values()}
+
+    shutdown = await study.shutdown()
+    study.db_manager.close()
+    return {
+        'simulated_hours': hours,
+        'guilds': guilds,
+        'participants': guilds * users_per_guild,
+        'xp_ticks': len(xp_tick_times),
+        'xp_tick_mean_ms': 1000 * sum(xp_tick_times) / max(1, len(xp_tick_times)),
+        'xp_tick_p99_ms': 1000 * percentile(xp_tick_times, 0.99),
+        'pomodoro_tick_mean_ms': 1000 * sum(pomodoro_tick_times) / max(1, len(pomodoro_tick_times)),
+        'pomodoro_tick_p99_ms': 1000 * percentile(pomodoro_tick_times, 0.99),
+        'expected_awards_per_user': expected_awards,
+        'awards_per_user': (min_awards, max_awards),
+        'expected_cycles': expected_cycles,
+        'cycles': sorted(cycles),
+        'shutdown_seconds': shutdown['seconds'],
+        'correct': min_awards == max_awards == expected_awards and cycles == {expected_cycles},
+    }
+
+
+def run_simulation(**kwargs):
+    return asyncio.run(simulate(**kwargs))
+
+
+async def _measure_reads(db_name, read_connections, seconds, guilds, users_per_guild, read_rate):
+    bot = StubBot()
+    study = Study(bot, db_name=db_name, clock=VirtualClock(), start_tasks=False, read_connections=read_connections)
+    study.throttle.enabled = False
+    for _ in range(guilds):
+        guild = bot.add_guild(StubGuild())
+        await asyncio.gather(*(study.join_session(StubInteraction(guild, guild.add_member(user_id)), guild.id)
+                               for user_id in range(1, users_per_guild + 1)))
+    for _ in range(3):
+        await study.award_xp_tick()
+
+    running = True
+    ticks = 0
+    latencies = []
+
+    async def write_load():
+        # XP ticks back to back, far more often than the real once a minute
+        nonlocal ticks
+        while running:
+            await study.award_xp_tick()
+            ticks += 1
+            await asyncio.sleep(0)
+
+    async def one_read(i, due):
+        guild = bot.guilds[i % guilds]
+        interaction = StubInteraction(guild, guild.get_member(i % users_per_guild + 1))
+        if i % 2:
+            await study.study_stats.callback(study, interaction, None, False)
+        else:
+            await study.study_leaderboard.callback(study, interaction, None, False)
+        latencies.append(time.perf_counter() - due)
+
+    async def read_load():
+        # Reads arrive on a fixed schedule. When the loop was blocked, every read that fell due
+        # meanwhile starts late, and its latency counts from when it was due
+        reads = set()
+        due = time.perf_counter()
+        i = 0
+        while running:
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            while due <= time.perf_counter():
+                task = asyncio.create_task(one_read(i, due))
+                reads.add(task)
+                task.add_done_callback(reads.discard)
+                due += 1 / read_rate
+                i += 1
+        await asyncio.gather(*reads)
+
+    writer = asyncio.create_task(write_load())
+    reader = asyncio.create_task(read_load())
+    await asyncio.sleep(seconds)
+    running = False
+    await asyncio.gather(writer, reader)
+
+    await study.shutdown(timeout=1)
+    study.db_manager.close()
+    return {
+        'reads': len(latencies),
+        'read_p50_ms': 1000 * percentile(latencies, 0.50),
+        'read_p95_ms': 1000 * percentile(latencies, 0.95),
+        'read_p99_ms': 1000 * percentile(latencies, 0.99),
+        'read_max_ms': 1000 * percentile(latencies, 1.0),
+        'xp_ticks': ticks,
+        'xp_rows_per_second': ticks * guilds * users_per_guild / seconds,
+    }
+
+
+async def benchmark_reads(seconds=5.0, guilds=20, users_per_guild=200, read_rate=100, read_connections=READ_CONNECTIONS):
+    """Measure /studystats and /studyleaderboard latency while XP ticks write back to back.
+
+    Runs twice on a fresh database file: 'shared' does every query on the event loop's one
+    connection, as before the read pool existed, and 'split' writes on the writer thread
+    and reads on pooled WAL snapshots. Returns {mode: report}.
+    """
+    reports = {}
+    for mode, readers in (('shared', 0), ('split', read_connections)):
+        directory = tempfile.mkdtemp()
+        try:
+            # Level ups flood the announcement queue; the cog's console output isn't part of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                reports[mode] = await _measure_reads(os.path.join(directory, 'benchmark.db'), readers,
+                                                     seconds, guilds, users_per_guild, read_rate)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return reports
+
+
+def run_read_benchmark(**kwargs):
+    return asyncio.run(benchmark_reads(**kwargs))
+
+
+# Recorded interactions that can be replayed without their arguments, which aren't recorded.
+# Owner commands and commands whose arguments change settings are counted as skipped
+REPLAYED_COMMANDS = {
+    'join_session': lambda study, interaction: study.join_session(interaction, interaction.guild_id),
+    'leave_session': lambda study, interaction: study.leave_session(interaction, interaction.guild_id),
+    'stop_pomodoro': lambda study, interaction: study.stop_pomodoro(interaction, interaction.guild_id),
+    'study': lambda study, interaction: study.study.callback(study, interaction),
+    'pomodoro': lambda study, interaction: study.pomodoro.callback(study, interaction, None, None, None),
+    'pomoinfo': lambda study, interaction: study.pomodoro_info.callback(study, interaction),
+    'studystats': lambda study, interaction: study.study_stats.callback(study, interaction, None, False),
+    'studyleaderboard': lambda study, interaction: study.study_leaderboard.callback(study, interaction, None, False),
+    'help': lambda study, interaction: study.help_command.callback(study, interaction),
+}
+REPLAYED_EVENTS = {
+    'xp_tick': lambda study: study.award_xp_tick(),
+    'pomodoro_tick': lambda study: study.check_pomodoro_timers(),
+}
+
+
+async def _replay(path, speed, db_name, read_connections):
+    clock = VirtualClock()
+    bot = StubBot()
+    study = Study(bot, db_name=db_name, clock=clock, start_tasks=False, read_connections=read_connections)
+    guilds = {}  # recorded guild id -> StubGuild
+    user_ids = {}  # user hash -> stand-in user id, the same in every guild
+    latencies = {}  # command -> [seconds from when it was due until it finished]
+    counts = {'records': 0, 'interactions': 0, 'events': 0, 'skipped': 0}
+    running = set()
+
+    async def timed(name, handler, due):
+        await handler
+        latencies.setdefault(name, []).append(time.perf_counter() - due)
+
+    started = time.perf_counter()
+    trace_seconds = 0.0
+    for record in read_trace(path):
+        counts['records'] += 1
+        trace_seconds = record['t']
+        # Records start on the trace's schedule, however long earlier ones are taking to finish
+        due = started + trace_seconds / speed if speed else time.perf_counter()
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        # The cog sees recorded time, so sessions, XP and throttling behave as they did live
+        clock.advance(max(0.0, trace_seconds - clock.monotonic()))
+
+        if record['kind'] == 'event':
+            handler = REPLAYED_EVENTS.get(record['name'])
+            if handler is None:
+                counts['skipped'] += 1
+                continue
+            counts['events'] += 1
+            task = asyncio.create_task(handler(study))
+        else:
+            handler = REPLAYED_COMMANDS.get(record['name'])
+            if handler is None or record.get('guild') is None or record.get('user') is None:
+                counts['skipped'] += 1
+                continue
+            counts['interactions'] += 1
+            guild = guilds.get(record['guild'])
+            if guild is None:
+                guild = guilds[record['guild']] = bot.add_guild(StubGuild())
+            user_id = user_ids.setdefault(record['user'], len(user_ids) + 1)
+            member = guild.get_member(user_id) or guild.add_member(user_id)
+            task = asyncio.create_task(timed(record['name'], handler(study, StubInteraction(guild, member)), due))
+        running.add(task)
+        task.add_done_callback(running.discard)
+    await asyncio.gather(*running)
+    seconds = time.perf_counter() - started
+    rows_written = study.db_manager.connection.total_changes
+
+    await study.shutdown(timeout=1)
+    study.db_manager.close()
+    every = [latency for samples in latencies.values() for latency in samples]
+    throttle = study.throttle.summary()
+    return {
+        **counts,
+        'speed': speed,
+        'trace_seconds': trace_seconds,
+        'seconds': seconds,
+        'interactions_per_second': counts['interactions'] / seconds if seconds else 0.0,
+        'p50_ms': 1000 * percentile(every, 0.50),
+        'p95_ms': 1000 * percentile(every, 0.95),
+        'p99_ms': 1000 * percentile(every, 0.99),
+        'max_ms': 1000 * percentile(every, 1.0),
+        'rows_written': rows_written,
+        'rows_written_per_second': rows_written / seconds if seconds else 0.0,
+        'throttled': sum(user + guild for _command, _allowed, user, guild, _shed in throttle),
+        'shed': sum(shed for *_counts, shed in throttle),
+        'commands': {
+            name: {'count': len(samples), 'p50_ms': 1000 * percentile(samples, 0.50), 'p99_ms': 1000 * percentile(samples, 0.99)}
+            for name, samples in sorted(latencies.items())
+        },
+    }
+
+
+async def replay_traffic(path, speed=1.0, db_name=None, read_connections=READ_CONNECTIONS):
+    """Replay a /studyrecord trace against the real cog and stub Discord objects.
+
+    Every recorded command and tick starts at its recorded time divided by `speed`
+    (0 starts each as soon as the one before it has been dispatched), on a fresh database
+    file unless `db_name` is given. Returns the throughput, latency percentiles measured
+    from when each command was due, per-command latencies and rows written.
+    """
+    directory = None
+    if db_name is None:
+        directory = tempfile.mkdtemp()
+        db_name = os.path.join(directory, 'replay.db')
+    try:
+        # Level ups and announcements print to the console; they aren't part of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            return await _replay(path, speed, db_name, read_connections)
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_replay(path, **kwargs):
+    return asyncio.run(replay_traffic(path, **kwargs))
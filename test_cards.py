@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test script to verify image cards render off the event loop with caching and a bounded queue
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+import pytest
+
+from cards import CARDS_AVAILABLE, CardQueueFull, CardRenderer, sample_card
+
+pytestmark = pytest.mark.skipif(not CARDS_AVAILABLE, reason="Pillow is not installed")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_cards_render_once_and_are_served_from_cache():
+    async def run():
+        renderer = CardRenderer(workers=1)
+        try:
+            # Identical requests arriving together share a single render
+            first = await asyncio.gather(*(renderer.render('stats', sample_card('stats', 1)) for _ in range(5)))
+            again = await renderer.render('stats', sample_card('stats', 1))
+            board = await renderer.render('leaderboard', sample_card('leaderboard', 1))
+        finally:
+            renderer.close()
+        return renderer, first, again, board
+
+    renderer, first, again, board = asyncio.run(run())
+    assert all(png.startswith(PNG_SIGNATURE) for png in first + [again, board])
+    assert len(set(first)) == 1 and again == first[0]
+    assert renderer.rendered == 2
+    assert renderer.hits == 5
+
+
+def test_requests_beyond_the_queue_bound_are_rejected():
+    async def run():
+        renderer = CardRenderer(workers=1, max_pending=2)
+        try:
+            results = await asyncio.gather(
+                *(renderer.render('leaderboard', sample_card('leaderboard', seed)) for seed in range(6)),
+                return_exceptions=True
+            )
+        finally:
+            renderer.close()
+        return renderer, results
+
+    renderer, results = asyncio.run(run())
+    rejected = [result for result in results if isinstance(result, CardQueueFull)]
+    assert len(rejected) == 4
+    assert renderer.rendered == 2
+    assert renderer.rejected == 4
+
+
+def test_stuck_render_times_out_and_frees_its_slot():
+    async def run():
+        renderer = CardRenderer(workers=1, timeout=0.001)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await renderer.render('stats', sample_card('stats', 1))
+            in_flight = len(renderer._in_flight)
+            # The pool that held the stuck render is replaced, and later cards still render
+            renderer.timeout = 30
+            png = await renderer.render('stats', sample_card('stats', 2))
+        finally:
+            renderer.close()
+        return in_flight, png
+
+    in_flight, png = asyncio.run(run())
+    assert in_flight == 0
+    assert png.startswith(PNG_SIGNATURE)
+
+
+def test_workers_spawned_from_a_script_only_rerun_its_module_level_code():
+    directory = tempfile.mkdtemp()
+    marker = os.path.join(directory, "marker.txt")
+    script = os.path.join(directory, "launcher.py")
+    with open(script, "w") as launcher:
+        launcher.write(textwrap.dedent(f"""
+            import asyncio
+            import sys
+            sys.path.insert(0, {REPO!r})
+            from cards import CardRenderer, sample_card
+
+            # Module level: spawned workers import the launching script and run this too
+            with open({marker!r}, "a") as marker:
+                marker.write(__name__ + "\\n")
+
+            async def render():
+                renderer = CardRenderer(workers=1)
+                try:
+                    return await renderer.render('stats', sample_card('stats', 1))
+                finally:
+                    renderer.close()
+
+            if __name__ == "__main__":
+                with open({marker!r}, "a") as marker:
+                    marker.write("started\\n")
+                print(len(asyncio.run(render())))
+        """))
+    result = subprocess.run([sys.executable, script], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    with open(marker) as lines:
+        assert sorted(lines.read().split()) == ["__main__", "__mp_main__", "started"]
+
+
+def test_main_does_not_start_the_bot_when_imported_by_a_worker():
+    # A worker imports main.py as __mp_main__; it must not build a client and log in
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, "key.py"), "w") as key:
+        key.write('key = "not-a-real-token"\n')
+    code = (f"import runpy, sys; sys.path[:0] = [{directory!r}, {REPO!r}]; "
+            f"namespace = runpy.run_path({os.path.join(REPO, 'main.py')!r}, run_name='__mp_main__'); "
+            "print('bot' in namespace)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "False"
+
+
+if __name__ == "__main__":
+    test_cards_render_once_and_are_served_from_cache()
+    test_requests_beyond_the_queue_bound_are_rejected()
+    test_stuck_render_times_out_and_frees_its_slot()
+    test_workers_spawned_from_a_script_only_rerun_its_module_level_code()
+    test_main_does_not_start_the_bot_when_imported_by_a_worker()
+    print("✅ All image card tests completed successfully!")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script to verify bursts of message edits are coalesced
+"""
+
+import asyncio
+
+from coalescer import EditCoalescer
+
+
+class FakeMessage:
+    def __init__(self, fail=False):
+        self.id = 1
+        self.fail = fail
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        if self.fail:
+            raise RuntimeError("Unknown Message")
+        self.edits.append(kwargs)
+
+
+def test_burst_becomes_one_edit_with_latest_state():
+    async def run():
+        coalescer = EditCoalescer(window=0.05)
+        message = FakeMessage()
+        state = {'count': 0}
+        for _ in range(50):
+            state['count'] += 1
+            coalescer.request('guild', message, lambda: {'content': f"{state['count']} participants"})
+        await asyncio.sleep(0.1)
+
+        # A later change starts a new window
+        state['count'] += 1
+        coalescer.request('guild', message, lambda: {'content': f"{state['count']} participants"})
+        await coalescer.flush()
+        return coalescer, message
+
+    coalescer, message = asyncio.run(run())
+    assert message.edits == [{'content': "50 participants"}, {'content': "51 participants"}]
+    assert (coalescer.requested, coalescer.edits) == (51, 2)
+
+
+def test_failed_edits_are_reported():
+    async def run():
+        failures = []
+        coalescer = EditCoalescer(window=0.01, on_error=lambda key, message, error: failures.append(key))
+        coalescer.request('gone', FakeMessage(fail=True), lambda: {'content': "hi"})
+        coalescer.request('cancelled', FakeMessage(), lambda: {'content': "hi"})
+        coalescer.cancel('cancelled')
+        await asyncio.sleep(0.05)
+        return coalescer, failures
+
+    coalescer, failures = asyncio.run(run())
+    assert failures == ['gone']
+    assert (coalescer.edits, coalescer.failed) == (0, 1)
+
+
+if __name__ == "__main__":
+    test_burst_becomes_one_edit_with_latest_state()
+    test_failed_edits_are_reported()
+    print("✅ All edit coalescer tests completed successfully!")
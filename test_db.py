@@ -3,8 +3,13 @@
 Simple test script to verify the database manager works correctly
 """
 
+from clock import VirtualClock
 from dbmanager import DatabaseManager
+from guild_settings import GuildSettingsCache
+import asyncio
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 def test_database():
     # Use a test database
@@ -90,5 +95,186 @@ def test_database():
     
     print("\n✅ All tests completed successfully!")
 
+def test_xp_ledger():
+    test_db = "test_ledger.db"
+    if os.path.exists(test_db):
+        os.remove(test_db)
+
+    db = DatabaseManager(test_db)
+
+    # Batched awards write one ledger row per user and update the projection
+    awards = db.award_xp_batch(67890, [1, 2, 3], session_id=7)
+    assert [award[0] for award in awards] == [1, 2, 3]
+    event_count, total_awarded = db.connection.execute('SELECT COUNT(*), SUM(amount) FROM xp_events WHERE session_id = 7').fetchone()
+    assert event_count == 3
+    assert total_awarded == sum(award[3] for award in awards)
+
+    for _ in range(20):
+        db.award_xp_batch(67890, [1, 2, 3])
+    expected = {user_id: db.get_user(user_id, 67890)[5:7] for user_id in (1, 2, 3)}
+
+    # Corrupt the projection, then rebuild it from the ledger from the baseline
+    db.connection.execute('UPDATE userstats SET user_xp = 999, user_level = 42')
+    db.connection.commit()
+    applied, users = db.replay_xp_ledger(from_latest_checkpoint=False, chunk_size=7)
+    assert applied == 63
+    assert users == 3
+    assert {user_id: db.get_user(user_id, 67890)[5:7] for user_id in (1, 2, 3)} == expected
+
+    # Replaying from the checkpoint written above only needs events after it
+    db.increment_xp(1, 67890)
+    expected[1] = db.get_user(1, 67890)[5:7]
+    applied, _ = db.replay_xp_ledger()
+    assert applied == 1
+    assert db.get_user(1, 67890)[5:7] == expected[1]
+
+    db.close()
+    os.remove(test_db)
+
+def test_guild_settings_cache():
+    db = DatabaseManager(":memory:")
+    cache = GuildSettingsCache(db)
+
+    # Unconfigured servers get defaults, and repeated reads stay in memory
+    assert cache.get(67890)['work_minutes'] == 25
+    assert cache.get(67890)['volume'] == 0.5
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Writes go to the database and invalidate the cached copy
+    cache.update(67890, work_minutes=50, volume=0.8)
+    assert db.get_guild_settings(67890)[1] == 50
+    settings = cache.get(67890)
+    assert (settings['work_minutes'], settings['break_minutes'], settings['volume']) == (50, 5, 0.8)
+    assert cache.misses == 2
+
+    # Preloading warms many servers with one query
+    db.update_guild_settings(11111, break_minutes=10)
+    assert cache.preload([11111, 22222, 67890]) == 3
+    misses = cache.misses
+    assert cache.get(11111)['break_minutes'] == 10
+    assert cache.get(22222)['work_minutes'] == 25
+    assert cache.misses == misses
+
+    db.close()
+
+def test_seasons():
+    db = DatabaseManager(":memory:")
+
+    db.award_xp_batch(67890, [1, 2])
+    db.update_total_study_time(1, 67890, 30)
+    season_one = db.get_leaderboard(67890)
+    assert db.get_current_season(67890) == 1
+
+    # A new season starts empty and keeps the old one intact
+    assert db.start_new_season(67890) == 2
+    assert db.get_leaderboard(67890) == []
+    assert db.get_user(1, 67890) is None
+    assert db.get_leaderboard(67890, season_id=1) == season_one
+
+    # Rows in the new season are created on first award or credit
+    db.award_xp_batch(67890, [2])
+    db.update_total_study_time(1, 67890, 5)
+    assert db.get_user(2, 67890)[7] == 2
+    assert db.get_user(1, 67890)[4] == 5
+    assert db.get_user(1, 67890, season_id=1)[4] == 30
+
+    # Other servers are unaffected
+    assert db.get_current_season(11111) == 1
+
+    db.close()
+
+def test_study_streaks():
+    clock = VirtualClock(start=86400 * 20000)  # Midnight UTC
+    db = DatabaseManager(":memory:", clock=clock)
+    db.set_daily_goal(1, 67890, 30)
+
+    # Three days in a row, meeting the goal on the first two
+    for minutes in (45, 30, 10):
+        for _ in range(minutes):
+            db.award_xp_batch(67890, [1])
+            db.record_study_minutes(67890, [(1, 1)])
+            clock.advance(60)
+        streak = db.get_study_streak(1, 67890)
+        clock.advance(86400 - 60 * minutes)
+    assert streak['current_streak'] == 3
+    assert streak['today_minutes'] == 10
+    assert not streak['goal_met_today']
+    assert streak['goals_met'] == 2
+
+    # A missed day breaks the streak but keeps the best one
+    clock.advance(86400)
+    streak = db.get_study_streak(1, 67890)
+    assert (streak['current_streak'], streak['best_streak'], streak['today_minutes']) == (0, 3, 0)
+    focus_score = streak['focus_score']
+    assert 0 < focus_score < 100
+
+    # Rebuilding from the ledger gives the same state and keeps the goal
+    db.connection.execute('UPDATE study_streaks SET current_streak = 0, best_streak = 0, last_day = NULL, day_minutes = 0, goals_met = 0, focus = 0')
+    db.connection.commit()
+    assert db.backfill_study_streaks(chunk_size=7) == (85, 1)
+    assert db.get_study_streak(1, 67890) == streak
+
+    # Users who never studied get an empty state with the default goal
+    assert db.get_study_streak(2, 67890)['current_streak'] == 0
+    assert db.get_study_streak(2, 67890)['daily_goal'] == 60
+
+    db.close()
+
+def test_reads_use_snapshots_alongside_writes():
+    test_db = "test_snapshots.db"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(test_db + suffix):
+            os.remove(test_db + suffix)
+
+    db = DatabaseManager(test_db, readers=2)
+    assert db.concurrent_reads
+    db.award_xp_batch(67890, [1])
+    before = db.get_user(1, 67890)
+
+    # An open write transaction neither blocks readers nor shows them its changes
+    db.connection.execute('UPDATE userstats SET user_xp = 999 WHERE userid = 1')
+    assert db.get_user(1, 67890) == before
+    db.connection.commit()
+    assert db.get_user(1, 67890)[5] == 999
+
+    # A snapshot keeps seeing the state it started with until it ends
+    with db.snapshot() as cursor:
+        cursor.execute('SELECT user_xp FROM userstats WHERE userid = 1')
+        assert cursor.fetchone()[0] == 999
+        db.award_xp_batch(67890, [1])
+        cursor.execute('SELECT user_xp FROM userstats WHERE userid = 1')
+        assert cursor.fetchone()[0] == 999
+    assert db.get_user(1, 67890)[5] != 999
+
+    # Readers are shared between threads, never more than the pool size
+    with ThreadPoolExecutor(8) as pool:
+        stats = list(pool.map(lambda _: db.get_user_stats(1, 67890), range(50)))
+    assert all(user == stats[0][0] for user, _streak in stats)
+    assert len(db._readers) <= 2
+
+    # With every pooled reader busy, a read on an event loop opens its own connection instead of waiting
+    read_on_loop = {}
+
+    async def read_user():
+        read_on_loop['user'] = db.get_user(1, 67890)
+
+    with db.reading(), db.reading():
+        worker = threading.Thread(target=asyncio.run, args=(read_user(),), daemon=True)
+        worker.start()
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+    assert read_on_loop['user'] == db.get_user(1, 67890)
+    assert len(db._readers) == 2
+
+    db.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(test_db + suffix):
+            os.remove(test_db + suffix)
+
 if __name__ == "__main__":
     test_database()
+    test_xp_ledger()
+    test_guild_settings_cache()
+    test_seasons()
+    test_study_streaks()
+    test_reads_use_snapshots_alongside_writes()
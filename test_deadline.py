@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the interaction deadline guard defers slow handlers
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+from deadline import InteractionDeadlineGuard
+
+
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+        self.deferred = False
+        self.deferred_ephemeral = None
+        self.thinking = False
+        self.messages = []
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, ephemeral=False, thinking=False):
+        self.done = True
+        self.deferred = True
+        self.deferred_ephemeral = ephemeral
+        self.thinking = thinking
+
+    async def send_message(self, content=None, **kwargs):
+        self.done = True
+        self.messages.append(content)
+
+
+class FakeFollowup:
+    def __init__(self, response):
+        self.response = response
+        self.messages = []
+
+    async def send(self, content=None, ephemeral=False, **kwargs):
+        # Like Discord, the followup that replaces a "thinking" message takes the deferral's visibility
+        if self.response.thinking:
+            ephemeral = self.response.deferred_ephemeral
+            self.response.thinking = False
+        self.messages.append((content, ephemeral))
+
+
+class FakeInteraction:
+    def __init__(self):
+        self.created_at = datetime.now(timezone.utc)
+        self.response = FakeResponse()
+        self.followup = FakeFollowup(self.response)
+        self.original_edits = []
+
+    async def edit_original_response(self, content=None, **kwargs):
+        self.response.thinking = False
+        self.original_edits.append(content)
+
+
+def test_fast_handler_responds_directly():
+    async def run():
+        guard = InteractionDeadlineGuard(defer_after=0.2)
+        interaction = FakeInteraction()
+        async with guard.track(interaction, 'fast') as tracked:
+            await tracked.send("hello")
+        return guard, interaction
+
+    guard, interaction = asyncio.run(run())
+    assert interaction.response.messages == ["hello"]
+    assert not interaction.response.deferred
+    assert guard.deferrals == {}
+    assert guard.summary()[0][:4] == ('fast', 1, 0, 0)
+
+
+def test_slow_await_is_deferred_by_watchdog():
+    async def run():
+        guard = InteractionDeadlineGuard(defer_after=0.05)
+        interaction = FakeInteraction()
+        async with guard.track(interaction, 'slow') as tracked:
+            await tracked.checkpoint('voice')
+            await asyncio.sleep(0.1)
+            await tracked.send("done")
+        return guard, interaction
+
+    guard, interaction = asyncio.run(run())
+    assert interaction.response.deferred
+    assert interaction.followup.messages == [("done", False)]
+    assert guard.deferrals == {('slow', 'voice'): 1}
+
+
+def test_blocking_work_is_deferred_at_checkpoint():
+    async def run():
+        guard = InteractionDeadlineGuard(defer_after=0.05)
+        interaction = FakeInteraction()
+        async with guard.track(interaction, 'blocking') as tracked:
+            import time
+            time.sleep(0.1)  # Simulates a slow sqlite call that starves the watchdog
+            await tracked.checkpoint('get_user')
+            await tracked.send("stats")
+        return guard, interaction
+
+    guard, interaction = asyncio.run(run())
+    assert interaction.response.deferred
+    assert interaction.followup.messages == [("stats", False)]
+    assert guard.deferrals == {('blocking', 'get_user'): 1}
+
+
+def test_private_reply_after_public_deferral_stays_private():
+    async def run():
+        guard = InteractionDeadlineGuard(defer_after=0.05)
+        interactions = [FakeInteraction() for _ in range(3)]
+        async with guard.track(interactions[0], 'studystats') as tracked:
+            await asyncio.sleep(0.1)
+            await tracked.send("Slow down", ephemeral=True)
+        async with guard.track(interactions[1], 'studystats') as tracked:
+            await asyncio.sleep(0.1)
+            await tracked.send("stats")
+            await tracked.send("and more", ephemeral=True)
+        async with guard.track(interactions[2], 'join_session', ephemeral=True) as tracked:
+            await asyncio.sleep(0.1)
+            await tracked.send("joined", ephemeral=True)
+        return interactions
+
+    mismatched, matched, private = asyncio.run(run())
+    # The public "thinking" message becomes a note and the reply goes out privately after it
+    assert mismatched.original_edits == ["📨 Replied privately."]
+    assert mismatched.followup.messages == [("Slow down", True)]
+    assert matched.original_edits == []
+    assert matched.followup.messages == [("stats", False), ("and more", True)]
+    assert private.original_edits == []
+    assert private.followup.messages == [("joined", True)]
+
+
+if __name__ == "__main__":
+    test_fast_handler_responds_directly()
+    test_slow_await_is_deferred_by_watchdog()
+    test_blocking_work_is_deferred_at_checkpoint()
+    test_private_reply_after_public_deferral_stays_private()
+    print("✅ All deadline guard tests completed successfully!")
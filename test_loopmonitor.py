@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the loop lag monitor measures lag and blames blocks on the right work
+"""
+
+import asyncio
+import time
+
+from deadline import InteractionDeadlineGuard
+from discord_stubs import StubGuild, StubInteraction
+from loopmonitor import LoopLagMonitor
+
+
+def test_blocking_step_is_attributed_to_task_and_guild():
+    async def run():
+        monitor = LoopLagMonitor(interval=0.05, block_threshold=0.15)
+        monitor.start()
+        await asyncio.sleep(0.2)
+
+        async def tick():
+            with monitor.attribute('xp_reward_task', 42):
+                time.sleep(0.4)  # A blocking sqlite call, say
+
+        await asyncio.create_task(tick(), name='xp-tick')
+        await asyncio.sleep(0.2)
+        monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(run())
+    assert monitor.samples > 3
+    assert monitor.max_lag >= 0.3
+    assert monitor.block_counts == {'xp_reward_task': 1}
+    activity, guild_id, task_name, seconds = monitor.blocks[-1]
+    assert (activity, guild_id, task_name) == ('xp_reward_task', 42, 'xp-tick')
+    assert seconds >= 0.3
+    assert sum(monitor.histogram) == monitor.samples
+    assert "xp_reward_task: 1x" in monitor.summary()
+
+
+def test_interaction_handlers_are_attributed_by_name():
+    async def run():
+        monitor = LoopLagMonitor(interval=0.05, block_threshold=0.15)
+        guard = InteractionDeadlineGuard(loop_monitor=monitor)
+        monitor.start()
+        await asyncio.sleep(0.1)
+
+        guild = StubGuild()
+        interaction = StubInteraction(guild, guild.add_member(1))
+        async with guard.track(interaction, 'studyleaderboard') as tracked:
+            time.sleep(0.4)
+            await tracked.send("done")
+        await asyncio.sleep(0.2)
+        monitor.stop()
+        return monitor, guild
+
+    monitor, guild = asyncio.run(run())
+    activity, guild_id, _task_name, _seconds = monitor.blocks[-1]
+    assert (activity, guild_id) == ('studyleaderboard', guild.id)
+
+
+if __name__ == "__main__":
+    test_blocking_step_is_attributed_to_task_and_guild()
+    test_interaction_handlers_are_attributed_by_name()
+    print("✅ All loop monitor tests completed successfully!")
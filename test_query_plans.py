@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression tests for every statement DatabaseManager issues.
+
+Seeds a database of realistic size, runs every DatabaseManager method while
+recording the SQL it sends, and checks each statement's EXPLAIN QUERY PLAN for
+full table scans and temp B-tree sorts. Also times each method.
+
+Set STUDY_PLAN_ROWS=1000000 for the 1M-row timing run, and STUDY_PLAN_TIMINGS=<file>
+to save the timings as JSON for comparing schema changes.
+"""
+
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from dbmanager import DatabaseManager
+
+ROWS = int(os.environ.get("STUDY_PLAN_ROWS", 50_000))
+USERS_PER_SERVER = 100
+SERVER_ID = 1  # The server the hot queries are run against
+
+# Statements that touch every row on purpose (bulk maintenance, not hot paths)
+FULL_SCAN_ALLOWED = (
+    "INSERT INTO xp_checkpoint_state",  # Checkpoints copy the whole projection
+    "UPDATE userstats SET user_xp = 0, user_level = 1",  # Replay rewrites the whole projection
+    "SELECT * FROM userstats ORDER BY",  # An export's first chunk walks the primary key from the start, one chunk only
+    "SELECT userid, serverid, daily_goal FROM study_streaks",  # The streak backfill keeps every user's goal
+)
+# Bulk maintenance is timed with a single run
+BULK_METHODS = ("create_xp_checkpoint", "replay_xp_ledger", "backfill_study_streaks")
+# Tables that only ever hold a handful of rows
+SMALL_TABLES = ("xp_checkpoints",)
+
+_seeded = {}
+
+
+def seed_database():
+    """Return a fresh copy of a database with ROWS users, XP events and sessions spread over many servers"""
+    if "path" in _seeded:
+        copy = os.path.join(tempfile.mkdtemp(), "plans.db")
+        shutil.copy(_seeded["path"], copy)
+        return copy
+
+    path = os.path.join(tempfile.mkdtemp(), "plans.db")
+    db = DatabaseManager(path)
+    servers = max(1, ROWS // USERS_PER_SERVER)
+    now = int(time.time())
+
+    db.connection.executemany(
+        "INSERT INTO userstats (userid, serverid, total_study_time, user_xp, user_level, season_id) VALUES (?, ?, ?, ?, ?, 1)",
+        ((i % USERS_PER_SERVER + 1, i // USERS_PER_SERVER + 1, random.randint(0, 5000), random.randint(0, 500), random.randint(1, 30))
+         for i in range(ROWS))
+    )
+    db.connection.executemany(
+        "INSERT INTO xp_events (userid, serverid, session_id, amount, created_at, season_id) VALUES (?, ?, ?, ?, ?, 1)",
+        ((random.randint(1, USERS_PER_SERVER), random.randint(1, servers), i // 100 + 1, random.randint(15, 25), now - ROWS + i)
+         for i in range(ROWS))
+    )
+    db.connection.executemany(
+        "INSERT INTO study_sessions (server_id, start_time, end_time) VALUES (?, ?, ?)",
+        ((random.randint(1, servers), now - 7200, now - 3600) for _ in range(ROWS // 10))
+    )
+    db.connection.executemany(
+        "INSERT INTO guild_settings (serverid, work_minutes) VALUES (?, 25)",
+        ((server_id,) for server_id in range(1, servers + 1))
+    )
+    db.connection.commit()
+    db.connection.execute("ANALYZE")
+    db.create_xp_checkpoint()
+    db.close()
+
+    _seeded["path"] = path
+    return seed_database()
+
+
+def exercise(db):
+    """Call every DatabaseManager query once; returns {method name: callable}"""
+    new_users = itertools.count(USERS_PER_SERVER + 1)
+    new_events = itertools.count(10 * ROWS)  # Clear of events the other calls append
+    return {
+        "get_current_season": lambda: db.get_current_season(SERVER_ID),
+        "add_user": lambda: db.add_user(next(new_users), SERVER_ID),
+        "get_user": lambda: db.get_user(7, SERVER_ID),
+        "get_user_stats": lambda: db.get_user_stats(7, SERVER_ID),
+        "get_last_session": lambda: db.get_last_session(7, SERVER_ID),
+        "increment_xp": lambda: db.increment_xp(7, SERVER_ID),
+        "award_xp_batch": lambda: db.award_xp_batch(SERVER_ID, range(1, 201), session_id=1),
+        "start_study_session": lambda: db.start_study_session(SERVER_ID),
+        "update_user_session": lambda: db.update_user_session(7, SERVER_ID, 1),
+        "end_study_session": lambda: db.end_study_session(1),
+        "get_session_duration": lambda: db.get_session_duration(1),
+        "update_total_study_time": lambda: db.update_total_study_time(7, SERVER_ID, 30),
+        "credit_study_time_batch": lambda: db.credit_study_time_batch([(user_id, SERVER_ID, 5) for user_id in range(1, 201)], [1]),
+        "get_leaderboard": lambda: db.get_leaderboard(SERVER_ID),
+        "get_leaderboard_past_season": lambda: db.get_leaderboard(SERVER_ID, season_id=1),
+        "get_guild_settings": lambda: db.get_guild_settings(SERVER_ID),
+        "get_guild_settings_bulk": lambda: db.get_guild_settings_bulk(range(1, 51)),
+        "update_guild_settings": lambda: db.update_guild_settings(SERVER_ID, volume=0.7),
+        "iter_xp_events": lambda: sum(1 for _ in db.iter_xp_events(max(0, ROWS - 5000), chunk_size=1000)),
+        "create_xp_checkpoint": lambda: db.create_xp_checkpoint(),
+        "replay_xp_ledger": lambda: db.replay_xp_ledger(),
+        "start_new_season": lambda: db.start_new_season(SERVER_ID + 1),
+        "iter_table": lambda: sum(1 for _ in itertools.islice(db.iter_table("userstats", chunk_size=1000), 5000)),
+        "import_rows": lambda: db.import_rows("userstats", ("userid", "serverid", "total_study_time"),
+                                              [(next(new_users), SERVER_ID, 60) for _ in range(100)]),
+        # Half the event IDs exist already, so the projection both takes back replaced awards and adds new ones
+        "import_rows_xp_events": lambda: db.import_rows("xp_events", ("event_id", "userid", "serverid", "season_id", "amount", "created_at"),
+                                                        [(event_id, event_id % USERS_PER_SERVER + 1, SERVER_ID, 1, random.randint(15, 25), int(time.time()))
+                                                         for event_id in itertools.chain(range(1, 51), itertools.islice(new_events, 50))],
+                                                        replace=True, update_projection=True),
+        "record_study_minutes": lambda: db.record_study_minutes(SERVER_ID, [(user_id, 1) for user_id in range(1, 201)]),
+        "get_study_streak": lambda: db.get_study_streak(7, SERVER_ID),
+        "set_daily_goal": lambda: db.set_daily_goal(7, SERVER_ID, 45),
+        "backfill_study_streaks": lambda: db.backfill_study_streaks(),
+    }
+
+
+def explain(db, statement):
+    return [row[3] for row in db.connection.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()]
+
+
+def plan_problems(statement, plan):
+    if statement.startswith(FULL_SCAN_ALLOWED):
+        return []
+    problems = []
+    for detail in plan:
+        if detail.startswith("SCAN "):
+            table = detail.split()[1]
+            # Multi-row VALUES lists show up as "SCAN n CONSTANT ROWS"
+            if table not in SMALL_TABLES and "COVERING INDEX" not in detail and "CONSTANT ROWS" not in detail:
+                problems.append(detail)
+        if "USE TEMP B-TREE" in detail:
+            problems.append(detail)
+    return problems
+
+
+def test_every_statement_uses_an_index():
+    # Without read connections every statement goes through the writer, where it can be traced
+    db = DatabaseManager(seed_database(), readers=0)
+    statements = {}
+    for name, call in exercise(db).items():
+        captured = []
+        db.connection.set_trace_callback(captured.append)
+        call()
+        db.connection.set_trace_callback(None)
+        for statement in captured:
+            if statement.split()[0].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+                statements.setdefault(statement, name)
+
+    failures = []
+    for statement, name in statements.items():
+        problems = plan_problems(statement, explain(db, statement))
+        if problems:
+            failures.append(f"{name}: {statement[:120]}\n    {'; '.join(problems)}")
+    db.close()
+    assert not failures, "Queries degraded to scans or temp sorts:\n" + "\n".join(failures)
+
+
+def test_record_query_timings():
+    db = DatabaseManager(seed_database())
+    timings = {}
+    for name, call in exercise(db).items():
+        runs = 1 if name in BULK_METHODS else 5
+        started = time.perf_counter()
+        for _ in range(runs):
+            call()
+        timings[name] = 1000 * (time.perf_counter() - started) / runs
+    db.close()
+
+    print(f"\nQuery timings on {ROWS} rows (ms per call):")
+    for name, milliseconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {name:32} {milliseconds:9.3f}")
+
+    output = os.environ.get("STUDY_PLAN_TIMINGS")
+    if output:
+        with open(output, "w") as timings_file:
+            json.dump({"rows": ROWS, "milliseconds": timings}, timings_file, indent=2)
+
+    # Point lookups stay fast whatever the table size
+    assert timings["get_user"] < 50
+    assert timings["get_leaderboard"] < 50
+
+
+if __name__ == "__main__":
+    test_every_statement_uses_an_index()
+    test_record_query_timings()
+    print("✅ All query plan tests completed successfully!")
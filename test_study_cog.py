@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the Study cog against stub Discord objects
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from clock import VirtualClock
+from discord_stubs import StubBot, StubGuild, StubInteraction
+from cogs.study import Study, StudySessionView
+
+
+def make_cog(guilds=1, db_name=":memory:"):
+    clock = VirtualClock()
+    bot = StubBot()
+    for _ in range(guilds):
+        bot.add_guild(StubGuild())
+    study = Study(bot, db_name=db_name, clock=clock, start_tasks=False)
+    return study, bot, clock
+
+
+def test_shutdown_credits_participants_and_drains_announcements():
+    async def run():
+        study, bot, clock = make_cog(guilds=2)
+        for guild in bot.guilds:
+            for user_id in (1, 2, 3):
+                await study.join_session(StubInteraction(guild, guild.add_member(user_id)), guild.id)
+        session_ids = [session['session_id'] for session in study.active_sessions.values()]
+
+        clock.advance(10 * 60)
+        guild = bot.guilds[0]
+        for _ in range(5):
+            study.queue_announcement(guild.text_channel, content="level up")
+
+        report = await study.shutdown(timeout=2)
+
+        # Joins are refused once shutdown has started
+        late = StubInteraction(guild, guild.add_member(4))
+        await study.join_session(late, guild.id)
+        return study, bot, report, session_ids, late
+
+    study, bot, report, session_ids, late = asyncio.run(run())
+    assert report['sessions_ended'] == 2
+    assert report['participants_credited'] == 6
+    assert report['announcements_sent'] == 5
+    assert report['announcements_dropped'] == 0
+    assert report['seconds'] < 2
+    assert len(bot.guilds[0].text_channel.sent) == 5
+    assert study.active_sessions == {}
+    assert "restarting" in late.sent[0].content
+
+    for guild in bot.guilds:
+        for user_id in (1, 2, 3):
+            assert study.db_manager.get_user(user_id, guild.id)[4] == 10
+            assert study.db_manager.get_study_streak(user_id, guild.id)['today_minutes'] == 10
+    for session_id in session_ids:
+        assert study.db_manager.get_session_duration(session_id) == 10
+    study.db_manager.close()
+
+
+def test_joins_and_leaves_racing_shutdown_are_saved_once():
+    db_name = os.path.join(tempfile.mkdtemp(), "study.db")
+
+    async def run():
+        study, bot, clock = make_cog(guilds=2, db_name=db_name)
+        study.throttle.enabled = False
+        studying, quiet = bot.guilds
+        leaver = StubInteraction(studying, studying.add_member(1))
+        await study.join_session(leaver, studying.id)
+        clock.advance(10 * 60)
+
+        # Hold up the writer so the leave and the first join are part way through their writes when shutdown starts
+        busy = asyncio.ensure_future(study.db_write(time.sleep, 0.2))
+        leave = asyncio.create_task(study.leave_session(StubInteraction(studying, studying.add_member(1)), studying.id))
+        first = StubInteraction(quiet, quiet.add_member(2))
+        second = StubInteraction(quiet, quiet.add_member(3))
+        joins = [asyncio.create_task(study.join_session(first, quiet.id)),
+                 asyncio.create_task(study.join_session(second, quiet.id))]
+        for _ in range(5):
+            await asyncio.sleep(0)
+        report = await study.shutdown(timeout=5)
+        await asyncio.gather(busy, leave, *joins)
+        return study, studying, quiet, report, first, second
+
+    study, studying, quiet, report, first, second = asyncio.run(run())
+    db = study.db_manager
+    assert db.get_user(1, studying.id)[4] == 10
+    assert db.get_study_streak(1, studying.id)['today_minutes'] == 10
+    # The join that had started its session is credited and ended; the one still waiting is turned away
+    assert report['sessions_ended'] == 1
+    assert "joined" in first.sent[0].content
+    assert "restarting" in second.sent[0].content
+    assert db.connection.execute("SELECT COUNT(*) FROM study_sessions WHERE end_time IS NULL").fetchone()[0] == 0
+    assert study.active_sessions == {}
+    db.close()
+
+
+def test_shutdown_stays_bounded_when_the_writer_is_busy():
+    db_name = os.path.join(tempfile.mkdtemp(), "study.db")
+
+    async def run():
+        study, bot, clock = make_cog(db_name=db_name)
+        guild = bot.guilds[0]
+        for user_id in (1, 2, 3):
+            await study.join_session(StubInteraction(guild, guild.add_member(user_id)), guild.id)
+        clock.advance(10 * 60)
+        # Something slow is already on the writer thread when shutdown starts
+        busy = asyncio.ensure_future(study.db_write(time.sleep, 0.5))
+        report = await study.shutdown(timeout=0.2)
+        await busy
+        return study, guild, report
+
+    study, guild, report = asyncio.run(run())
+    # Crediting waited for the writer; the checkpoint was skipped instead of adding to the overrun
+    assert report['timed_out']
+    assert not report['checkpointed']
+    assert report['seconds'] < 1
+    for user_id in (1, 2, 3):
+        assert study.db_manager.get_user(user_id, guild.id)[4] == 10
+    assert study.db_manager.connection.execute("SELECT COUNT(*) FROM xp_checkpoints").fetchone()[0] == 1
+    study.db_manager.close()
+
+
+def test_slow_xp_checkpoint_is_interrupted():
+    db_name = os.path.join(tempfile.mkdtemp(), "study.db")
+
+    async def run():
+        study, bot, clock = make_cog(db_name=db_name)
+        study.db_manager.connection.executemany("INSERT INTO userstats (userid, serverid, season_id) VALUES (?, 1, 1)",
+                                                ((user_id,) for user_id in range(400000)))
+        study.db_manager.connection.commit()
+        started = time.perf_counter()
+        made = await study.checkpoint_xp_within(0.01)
+        interrupted_after = time.perf_counter() - started
+        # The writer is still usable once the interrupted checkpoint has rolled back
+        made_later = await study.checkpoint_xp_within(60)
+        study.db_writer.shutdown()
+        return study, made, interrupted_after, made_later
+
+    study, made, interrupted_after, made_later = asyncio.run(run())
+    assert not made
+    assert interrupted_after < 0.1
+    assert made_later
+    checkpoints = study.db_manager.connection.execute("SELECT COUNT(*) FROM xp_checkpoints").fetchone()[0]
+    assert checkpoints == 2  # The baseline and the one that finished
+    study.db_manager.close()
+
+
+def test_streak_minutes_are_counted_once():
+    async def run():
+        study, bot, clock = make_cog()
+        guild = bot.guilds[0]
+        early, late = guild.add_member(1), guild.add_member(2)
+        await study.join_session(StubInteraction(guild, early), guild.id)
+        for minute in range(7):
+            if minute == 3:
+                await study.join_session(StubInteraction(guild, late), guild.id)
+            clock.advance(60)
+            await study.award_xp_tick()
+        # Leaving between ticks credits the minutes the ticks haven't reached, and no more
+        clock.advance(150)
+        await study.leave_session(StubInteraction(guild, late), guild.id)
+        await study.leave_session(StubInteraction(guild, early), guild.id)
+        return study, guild
+
+    study, guild = asyncio.run(run())
+    assert study.db_manager.get_study_streak(1, guild.id)['today_minutes'] == 9
+    assert study.db_manager.get_study_streak(2, guild.id)['today_minutes'] == 6
+    assert study.db_manager.get_study_streak(1, guild.id)['current_streak'] == 1
+    study.db_manager.close()
+
+
+def test_concurrent_joins_and_leaves_lose_no_updates():
+    guilds, users = 4, 500
+
+    async def run():
+        study, bot, clock = make_cog(guilds=guilds)
+        # Defer at every checkpoint so handlers yield in the middle of their DB work
+        study.deadline_guard.defer_after = 0
+        study.throttle.enabled = False
+        members = [(guild, guild.add_member(user_id)) for guild in bot.guilds for user_id in range(1, users + 1)]
+
+        joins = [study.join_session(StubInteraction(guild, member), guild.id) for guild, member in members]
+        ticks = [study.award_xp_tick() for _ in range(20)] + [study.check_pomodoro_timers() for _ in range(20)]
+        await asyncio.gather(*joins, *ticks)
+        joined = {server_id: set(session['participants']) for server_id, session in study.active_sessions.items()}
+
+        clock.advance(10 * 60)
+        # Everyone leaves twice at once, racing the ticks and each other
+        leaves = [study.leave_session(StubInteraction(guild, member), guild.id) for guild, member in members * 2]
+        ticks = [study.award_xp_tick() for _ in range(20)]
+        await asyncio.gather(*leaves, *ticks)
+        return study, bot, joined
+
+    study, bot, joined = asyncio.run(run())
+    assert joined == {guild.id: set(range(1, users + 1)) for guild in bot.guilds}
+    assert study.active_sessions == {}
+
+    db = study.db_manager
+    for guild in bot.guilds:
+        # One session per guild, even though hundreds of "first" joins raced to create it
+        session_count, end_time = db.connection.execute("SELECT COUNT(*), MIN(end_time) FROM study_sessions WHERE server_id = ?", (guild.id,)).fetchone()
+        assert session_count == 1
+        assert end_time is not None
+        for user_id in (1, users // 2, users):
+            assert db.get_user(user_id, guild.id)[4] == 10  # Credited once, not once per leave
+    db.close()
+
+
+def test_database_file_is_written_and_read_off_the_loop():
+    db_name = os.path.join(tempfile.mkdtemp(), "study.db")
+    users = 100
+
+    async def run():
+        study, bot, clock = make_cog(guilds=2, db_name=db_name)
+        study.throttle.enabled = False
+        members = [(guild, guild.add_member(user_id)) for guild in bot.guilds for user_id in range(1, users + 1)]
+        await asyncio.gather(*(study.join_session(StubInteraction(guild, member), guild.id) for guild, member in members))
+
+        # Stats and leaderboards race the XP ticks on pooled read connections
+        clock.advance(5 * 60)
+        reads = [StubInteraction(guild, member) for guild, member in members[::10]]
+        await asyncio.gather(
+            *(study.award_xp_tick() for _ in range(5)),
+            *(study.study_stats.callback(study, interaction, None, False) for interaction in reads),
+            *(study.study_leaderboard.callback(study, interaction, None, False) for interaction in reads),
+        )
+        await asyncio.gather(*(study.leave_session(StubInteraction(guild, member), guild.id) for guild, member in members))
+        return study, bot, reads
+
+    study, bot, reads = asyncio.run(run())
+    assert study.db_manager.concurrent_reads
+    assert study.queued_writes == 0
+    assert all(len(interaction.sent) == 2 for interaction in reads)
+    for interaction in reads:
+        titles = sorted(message.embed.title for message in interaction.sent)
+        assert titles[0].startswith("📊 Study Stats") and titles[1].startswith("📚 Study Leaderboard")
+
+    db = study.db_manager
+    for guild in bot.guilds:
+        for user_id in (1, users):
+            user = db.get_user(user_id, guild.id)
+            assert user[4] == 5
+            assert user[5] > 0 or user[6] > 1  # Five ticks of XP landed
+            assert db.get_study_streak(user_id, guild.id)['today_minutes'] == 5
+    study.db_writer.shutdown()
+    db.close()
+
+
+def test_settings_cache_is_fresh_after_a_racing_miss():
+    db_name = os.path.join(tempfile.mkdtemp(), "study.db")
+    read_old_row = threading.Event()
+    wrote = threading.Event()
+
+    async def run():
+        study, bot, clock = make_cog(db_name=db_name)
+        guild = bot.guilds[0]
+        db = study.db_manager
+        update_guild_settings, get_guild_settings = db.update_guild_settings, db.get_guild_settings
+
+        def update_after_the_read(*args, **kwargs):
+            read_old_row.wait(5)
+            update_guild_settings(*args, **kwargs)
+            wrote.set()
+
+        def read_before_the_write(server_id):
+            # A cache miss on the loop reads the old row, and the writer thread commits before the miss stores it
+            row = get_guild_settings(server_id)
+            read_old_row.set()
+            wrote.wait(5)
+            time.sleep(0.05)
+            return row
+
+        db.update_guild_settings, db.get_guild_settings = update_after_the_read, read_before_the_write
+        configure = asyncio.create_task(study.study_config.callback(study, StubInteraction(guild, guild.add_member(1)), 50, None, None, None, None))
+        for _ in range(5):
+            await asyncio.sleep(0)
+        stale = study.guild_settings.get(guild.id)['work_minutes']
+        await configure
+        db.get_guild_settings = get_guild_settings
+        fresh = study.guild_settings.get(guild.id)['work_minutes']
+        study.db_writer.shutdown()
+        return study, stale, fresh
+
+    study, stale, fresh = asyncio.run(run())
+    assert stale == 25
+    assert fresh == 50
+    study.db_manager.close()
+
+
+def test_slow_deferral_does_not_hold_up_the_guild():
+    async def run():
+        study, bot, clock = make_cog()
+        study.deadline_guard.defer_after = 0  # Every join defers
+        guild = bot.guilds[0]
+        slow = StubInteraction(guild, guild.add_member(1))
+        fast = StubInteraction(guild, guild.add_member(2))
+        defer = slow.response.defer
+
+        async def slow_defer(**kwargs):
+            await asyncio.sleep(0.5)  # Discord taking its time to acknowledge
+            await defer(**kwargs)
+
+        slow.response.defer = slow_defer
+        started = time.perf_counter()
+        slow_join = asyncio.create_task(study.join_session(slow, guild.id))
+        await asyncio.sleep(0)
+        await study.join_session(fast, guild.id)
+        fast_seconds = time.perf_counter() - started
+        await slow_join
+        return study, guild, fast_seconds
+
+    study, guild, fast_seconds = asyncio.run(run())
+    assert fast_seconds < 0.25
+    assert study.active_sessions[guild.id]['participants'] == {1, 2}
+    study.db_manager.close()
+
+
+def test_spam_clicking_is_throttled():
+    async def run():
+        study, bot, clock = make_cog()
+        guild = bot.guilds[0]
+        member = guild.add_member(1)
+        interactions = [StubInteraction(guild, member) for _ in range(20)]
+        for i, interaction in enumerate(interactions):
+            if i % 2:
+                await study.leave_session(interaction, guild.id)
+            else:
+                await study.join_session(interaction, guild.id)
+        return study, interactions
+
+    study, interactions = asyncio.run(run())
+    replies = [interaction.sent[0].content for interaction in interactions]
+    throttled = [reply for reply in replies if "Slow down" in reply]
+    assert len(throttled) == 20 - study.throttle.users.burst
+    assert sum(row[2] for row in study.throttle.summary()) == len(throttled)
+    study.db_manager.close()
+
+
+def test_status_message_is_edited_once_per_burst():
+    async def run():
+        study, bot, clock = make_cog()
+        study.throttle.enabled = False
+        study.status_edits.window = 0.05
+        guild = bot.guilds[0]
+
+        await study.study.callback(study, StubInteraction(guild, guild.add_member(1)))
+        status = guild.text_channel.sent[0]
+
+        await asyncio.gather(*(study.join_session(StubInteraction(guild, guild.add_member(user_id)), guild.id)
+                               for user_id in range(1, 51)))
+        await asyncio.sleep(0.1)
+        edits_after_burst = len(status.edits)
+        participants_shown = status.embed.fields[0].value
+
+        # Rerunning /study points at the live message instead of posting another
+        again = StubInteraction(guild, guild.add_member(1))
+        await study.study.callback(study, again)
+
+        # After a restart the buttons on the old message still work, and it's adopted as the status message
+        restarted = Study(bot, db_name=":memory:", clock=clock, start_tasks=False)
+        restarted.status_edits.window = 0.05
+        click = StubInteraction(guild, guild.add_member(1), message=status)
+        await StudySessionView(restarted).join_button.callback(click)
+        await asyncio.sleep(0.1)
+        return study, restarted, guild, status, edits_after_burst, participants_shown, again
+
+    study, restarted, guild, status, edits_after_burst, participants_shown, again = asyncio.run(run())
+    assert edits_after_burst == 1
+    assert participants_shown == "50"
+    assert len(guild.text_channel.sent) == 1
+    assert status.jump_url in again.sent[0].content
+    assert restarted.status_messages[guild.id] is status
+    assert status.embed.fields[0].value == "1"
+    study.db_manager.close()
+    restarted.db_manager.close()
+
+
+if __name__ == "__main__":
+    test_shutdown_credits_participants_and_drains_announcements()
+    test_joins_and_leaves_racing_shutdown_are_saved_once()
+    test_shutdown_stays_bounded_when_the_writer_is_busy()
+    test_slow_xp_checkpoint_is_interrupted()
+    test_streak_minutes_are_counted_once()
+    test_concurrent_joins_and_leaves_lose_no_updates()
+    test_database_file_is_written_and_read_off_the_loop()
+    test_settings_cache_is_fresh_after_a_racing_miss()
+    test_slow_deferral_does_not_hold_up_the_guild()
+    test_spam_clicking_is_throttled()
+    test_status_message_is_edited_once_per_burst()
+    print("✅ All Study cog tests completed successfully!")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the token bucket throttles and read shedding
+"""
+
+from clock import VirtualClock
+from throttle import CommandThrottle, TokenBucketLimiter
+
+
+def test_token_bucket_bursts_then_refills():
+    clock = VirtualClock()
+    limiter = TokenBucketLimiter(rate=1, burst=3, clock=clock)
+    assert [limiter.allow('user') for _ in range(4)] == [True, True, True, False]
+    assert limiter.retry_after('user') == 1
+
+    clock.advance(1)
+    assert limiter.allow('user')
+    assert not limiter.allow('user')
+    # Other keys have their own buckets
+    assert limiter.allow('someone else')
+
+
+def test_idle_buckets_expire_and_memory_stays_bounded():
+    clock = VirtualClock()
+    limiter = TokenBucketLimiter(rate=1, burst=2, max_keys=100, clock=clock)
+    for key in range(1000):
+        limiter.allow(key)
+    assert len(limiter) == 100
+
+    # Once every bucket has refilled, the next call clears them all out
+    clock.advance(2)
+    limiter.allow('new')
+    assert len(limiter) == 1
+
+
+def test_guild_limit_and_read_shedding():
+    clock = VirtualClock()
+    throttle = CommandThrottle(user_burst=2, guild_rate=1, guild_burst=3, shed_backlog=10, clock=clock)
+    outcomes = [throttle.check('studystats', user_id, 1) for user_id in range(5)]
+    assert outcomes == [None, None, None, 'guild', 'guild']
+    # A refused command didn't spend the user's own tokens
+    clock.advance(1)
+    assert throttle.check('studystats', 3, 1) is None
+
+    clock.advance(60)
+    assert throttle.check('studystats', 1, 2, low_priority=True, write_backlog=10) == 'shed'
+    assert throttle.check('join_session', 1, 2, low_priority=False, write_backlog=10) is None
+    assert ('studystats', 4, 0, 2, 1) in throttle.summary()
+
+
+if __name__ == "__main__":
+    test_token_bucket_bursts_then_refills()
+    test_idle_buckets_expire_and_memory_stays_bounded()
+    test_guild_limit_and_read_shedding()
+    print("✅ All throttle tests completed successfully!")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script to verify streaming export and batched import of study data
+"""
+
+import csv
+import json
+import os
+import tempfile
+
+from dbmanager import TRANSFER_TABLES, DatabaseManager
+from transfer import export_tables, import_files, needs_xp_checkpoint
+
+
+def seed(path):
+    db = DatabaseManager(path)
+    for server_id in (1, 2):
+        session_id = db.start_study_session(server_id)
+        for user_id in range(1, 31):
+            db.add_user(user_id, server_id)
+        db.award_xp_batch(server_id, range(1, 31), session_id)
+        db.credit_study_time_batch([(user_id, server_id, user_id) for user_id in range(1, 31)], [session_id])
+    db.update_guild_settings(1, work_minutes=50, volume=0.25)
+    db.start_new_season(2)
+    db.close()
+
+
+def table_rows(path):
+    db = DatabaseManager(path)
+    rows = {table: list(db.iter_table(table)) for table in TRANSFER_TABLES}
+    db.close()
+    return rows
+
+
+def test_export_and_import_round_trip():
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, "source.db")
+    seed(source)
+
+    for file_format in ("ndjson", "csv"):
+        progress = []
+        exported = export_tables(source, os.path.join(directory, file_format), file_format, chunk_size=7,
+                                 progress=lambda table, rows: progress.append((table, rows)))
+        assert exported['userstats'][1] == 60
+        assert ('xp_events', 7) in progress and ('xp_events', 60) in progress
+
+        target = os.path.join(directory, f"{file_format}.db")
+        imported = import_files(target, os.path.join(directory, file_format), batch_size=8)
+        assert imported['userstats'] == (60, 60)
+        assert table_rows(target) == table_rows(source)
+
+        # Importing again skips what's already there
+        assert import_files(target, os.path.join(directory, file_format))['userstats'] == (60, 0)
+
+        # The imported XP survives a ledger replay
+        db = DatabaseManager(target)
+        before = db.get_user(5, 1)
+        db.replay_xp_ledger()
+        assert db.get_user(5, 1) == before
+        assert db.get_current_season(2) == 2
+        db.close()
+
+
+def test_import_from_another_bot_appends_sessions():
+    directory = tempfile.mkdtemp()
+    target = os.path.join(directory, "study.db")
+    seed(target)
+    with open(os.path.join(directory, "study_sessions.csv"), "w") as sessions:
+        sessions.write("server_id,start_time,end_time\n3,100,700\n3,800,\n")
+    with open(os.path.join(directory, "userstats.ndjson"), "w") as users:
+        users.write('{"userid": 9, "serverid": 3, "total_study_time": 600, "user_xp": 40, "user_level": 4}\n')
+        users.write('{"userid": 1, "serverid": 1, "total_study_time": 999}\n')  # Already here, so skipped
+
+    imported = import_files(target, [os.path.join(directory, "userstats.ndjson"), os.path.join(directory, "study_sessions.csv")])
+    assert imported == {'study_sessions': (2, 2), 'userstats': (2, 1)}
+
+    db = DatabaseManager(target)
+    assert db.get_user(9, 3)[4:7] == (600, 40, 4)
+    assert db.get_user(1, 1)[4] == 1
+    assert db.get_session_duration(3) == 10  # Appended after the two existing sessions
+    db.close()
+
+
+def xp_projection(db):
+    return {tuple(row[:3]): tuple(row[3:]) for row in
+            db.connection.execute("SELECT userid, serverid, season_id, user_xp, user_level FROM userstats WHERE user_xp > 0 OR user_level > 1")}
+
+
+def test_imported_xp_events_keep_live_awards():
+    for file_format in ("ndjson", "csv"):
+        directory = tempfile.mkdtemp()
+        source = os.path.join(directory, "source.db")
+        target = os.path.join(directory, "study.db")
+        seed(source)
+        seed(target)
+        export_tables(source, os.path.join(directory, "export"), file_format, tables=["xp_events"])
+        # Leave out event_id so the awards are appended, as when merging in another bot's ledger
+        events = os.path.join(directory, f"xp_events.{file_format}")
+        with open(os.path.join(directory, "export", f"xp_events.{file_format}"), newline="") as exported, \
+                open(events, "w", newline="") as appended:
+            if file_format == "csv":
+                reader = csv.DictReader(exported)
+                writer = csv.DictWriter(appended, [column for column in reader.fieldnames if column != "event_id"])
+                writer.writeheader()
+                for record in reader:
+                    del record["event_id"]
+                    writer.writerow(record)
+            else:
+                for line in exported:
+                    record = json.loads(line)
+                    del record["event_id"]
+                    appended.write(json.dumps(record) + "\n")
+
+        # The bot keeps awarding XP between the import's batches
+        live = DatabaseManager(target)
+        before = live.connection.execute("SELECT SUM(user_xp) FROM userstats").fetchone()[0]
+        imported = import_files(target, events, batch_size=10, progress=lambda table, rows: live.award_xp_batch(1, range(1, 11)))
+        assert imported == {'xp_events': (60, 60)}
+        assert needs_xp_checkpoint(imported)
+
+        projection = xp_projection(live)
+        assert live.connection.execute("SELECT SUM(user_xp) FROM userstats").fetchone()[0] > before
+        live.replay_xp_ledger(checkpoint=False)
+        assert xp_projection(live) == projection
+        live.replay_xp_ledger(from_latest_checkpoint=False, checkpoint=False)
+        assert xp_projection(live) == projection
+
+        # Replacing events with identical ones (IDs included) changes nothing
+        export_tables(target, os.path.join(directory, "again"), file_format, tables=["xp_events"])
+        assert import_files(target, os.path.join(directory, "again"), replace=True)['xp_events'][0] == 180
+        assert xp_projection(live) == projection
+        live.close()
+
+if __name__ == "__main__":
+    test_export_and_import_round_trip()
+    test_import_from_another_bot_appends_sessions()
+    test_imported_xp_events_keep_live_awards()
+    print("✅ All export/import tests completed successfully!")
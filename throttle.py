@@ -0,0 +1,124 @@
+import collections
+
+from clock import SystemClock
+
+# Per user: a burst of 5 commands, then one every 3 seconds
+USER_RATE = 1 / 3
+USER_BURST = 5
+# Per guild: a burst of 60 commands, then 10 a second, which is enough for a whole class joining at once
+GUILD_RATE = 10
+GUILD_BURST = 60
+# Low priority reads are turned away while this many database writes are waiting
+SHED_BACKLOG = 200
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by anything hashable, e.g. a user or guild id.
+
+    Each key gets `burst` tokens that refill at `rate` per second. Buckets that have
+    refilled completely are indistinguishable from new ones, so they are dropped as soon
+    as they go idle; at most `max_keys` buckets are kept, evicting the least recently used.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000, clock=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock or SystemClock()
+        self._buckets = collections.OrderedDict()  # key -> [tokens, updated], least recently used first
+        self.allowed = 0
+        self.throttled = 0
+        self.expired = 0
+
+    def _refill_seconds(self):
+        return self.burst / self.rate
+
+    def _expire(self, now):
+        """Drop idle buckets from the least recently used end; O(1) amortised per call"""
+        refill = self._refill_seconds()
+        while self._buckets:
+            key, (_tokens, updated) = next(iter(self._buckets.items()))
+            if now - updated < refill and len(self._buckets) <= self.max_keys:
+                break
+            self._buckets.popitem(last=False)
+            self.expired += 1
+
+    def _tokens(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return float(self.burst)
+        return min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+
+    def peek(self, key, cost=1):
+        """Whether `allow` would succeed, without taking any tokens"""
+        return self._tokens(key, self.clock.monotonic()) >= cost
+
+    def allow(self, key, cost=1):
+        """Take `cost` tokens from the key's bucket, returning False if there aren't enough"""
+        now = self.clock.monotonic()
+        tokens = self._tokens(key, now)
+        if tokens < cost:
+            self.throttled += 1
+            return False
+        self._buckets[key] = [tokens - cost, now]
+        self._buckets.move_to_end(key)
+        self._expire(now)
+        self.allowed += 1
+        return True
+
+    def retry_after(self, key, cost=1):
+        """Seconds until `cost` tokens will be available for the key"""
+        missing = cost - self._tokens(key, self.clock.monotonic())
+        return max(0.0, missing / self.rate)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class CommandThrottle:
+    """Admits or turns away commands per user and per guild, and sheds reads under write load"""
+
+    def __init__(self, user_rate=USER_RATE, user_burst=USER_BURST, guild_rate=GUILD_RATE, guild_burst=GUILD_BURST,
+                 shed_backlog=SHED_BACKLOG, max_keys=10000, clock=None):
+        self.users = TokenBucketLimiter(user_rate, user_burst, max_keys, clock)
+        self.guilds = TokenBucketLimiter(guild_rate, guild_burst, max_keys, clock)
+        self.shed_backlog = shed_backlog
+        self.enabled = True  # Simulations and stress tests switch this off to drive the cog flat out
+        self.counts = {}  # (command, outcome) -> count; outcome is 'allowed', 'user', 'guild' or 'shed'
+
+    def check(self, command, user_id, guild_id, low_priority=False, write_backlog=0):
+        """Return None if the command may run, otherwise why it was refused: 'user', 'guild' or 'shed'"""
+        if not self.enabled:
+            outcome = 'allowed'
+        elif low_priority and write_backlog >= self.shed_backlog:
+            outcome = 'shed'
+        # Check the guild before spending the user's token, so a refused command costs the user nothing
+        elif not self.guilds.peek(guild_id):
+            outcome = 'guild'
+            self.guilds.throttled += 1
+        elif not self.users.allow(user_id):
+            outcome = 'user'
+        else:
+            self.guilds.allow(guild_id)
+            outcome = 'allowed'
+
+        key = (command, outcome)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        return None if outcome == 'allowed' else outcome
+
+    def retry_after(self, outcome, user_id, guild_id):
+        if outcome == 'user':
+            return self.users.retry_after(user_id)
+        if outcome == 'guild':
+            return self.guilds.retry_after(guild_id)
+        return 5.0  # Shed reads are worth retrying once the write backlog has had a moment to drain
+
+    def summary(self):
+        """Return [(command, allowed, throttled_user, throttled_guild, shed)] with the most refused first"""
+        commands = {}
+        for (command, outcome), count in self.counts.items():
+            row = commands.setdefault(command, {'allowed': 0, 'user': 0, 'guild': 0, 'shed': 0})
+            row[outcome] += count
+        rows = [(command, row['allowed'], row['user'], row['guild'], row['shed']) for command, row in commands.items()]
+        rows.sort(key=lambda row: row[2] + row[3] + row[4], reverse=True)
+        return rows
@@ -0,0 +1,139 @@
+import csv
+import json
+import os
+import time
+
+from dbmanager import TRANSFER_TABLES, DatabaseManager
+
+FORMATS = ('ndjson', 'csv')
+
+
+def export_tables(db_name, directory, fmt='ndjson', tables=None, chunk_size=5000, progress=None):
+    """Stream tables to `<directory>/<table>.<fmt>` files in constant memory.
+
+    `progress` is called with (table, rows_written) after every chunk. Uses its own
+    connection, so it can run in a thread while the bot keeps serving. Returns
+    {table: (path, rows)}.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt}; expected one of {', '.join(FORMATS)}")
+    tables = list(tables or TRANSFER_TABLES)
+    unknown = set(tables) - set(TRANSFER_TABLES)
+    if unknown:
+        raise ValueError(f"Can't export {', '.join(sorted(unknown))}")
+
+    os.makedirs(directory, exist_ok=True)
+    db = DatabaseManager(db_name)
+    exported = {}
+    try:
+        for table in tables:
+            columns = db.table_columns(table)
+            path = os.path.join(directory, f"{table}.{fmt}")
+            rows = 0
+            with open(path, 'w', newline='', encoding='utf-8') as output:
+                if fmt == 'csv':
+                    writer = csv.writer(output)
+                    writer.writerow(columns)
+                for row in db.iter_table(table, chunk_size):
+                    if fmt == 'csv':
+                        writer.writerow(row)
+                    else:
+                        output.write(json.dumps(dict(zip(columns, row)), separators=(',', ':')))
+                        output.write('\n')
+                    rows += 1
+                    if progress and rows % chunk_size == 0:
+                        progress(table, rows)
+            if progress:
+                progress(table, rows)
+            exported[table] = (path, rows)
+    finally:
+        db.close()
+    return exported
+
+
+def _read_records(path):
+    """Yield (columns, values) for every record in an NDJSON or CSV file"""
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as source:
+            reader = csv.reader(source)
+            columns = tuple(next(reader, ()))
+            for values in reader:
+                # CSV can't tell NULL from an empty string; none of the exported columns are text
+                yield columns, tuple(value if value != '' else None for value in values)
+    else:
+        with open(path, encoding='utf-8') as source:
+            for line in source:
+                if line.strip():
+                    record = json.loads(line)
+                    yield tuple(record), tuple(record.values())
+
+
+def table_for_file(path):
+    """The table a file imports into, taken from its name (e.g. exports/userstats.ndjson)"""
+    table = os.path.basename(path).split('.')[0]
+    if table not in TRANSFER_TABLES:
+        raise ValueError(f"{path} isn't named after a table; expected one of {', '.join(TRANSFER_TABLES)}")
+    return table
+
+
+def import_files(db_name, paths, batch_size=1000, replace=False, pause=0.0, progress=None):
+    """Import NDJSON/CSV files named after their tables, e.g. from export_tables or another bot.
+
+    Each batch of `batch_size` rows is its own transaction, with `pause` seconds between
+    batches so a live bot's writes get a turn. Files are imported in TRANSFER_TABLES order.
+    Imported xp_events on their own are applied to levels and XP batch by batch, in the same
+    transactions that insert them, so awards a live bot makes meanwhile are kept.
+    `progress` is called with (table, rows_read) after every batch. Returns {table: (rows_read, rows_written)}.
+
+    No XP checkpoint is made: copying all of userstats is one long write transaction that
+    would stall a live bot. When needs_xp_checkpoint() says so, run `manage.py checkpoint-xp`
+    once the bot is quiet, or ledger replays lose imported userstats XP and skip events
+    imported with IDs from before the latest checkpoint.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(('.ndjson', '.csv')))
+        else:
+            files.append(path)
+    order = list(TRANSFER_TABLES)
+    files.sort(key=lambda path: order.index(table_for_file(path)))
+
+    # Imported userstats already include their XP, so their events mustn't be applied on top
+    update_projection = 'userstats' not in {table_for_file(path) for path in files}
+
+    db = DatabaseManager(db_name)
+    imported = {}
+    try:
+        for path in files:
+            table = table_for_file(path)
+            read, written = imported.get(table, (0, 0))
+            batch = []
+            batch_columns = None
+            for columns, values in _read_records(path):
+                # Records with different columns (possible in NDJSON) go in separate batches
+                if batch and (columns != batch_columns or len(batch) >= batch_size):
+                    written += db.import_rows(table, batch_columns, batch, replace, update_projection)
+                    if progress:
+                        progress(table, read)
+                    if pause:
+                        time.sleep(pause)
+                    batch = []
+                batch_columns = columns
+                batch.append(values)
+                read += 1
+            if batch:
+                written += db.import_rows(table, batch_columns, batch, replace, update_projection)
+            if progress:
+                progress(table, read)
+            imported[table] = (read, written)
+    finally:
+        db.close()
+    return imported
+
+
+def needs_xp_checkpoint(imported):
+    """Whether an import_files result changed XP that only a new checkpoint keeps through replays"""
+    return any(imported.get(table, (0, 0))[1] for table in ('userstats', 'xp_events'))